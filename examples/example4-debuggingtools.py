@@ -188,11 +188,11 @@ for frame in wire_trace:
 
 dummy_wv = pyrtl.WireVector(1, name="blah")
 
-# Also, because of the flexible nature of Python, you can also add custom
-# properties to the WireVector.
+# Also, each WireVector has a metadata dictionary where you can keep custom
+# properties of your own.
 
-dummy_wv.my_custom_property_name = "John Clow is great"
-dummy_wv.custom_value_028493 = 13
+dummy_wv.metadata['my_custom_property_name'] = "John Clow is great"
+dummy_wv.metadata['custom_value_028493'] = 13
 
 # removing the WireVector from the block to prevent problems with the rest of
 # this example
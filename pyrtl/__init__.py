@@ -12,6 +12,12 @@ from .core import reset_working_block
 from .core import set_working_block
 from .core import temp_working_block
 from .core import set_debug_mode
+from .netlist import CompactNetlist
+
+# hierarchical designs
+from .hierarchy import Module
+from .hierarchy import ModuleInstance
+from .hierarchy import flatten
 
 # convenience classes for building hardware
 from .wire import WireVector
@@ -82,7 +88,10 @@ from .simulation import Simulation
 from .simulation import FastSimulation
 from .simulation import SimulationTrace
 from .simulation import enum_name
+from .simulation import make_simulation
+from .simulation import SimulationCostModel
 from .compilesim import CompiledSimulation
+from .cosimulation import CoSimulation
 
 # block visualization output formats
 from .visualization import output_to_trivialgraph
@@ -102,6 +111,8 @@ from .importexport import output_verilog_testbench
 from .importexport import input_from_blif
 from .importexport import output_to_firrtl
 from .importexport import input_from_iscas_bench
+from .blockfile import save_block
+from .blockfile import load_block
 
 # different transform passes
 from .passes import common_subexp_elimination
@@ -114,6 +125,11 @@ from .passes import one_bit_selects
 from .passes import two_way_concat
 from .passes import direct_connect_outputs
 from .passes import two_way_fanout
+from .passes import optimization_passes
+from .passes import narrow_bitwidths
+from .passmanager import PassManager
+from .passmanager import FixedPoint
+from .passmanager import net_pass
 
 from .transform import net_transform
 from .transform import wire_transform
@@ -129,3 +145,4 @@ from .analysis import yosys_area_delay
 from .analysis import paths
 from .analysis import distance
 from .analysis import fanout
+from .analysis import netlist_footprint
@@ -11,12 +11,14 @@ import tempfile
 import subprocess
 import sys
 import collections
+from array import array
 
 from .core import working_block
 from .wire import Input, Output, Const, Register, WireVector
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
 from .importexport import output_to_verilog
 from .memory import RomBlock
+from .netlist import CompactNetlist
 from .helperfuncs import _currently_in_jupyter_notebook, _print_netlist_latex
 
 
@@ -110,7 +112,7 @@ def area_estimation(tech_in_nm=130, block=None):
 
     # now sum up the area of the memories
     mem_area = 0
-    for mem in set(net.op_param[1] for net in block.logic_subset('@m')):
+    for mem in set(net.op_param[1] for net in block.logic_view('@m')):
         bits, ports, is_rom = _bits_ports_and_isrom_from_memory(mem)
         mem_area += mem_area_estimate(tech_in_nm, bits, ports, is_rom)
 
@@ -158,41 +160,50 @@ class TimingAnalysis(object):
         different timing delays of different gates of each type.
         Supports all valid presynthesis blocks.
         Currently doesn't support memory post synthesis.
+
+        `block` may also be a :class:`.CompactNetlist`, in which case the
+        delays are computed directly over its arrays and the keys of
+        :py:attr:`~.TimingAnalysis.timing_map` are wire names rather than wires.
         """
 
-        self.block = working_block(block)
         self.timing_map = None
+        if isinstance(block, CompactNetlist):
+            self.block = block
+            self._generate_compact_timing_map(gate_delay_funcs)
+            return
+        self.block = working_block(block)
         self.block.sanity_check()
         self._generate_timing_map(gate_delay_funcs)
 
-    def _generate_timing_map(self, gate_delay_funcs):
-
-        # The functions above were gathered and calibrated by mapping
+    def _default_gate_delay_funcs(self):
+        # The functions below were gathered and calibrated by mapping
         # reference designs to an openly available 130nm stdcell library.
         # Note that this is will compute the critical logic delay, but does
         # not include setup/hold time.
+        return {
+            '~': lambda width: 48.5,
+            '&': lambda width: 98.5,
+            '|': lambda width: 105.3,
+            '^': lambda width: 135.07,
+            'n': lambda width: 66.0,
+            'w': lambda width: 0,
+            '+': self._logconst_func(184.0, 18.9),
+            '-': self._logconst_func(184.0, 18.9),
+            '*': self._multiplier_stdcell_estimate,
+            '<': self._logconst_func(101.9, 105.4),
+            '>': self._logconst_func(101.9, 105.4),
+            '=': self._logconst_func(60.1, 147),
+            'x': lambda width: 138.0,
+            'c': lambda width: 0,
+            's': lambda width: 0,
+            'r': lambda width: -1,
+            'm': self._memory_read_estimate,
+            '@': lambda width: -1,
+        }
 
+    def _generate_timing_map(self, gate_delay_funcs):
         if gate_delay_funcs is None:
-            gate_delay_funcs = {
-                '~': lambda width: 48.5,
-                '&': lambda width: 98.5,
-                '|': lambda width: 105.3,
-                '^': lambda width: 135.07,
-                'n': lambda width: 66.0,
-                'w': lambda width: 0,
-                '+': self._logconst_func(184.0, 18.9),
-                '-': self._logconst_func(184.0, 18.9),
-                '*': self._multiplier_stdcell_estimate,
-                '<': self._logconst_func(101.9, 105.4),
-                '>': self._logconst_func(101.9, 105.4),
-                '=': self._logconst_func(60.1, 147),
-                'x': lambda width: 138.0,
-                'c': lambda width: 0,
-                's': lambda width: 0,
-                'r': lambda width: -1,
-                'm': self._memory_read_estimate,
-                '@': lambda width: -1,
-            }
+            gate_delay_funcs = self._default_gate_delay_funcs()
         cleared = self.block.wirevector_subset((Input, Const, Register))
         self.timing_map = {wirevector: 0 for wirevector in cleared}
         for _gate in self.block:  # ordered iteration
@@ -207,6 +218,34 @@ class TimingAnalysis(object):
             for dest_wire in _gate.dests:
                 self.timing_map[dest_wire] = time
 
+    def _generate_compact_timing_map(self, gate_delay_funcs):
+        if gate_delay_funcs is None:
+            gate_delay_funcs = self._default_gate_delay_funcs()
+        netlist = self.block
+        ops, dests, offsets, args = netlist.ops, netlist.dests, netlist.arg_offsets, netlist.args
+        bitwidths, no_id = netlist.bitwidths, netlist.NO_ID
+        arrival = array('d', bytes(8 * netlist.num_wires))
+        timed = {i for i in range(netlist.num_wires) if netlist.is_source(i)}
+        delay_cache = {}  # (op code, width) -> delay, as most gates share a few shapes
+        for n in netlist.topological_order():
+            code = ops[n]
+            start, end = offsets[n], offsets[n + 1]
+            if netlist.OPS[code] == 'm':
+                gate_delay = gate_delay_funcs['m'](netlist.op_params[n][1])
+            else:
+                key = (code, bitwidths[args[start]])
+                gate_delay = delay_cache.get(key)
+                if gate_delay is None:
+                    gate_delay = gate_delay_funcs[netlist.OPS[code]](key[1])
+                    delay_cache[key] = gate_delay
+
+            if gate_delay < 0 or dests[n] == no_id:
+                continue
+            arrival[dests[n]] = max(arrival[a] for a in args[start:end]) + gate_delay
+            timed.add(dests[n])
+        names = netlist.names
+        self.timing_map = {names[i]: arrival[i] for i in timed}
+
     @staticmethod
     def _logconst_func(a, b):
         return lambda x: a * math.log(float(x), 2) + b
@@ -279,8 +318,10 @@ class TimingAnalysis(object):
             first value and the critical paths (which themselves are lists
             of nets) as the second
         """
+        if isinstance(self.block, CompactNetlist):
+            raise PyrtlError('critical_path needs a Block; analyze netlist.to_block() instead')
         critical_paths = []  # storage of all completed critical paths
-        wire_src_map, dst_map = self.block.net_connections()
+        wire_src_map, dst_map = self.block.connections()
 
         def critical_path_pass(old_critical_path, first_wire):
             if isinstance(first_wire, (Input, Const, Register)):
@@ -447,16 +488,16 @@ def paths(src=None, dst=None, dst_nets=None, block=None):
     :param Union[WireVector, Iterable[WireVector]] dst: destination wire(s) to which to
         trace your paths; if None, will get paths to all Outputs
     :param dict[WireVector, LogicNet] dst_nets: map from wire to set of nets where the
-        wire is an argument; will compute it internally if not given via a
-        call to pyrtl.net_connections()
+        wire is an argument; if not given, the block's live
+        :meth:`~.Block.connection_index` is used
     :param Block block: block to use (defaults to working block)
     :return: a map of the form `{src_wire: {dst_wire: [path]}}` for each `src_wire` in `src`
         (or all inputs if `src` is None), `dst_wire` in `dst` (or all outputs if `dst` is None),
         where `path` is a list of nets. This map is also an instance of :py:class:`.PathsResult`,
         so you can call :py:meth:`.PathsResult.print` on it to pretty print it.
 
-    You can provide `dst_nets` (the result of calling :py:func:`.net_connections`, if you plan
-    on calling this function repeatedly on a block that hasn't changed, to speed things up.
+    You can provide `dst_nets` (the result of calling :py:func:`.net_connections`) to
+    find paths through a different view of the block than its current one.
 
     This function can accept one or more `src` wires, and one or more `dst` wires,
     such that it returns a map that can be accessed like so::
@@ -478,16 +519,17 @@ def paths(src=None, dst=None, dst_nets=None, block=None):
     block = working_block(block)
 
     if dst_nets is None:
-        # Note: if you set `include_virtual_nodes=True`, Output wires will actually
-        # be present as the destination "net" of Output wires in the dst_nets map.
-        # That would overly complicate this algorithm: we will assume all values()
-        # in the dst_nets map are logic nets only. We set this to False for explicitness...
-        _, dst_nets = block.net_connections(include_virtual_nodes=False)
+        # The block's connection index only holds logic nets, never the "virtual"
+        # Output nodes that net_connections(include_virtual_nodes=True) adds...
+        sinks = block.connection_index().sinks
     else:
-        # ... or make sure it's not present otherwise.
+        # ... so make sure they are not present otherwise.
         for output in block.wirevector_subset(cls=Output):
             dst_nets.pop(output, None)
 
+        def sinks(w):
+            return dst_nets.get(w, [])
+
     if src is None:
         src = block.wirevector_subset(cls=Input)
     elif isinstance(src, WireVector):
@@ -510,7 +552,7 @@ def paths(src=None, dst=None, dst_nets=None, block=None):
             if w is dst:
                 # Found valid path
                 paths.append(curr_path)
-            for dst_net in dst_nets.get(w, []):
+            for dst_net in sinks(w):
                 # Avoid loops and the mem net (has no output wire)
                 if dst_net not in curr_path:
                     if dst_net.op == '@':  # dests will be the read ports
@@ -570,9 +612,96 @@ def fanout(w):
     :param WireVector w: WireVector to check fanout for
     :return: integer fanout count
     """
-    _, dst_nets = w._block.net_connections()
-    if w not in dst_nets:
-        return 0
+    return w._block.connection_index().fanout(w)
+
+
+class NetlistFootprint(collections.namedtuple(
+        'NetlistFootprint', ['wires', 'wire_bytes', 'nets', 'net_bytes', 'block_bytes'])):
+    """ Memory used by the netlist of a block, as returned by :func:`netlist_footprint`.
+
+    * ``.wires``, ``.nets``: the number of wires and nets
+    * ``.wire_bytes``: bytes held by the wire objects, including their names
+      and any metadata attached to them
+    * ``.net_bytes``: bytes held by the net objects, including their arg and
+      dest tuples
+    * ``.block_bytes``: bytes held by the block's own sets, maps and indexes
+      of those wires and nets
+    """
+
+    @property
+    def bytes_per_wire(self):
+        """ Average bytes per wire (not counting block_bytes). """
+        return self.wire_bytes / self.wires if self.wires else 0.0
+
+    @property
+    def bytes_per_net(self):
+        """ Average bytes per net (not counting block_bytes). """
+        return self.net_bytes / self.nets if self.nets else 0.0
+
+    @property
+    def total_bytes(self):
+        """ Bytes used by the wires, the nets and the block together. """
+        return self.wire_bytes + self.net_bytes + self.block_bytes
+
+
+def netlist_footprint(block=None):
+    """ Measure how much memory the netlist of a block uses.
+
+    :param Block block: block, or :class:`.CompactNetlist`, to measure
+        (defaults to working block)
+    :return: a :class:`NetlistFootprint`
+
+    Sizes are shallow sizes from :func:`sys.getsizeof`, summed over the
+    objects owned by the netlist (objects shared by several wires or nets are
+    counted once).  Memories and the values of Consts are not counted.  This
+    is meant for comparing the footprint of different designs, or of the same
+    design before and after a transformation such as :func:`.synthesize`.
+
+    For a CompactNetlist, `wire_bytes` covers the names and the per-wire
+    arrays, `net_bytes` the per-net arrays and op_params, and `block_bytes`
+    the driver and sink arrays.
+    """
+    seen = set()
 
-    all_args = [arg for net in dst_nets[w] for arg in net.args]
-    return len(list(filter(lambda arg: arg is w, all_args)))
+    def size(obj):
+        if obj is None or id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        return sys.getsizeof(obj)
+
+    if isinstance(block, CompactNetlist):
+        wire_bytes = sum(size(n) for n in block.names) + sum(size(container) for container in (
+            block.names, block.bitwidths, block.wire_kinds, block.const_vals,
+            block.reset_values, block._ids_by_name))
+        net_bytes = sum(size(container) for container in (
+            block.ops, block.op_params, block.arg_offsets, block.args, block.dests))
+        net_bytes += sum(size(p) for p in block.op_params.values() if isinstance(p, tuple))
+        block_bytes = sum(size(container) for container in (
+            block.drivers, block.sink_offsets, block.sinks, block._order))
+        return NetlistFootprint(block.num_wires, wire_bytes, block.num_nets,
+                                net_bytes, block_bytes)
+
+    block = working_block(block)
+    wire_bytes = 0
+    for w in block.wirevector_set:
+        wire_bytes += size(w) + size(w.name)
+        for extra in ('_metadata', '__dict__'):
+            wire_bytes += size(getattr(w, extra, None))
+
+    net_bytes = 0
+    for net in block.logic:
+        net_bytes += size(net) + size(net.args) + size(net.dests)
+        if isinstance(net.op_param, tuple):
+            net_bytes += size(net.op_param)
+
+    block_bytes = sum(size(container) for container in (
+        block.logic, block.wirevector_set, block.wirevector_by_name))
+    for buckets in (block._wires_by_type, block._nets_by_op):
+        block_bytes += size(buckets) + sum(size(b) for b in buckets.values())
+    index = block._connection_index
+    if index is not None:
+        for wire_map in (index._drivers, index._sinks):
+            block_bytes += size(wire_map) + sum(size(nets) for nets in wire_map.values())
+
+    return NetlistFootprint(len(block.wirevector_set), wire_bytes,
+                            len(block.logic), net_bytes, block_bytes)
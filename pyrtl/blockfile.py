@@ -0,0 +1,469 @@
+""" Saving blocks to, and loading them from, a compact binary file.
+
+Included in this file you will find:
+
+* `save_block` -- write a block to a file
+* `load_block` -- read a block back from a file written by `save_block`
+
+Rebuilding a large design by re-running the Python that generates it can take
+a long time, and the text formats PyRTL can export (Verilog, BLIF, FIRRTL)
+drop PyRTL specific information such as assertions, and need an external tool
+to be read back.  These functions store a block exactly, as the flat integer
+arrays of a :class:`.CompactNetlist` plus a little extra for memories,
+assertions and the maps of a :class:`.PostSynthBlock`, so loading one is a
+single linear pass with no parsing.
+
+The file starts with the magic bytes ``PYRTLBLK``, a format version, the
+class of the block and a CRC-32 checksum of the rest of the file; all integers
+are little-endian.  Files are only read back by the version of the format that
+wrote them, and a file that fails its checksum or does not decode is rejected
+with a :class:`.PyrtlError`.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+
+from .pyrtlexceptions import PyrtlError
+from .core import working_block, set_working_block, Block, PostSynthBlock, LogicNet
+from .wire import WireVector, Input, Output, Const, Register, _unchecked_wire
+from .memory import MemBlock, RomBlock
+from .netlist import CompactNetlist
+
+_MAGIC = b'PYRTLBLK'
+_VERSION = 2
+_HEADER = struct.Struct('<HBI')  # version, index in _BLOCK_TYPES, checksum of the rest
+_BLOCK_TYPES = (Block, PostSynthBlock)
+_WIRE_TYPES = (WireVector, Input, Output, Const, Register)
+_MAPS = ('io_map', 'reg_map', 'mem_map')
+
+# bits of the flags field stored for each memory
+_ASYNC, _ROM, _EXTERNAL, _PAD_WITH_ZEROS, _BUILD_NEW_ROMS, _MAPPING = (1 << i for i in range(6))
+_MAX_ROM_FUNCTION_ADDRWIDTH = 24
+
+# the array typecode to use for each item size in the file
+_TYPECODES = {array(code).itemsize: code for code in 'QLIHB'}
+
+
+class _Writer(object):
+    """ Collects the encoded sections of a block file. """
+
+    def __init__(self):
+        self.chunks = []
+
+    def uint(self, value):
+        self.chunks.append(struct.pack('<Q', value))
+
+    def array(self, typecode, values):
+        a = array(typecode, values)
+        if sys.byteorder == 'big':
+            a.byteswap()
+        self.chunks.append(struct.pack('<BQ', a.itemsize, len(a)))
+        self.chunks.append(a.tobytes())
+
+    def strings(self, strings):
+        if any('\0' in s for s in strings):
+            raise PyrtlError('cannot save names containing a null character')
+        blob = '\0'.join(strings).encode('utf-8')
+        self.uint(len(strings))
+        self.uint(len(blob))
+        self.chunks.append(blob)
+
+    def ints(self, values):
+        """ Arbitrary Python ints, packed as 64-bit words when they all fit. """
+        values = list(values)
+        if all(0 <= v < 2**64 for v in values):
+            self.uint(0)
+            self.array('Q', values)
+        else:
+            self.uint(1)
+            self.strings([format(v, 'x') for v in values])
+
+
+class _Reader(object):
+    """ Decodes the sections of a block file in the order _Writer wrote them. """
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def take(self, size):
+        if self.pos + size > len(self.data):
+            raise PyrtlError('block file is truncated')
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def uint(self):
+        return struct.unpack('<Q', self.take(8))[0]
+
+    def array(self):
+        itemsize, count = struct.unpack('<BQ', self.take(9))
+        if itemsize not in _TYPECODES:
+            raise PyrtlError('block file has an array of unsupported item size %d' % itemsize)
+        a = array(_TYPECODES[itemsize])
+        a.frombytes(self.take(itemsize * count))
+        if sys.byteorder == 'big':
+            a.byteswap()
+        return a
+
+    def strings(self):
+        count, size = self.uint(), self.uint()
+        try:
+            blob = bytes(self.take(size)).decode('utf-8')
+        except UnicodeDecodeError:
+            raise PyrtlError('block file has a string that is not valid UTF-8') from None
+        strings = blob.split('\0') if count else []
+        if len(strings) != count:
+            raise PyrtlError('block file has a list of %d strings where %d were expected'
+                             % (len(strings), count))
+        return strings
+
+    def ints(self):
+        if self.uint() == 0:
+            return self.array().tolist()
+        return [int(s, 16) for s in self.strings()]
+
+
+def save_block(path, block=None):
+    """ Save a block to a binary file, to be read back later with :func:`load_block`.
+
+    :param path: name of the file to write, or a file object open for binary writing
+    :param Block block: block to save (defaults to working block)
+
+    Everything needed to rebuild the block is saved: every wire with its type,
+    name and bitwidth, Const values and Register reset values, every net with
+    its op_param, every MemBlock and RomBlock (with the rom data), the
+    assertions added with :func:`.rtl_assert`, and the ``io_map``, ``reg_map``
+    and ``mem_map`` of a :class:`.PostSynthBlock` (or of a block made by
+    :func:`.copy_block`).  Only the plain PyRTL wire and block classes can be
+    saved.  A RomBlock whose data is a function is saved as the list of values
+    the function returns for every address.
+
+    Assertions are saved as the class and arguments of their exception, so
+    loading one needs the module defining that exception class to have been
+    imported already (:func:`load_block` never imports modules itself).
+
+    Example::
+
+        pyrtl.save_block('design.pyrtl')
+        ...
+        block = pyrtl.load_block('design.pyrtl')  # also becomes the working block
+    """
+    block = working_block(block)
+    block.sanity_check()
+    if type(block) not in _BLOCK_TYPES:
+        raise PyrtlError('cannot save a block of type %s' % type(block).__name__)
+    netlist = CompactNetlist(block)
+    out = _Writer()
+
+    # Wires outside the block (the pre-synthesis wires used as keys of io_map
+    # and reg_map, or wires a pass removed after synthesis) are numbered after
+    # the wires of the block.
+    external = {}
+    for attr in ('io_map', 'reg_map'):
+        for k, v in netlist._maps.get(attr, {}).items():
+            for w in [k] + (v if isinstance(v, list) else [v]):
+                if not isinstance(w, int) and w not in external:
+                    external[w] = netlist.num_wires + len(external)
+
+    def wire_ref(w):
+        return w if isinstance(w, int) else external[w]
+
+    def type_code(cls):
+        if cls not in _WIRE_TYPES:
+            raise PyrtlError('cannot save a wire of type %s' % cls.__name__)
+        return _WIRE_TYPES.index(cls)
+
+    codes = [type_code(cls) for cls in netlist.wire_types]
+    out.strings(netlist.names + [w.name for w in external])
+    out.array('B', [codes[k] for k in netlist.wire_kinds]
+              + [type_code(type(w)) for w in external])
+    out.array('I', netlist.bitwidths.tolist() + [w.bitwidth or 0 for w in external])
+    out.uint(netlist.num_wires)
+    const_vals = dict(netlist.const_vals)
+    const_vals.update((i, w.val) for w, i in external.items() if isinstance(w, Const))
+    reset_values = dict(netlist.reset_values)
+    reset_values.update((i, w.reset_value) for w, i in external.items()
+                        if isinstance(w, Register) and w.reset_value is not None)
+    for values in (const_vals, reset_values):
+        out.array('I', values.keys())
+        out.ints(values.values())
+
+    # Memories: those of the block, plus the pre-synthesis ones in mem_map.
+    mems = {}
+    for mem in block.memblock_by_name.values():
+        mems.setdefault(mem, len(mems))
+    for param in netlist.op_params.values():
+        if isinstance(param, tuple) and len(param) == 2 and isinstance(param[1], MemBlock):
+            mems.setdefault(param[1], len(mems))
+    for k, v in netlist._maps.get('mem_map', {}).items():
+        mems.setdefault(k, len(mems))
+        mems.setdefault(v, len(mems))
+    fields = []
+    roms = []
+    for mem in mems:
+        flags = ((_ASYNC if mem.asynchronous else 0)
+                 | (_EXTERNAL if mem.block is not block else 0))
+        if isinstance(mem, RomBlock):
+            flags |= _ROM | (_PAD_WITH_ZEROS if mem.pad_with_zeros else 0) \
+                | (_BUILD_NEW_ROMS if mem.build_new_roms else 0)
+            data = _rom_data(mem)
+            if isinstance(data, dict):
+                flags |= _MAPPING
+            roms.append(data)
+        fields.extend((mem.id, mem.bitwidth, mem.addrwidth,
+                       0 if mem.max_read_ports is None else mem.max_read_ports + 1,
+                       0 if mem.max_write_ports is None else mem.max_write_ports + 1,
+                       flags))
+    out.strings([mem.name for mem in mems])
+    out.array('Q', fields)
+    for data in roms:
+        if isinstance(data, dict):
+            out.ints(data.keys())
+        out.ints(data.values() if isinstance(data, dict) else data)
+
+    # Nets, straight from the netlist arrays; op_params are stored in net order.
+    out.array('B', netlist.ops)
+    out.array('I', netlist.arg_offsets)
+    out.array('I', netlist.args)
+    out.array('I', netlist.dests)
+    selects = [p for n, p in netlist.op_params.items() if netlist.op(n) == 's']
+    out.array('I', [len(p) for p in selects])
+    out.array('I', [i for p in selects for i in p])
+    out.array('I', [mems[p[1]] for n, p in netlist.op_params.items() if netlist.op(n) in 'm@'])
+
+    # Assertions, as the class and arguments of their exception.
+    asserts = list(block.rtl_assert_dict.items())
+    out.array('I', [netlist.wire_id(w.name) for w, _ in asserts])
+    out.strings([type(exp).__module__ + ':' + type(exp).__qualname__ for _, exp in asserts])
+    exp_args = [exp.args if all(isinstance(a, str) for a in exp.args) else (str(exp),)
+                for _, exp in asserts]
+    out.array('I', [len(args) for args in exp_args])
+    out.strings([a for args in exp_args for a in args])
+
+    # The maps of a PostSynthBlock (or of a copied block).
+    out.array('B', [attr in netlist._maps for attr in _MAPS])
+    for attr in ('io_map', 'reg_map'):
+        if attr in netlist._maps:
+            mapping = netlist._maps[attr]
+            values = [v if isinstance(v, list) else [v] for v in mapping.values()]
+            out.array('I', [wire_ref(k) for k in mapping])
+            out.array('B', [isinstance(v, list) for v in mapping.values()])
+            out.array('I', [len(v) for v in values])
+            out.array('I', [wire_ref(w) for v in values for w in v])
+    if 'mem_map' in netlist._maps:
+        out.array('I', [mems[k] for k in netlist._maps['mem_map']])
+        out.array('I', [mems[v] for v in netlist._maps['mem_map'].values()])
+
+    payload = b''.join(out.chunks)
+    header = _MAGIC + _HEADER.pack(_VERSION, _BLOCK_TYPES.index(type(block)),
+                                   zlib.crc32(payload))
+    if hasattr(path, 'write'):
+        path.write(header + payload)
+    else:
+        with open(path, 'wb') as f:
+            f.write(header + payload)
+
+
+def _rom_data(rom):
+    """ The data of a RomBlock as a list or a dict of ints. """
+    data = rom.data
+    if callable(data):
+        if rom.addrwidth > _MAX_ROM_FUNCTION_ADDRWIDTH:
+            raise PyrtlError('cannot save RomBlock "%s": its data is a function and its '
+                             'addrwidth is too large to save every value' % rom.name)
+        return [data(addr) for addr in range(2**rom.addrwidth)]
+    if hasattr(data, 'items'):
+        return dict(data)
+    return list(data)
+
+
+def load_block(path, update_working_block=True):
+    """ Load a block saved with :func:`save_block`.
+
+    :param path: name of the file to read, or a file object open for binary reading
+    :param bool update_working_block: if True (the default), also make the
+        loaded block the working block
+    :return: the new block, of the same class as the one saved
+
+    Loading creates the wires and nets directly, without going through the
+    checks done while elaborating a design, so it takes time linear in the size
+    of the file.  The pre-synthesis wires and memories that are keys of the
+    ``io_map``, ``reg_map`` and ``mem_map`` of a :class:`.PostSynthBlock` are
+    recreated in a separate block of their own.
+
+    A file that is truncated, fails its checksum or otherwise does not decode
+    raises a :class:`.PyrtlError`.
+    """
+    if hasattr(path, 'read'):
+        data = path.read()
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    if data[:len(_MAGIC)] != _MAGIC:
+        raise PyrtlError('not a PyRTL block file')
+    r = _Reader(data)
+    r.take(len(_MAGIC))
+    version, block_kind, checksum = _HEADER.unpack(r.take(_HEADER.size))
+    if version != _VERSION:
+        raise PyrtlError('block file is format version %d, but only version %d is supported'
+                         % (version, _VERSION))
+    if zlib.crc32(r.data[r.pos:]) != checksum:
+        raise PyrtlError('block file is corrupted (checksum mismatch)')
+    if block_kind >= len(_BLOCK_TYPES):
+        raise PyrtlError('block file is corrupted (unknown block class %d)' % block_kind)
+    try:
+        block = _read_block(r, _BLOCK_TYPES[block_kind]())
+    except (IndexError, KeyError, ValueError, OverflowError, struct.error) as e:
+        raise PyrtlError('block file is corrupted (%s: %s)' % (type(e).__name__, e)) from e
+    if r.pos != len(r.data):
+        raise PyrtlError('block file is corrupted (%d bytes of trailing data)'
+                         % (len(r.data) - r.pos))
+
+    if update_working_block:
+        set_working_block(block, no_sanity_check=True)
+    return block
+
+
+def _read_block(r, block):
+    """ Decode the sections of a block file into `block`, which is returned.
+
+    The indices into the tables of the file are used as they are, so a file
+    that is inconsistent raises IndexError or KeyError.
+    """
+    original = Block()  # holds the pre-synthesis wires and memories
+
+    names, kinds, bitwidths = r.strings(), r.array(), r.array()
+    num_block_wires = r.uint()
+    const_vals = dict(zip(r.array(), r.ints()))
+    reset_values = dict(zip(r.array(), r.ints()))
+    wires = _make_wires(names, kinds, bitwidths, const_vals, reset_values,
+                        num_block_wires, block, original)
+
+    mem_names, fields = r.strings(), r.array()
+    mems = []
+    for i, name in enumerate(mem_names):
+        memid, bitwidth, addrwidth, max_read, max_write, flags = fields[6 * i:6 * i + 6]
+        owner = original if flags & _EXTERNAL else block
+        max_read = max_read - 1 if max_read else None
+        if flags & _ROM:
+            keys = r.ints() if flags & _MAPPING else None
+            values = r.ints()
+            mem = RomBlock(bitwidth, addrwidth, values if keys is None else dict(zip(keys, values)),
+                           name=name, max_read_ports=max_read,
+                           build_new_roms=bool(flags & _BUILD_NEW_ROMS),
+                           asynchronous=bool(flags & _ASYNC),
+                           pad_with_zeros=bool(flags & _PAD_WITH_ZEROS), block=owner)
+        else:
+            mem = MemBlock(bitwidth, addrwidth, name=name, max_read_ports=max_read,
+                           max_write_ports=max_write - 1 if max_write else None,
+                           asynchronous=bool(flags & _ASYNC), block=owner)
+        mem.id = memid
+        mems.append(mem)
+
+    ops, arg_offsets, args, dests = r.array(), r.array(), r.array(), r.array()
+    select_lengths, select_bits, mem_refs = r.array(), r.array(), r.array()
+    nets = []
+    next_select = next_bit = next_mem = 0
+    for n, code in enumerate(ops):
+        op = CompactNetlist.OPS[code]
+        net_args = tuple([wires[a] for a in args[arg_offsets[n]:arg_offsets[n + 1]]])
+        net_dests = () if dests[n] == CompactNetlist.NO_ID else (wires[dests[n]],)
+        param = None
+        if op == 's':
+            length = select_lengths[next_select]
+            param = tuple(select_bits[next_bit:next_bit + length])
+            next_select += 1
+            next_bit += length
+        elif op in 'm@':
+            mem = mems[mem_refs[next_mem]]
+            param = (mem.id, mem)
+            next_mem += 1
+        elif op == 'r':
+            net_dests[0].reg_in = net_args[0]
+        net = LogicNet(op, param, net_args, net_dests)
+        if op == 'm':
+            mem.readport_nets.append(net)
+            mem.num_read_ports += 1
+        elif op == '@':
+            mem.writeport_nets.append(net)
+            mem.num_write_ports += 1
+        nets.append(net)
+    block.logic.update(nets)
+
+    assert_wires, exp_classes = r.array(), r.strings()
+    num_args, exp_args = r.array(), r.strings()
+    next_arg = 0
+    for w, cls_path, count in zip(assert_wires, exp_classes, num_args):
+        block.rtl_assert_dict[wires[w]] = _make_exception(
+            cls_path, exp_args[next_arg:next_arg + count])
+        next_arg += count
+
+    present = dict(zip(_MAPS, r.array()))
+    for attr in ('io_map', 'reg_map'):
+        if present[attr]:
+            keys, is_list, lengths, values = r.array(), r.array(), r.array(), r.array()
+            mapping = {}
+            start = 0
+            for k, listed, length in zip(keys, is_list, lengths):
+                v = [wires[w] for w in values[start:start + length]]
+                mapping[wires[k]] = v if listed else v[0]
+                start += length
+            _set_map(block, attr, mapping)
+    if present['mem_map']:
+        keys, values = r.array(), r.array()
+        _set_map(block, 'mem_map', {mems[k]: mems[v] for k, v in zip(keys, values)})
+    return block
+
+
+def _make_wires(names, kinds, bitwidths, const_vals, reset_values,
+                num_block_wires, block, original):
+    """ Create the wires of a block file and add them to their blocks, in bulk.
+
+    The wires are created without calling their constructors: the names,
+    values and bitwidths were checked when the block was saved.
+    """
+    if not len(names) == len(kinds) == len(bitwidths) >= num_block_wires:
+        raise PyrtlError('block file is corrupted (inconsistent wire tables)')
+    wires = []
+    owner = block
+    for i, (name, kind, bitwidth) in enumerate(zip(names, kinds, bitwidths)):
+        if i == num_block_wires:
+            owner = original
+        wires.append(_unchecked_wire(_WIRE_TYPES[kind], name, bitwidth or None, owner,
+                                     const_vals.get(i), reset_values.get(i)))
+    block._add_wirevectors_unchecked(wires[:num_block_wires])
+    original._add_wirevectors_unchecked(wires[num_block_wires:])
+    return wires
+
+
+def _make_exception(cls_path, args):
+    """ Create the exception of an assertion, from its class and arguments.
+
+    The class is only looked up in modules that have already been imported:
+    importing a module named in the file would run whatever code it contains.
+    """
+    module_name, _, qualname = cls_path.partition(':')
+    if module_name not in sys.modules:
+        raise PyrtlError('cannot load assertion: module "%s" of exception class "%s" '
+                         'has not been imported' % (module_name, cls_path))
+    try:
+        cls = sys.modules[module_name]
+        for attr in qualname.split('.'):
+            cls = getattr(cls, attr)
+    except AttributeError:
+        raise PyrtlError('cannot load assertion: exception class "%s" not found' % cls_path)
+    if not (isinstance(cls, type) and issubclass(cls, Exception)):
+        raise PyrtlError('cannot load assertion: "%s" is not an exception class' % cls_path)
+    return cls(*args)
+
+
+def _set_map(block, attr, mapping):
+    current = getattr(block, attr, None)
+    if isinstance(current, dict):
+        current.clear()
+        current.update(mapping)
+    else:
+        setattr(block, attr, mapping)
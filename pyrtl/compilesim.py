@@ -7,11 +7,12 @@ import platform
 import sys
 import _ctypes
 
-from .core import working_block
 from .wire import Input, Output, Const, WireVector, Register
 from .memory import MemBlock, RomBlock
+from .netlist import _as_block
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
-from .simulation import SimulationTrace, _trace_sort_key
+from .simulation import SimulationTrace, MismatchTable, _stimulus_chunks, _chunked
+from .simulation import _compare_columns, _counter_wires, ActivityCounts
 
 try:
     from collections.abc import Mapping
@@ -22,6 +23,24 @@ except ImportError:
 __all__ = ['CompiledSimulation']
 
 
+# inline assembly for efficient 64x64 -> 128 bit multiplication, per architecture
+_mulinstr = {
+    'x86_64': '"mulq %q3":"=a"(pl),"=d"(ph):"%0"(t0),"r"(t1):"cc"',
+    'arm64': '"mul %0, %2, %3\\n\\t" \\\n'
+             '"umulh %1, %2, %3":"=&r"(pl),"=r"(ph):"r"(t0),"r"(t1):"cc"',
+    'mips64': '"dmultu %2, %3\\n\\t" \\\n'
+              '"tmflo %0\\n\\t" \\\n'
+              '"mfhi %1":"=r"(pl),"=r"(ph):"r"(t0),"r"(t1)',
+}
+
+
+def _machine():
+    """ Name of the host architecture, normalized to the keys of _mulinstr. """
+    machine_alias = {'amd64': 'x86_64', 'aarch64': 'arm64', 'aarch64_be': 'arm64'}
+    machine = platform.machine().lower()
+    return machine_alias.get(machine, machine)
+
+
 class DllMemInspector(Mapping):
     """ Dictionary-like access to a hashmap in a CompiledSimulation. """
 
@@ -59,7 +78,8 @@ class CompiledSimulation(object):
     This module provides significant speed improvements over
     :class:`.FastSimulation`, at the cost of somewhat longer setup time.
     Generally this will do better than :class:`.FastSimulation` for simulations
-    requiring over 1000 steps.  It is not built to be a debugging tool, though
+    requiring over 1000 steps (:func:`.make_simulation` can make that choice
+    based on the size of the design).  It is not built to be a debugging tool, though
     it may help with debugging.  Note that only :class:`.Input` and
     :class:`.Output` wires can be traced using CompiledSimulation.  This code
     is still experimental, but has been used on designs of significant scale to
@@ -100,19 +120,32 @@ class CompiledSimulation(object):
     are from *before* the register has latched in its newly calculated values,
     since that latching in occurs at the beginning of the *next* step.
 
+    Toggle, cycles-high and event counts can be accumulated by the compiled
+    code itself, without tracing, by passing `activity_wires` (wires or names
+    for which to count, per bit, toggles and cycles spent high; True for all
+    wires) and `event_wires` (wires or names for which to count the cycles in
+    which they are nonzero).  Read them at any time with :meth:`counters`.
+    Unlike tracing, counting works on internal wires too.
+
     """
 
     def __init__(
             self, tracer=True, register_value_map={}, memory_value_map={},
-            default_value=0, block=None):
+            default_value=0, block=None, activity_wires=None, event_wires=None):
         self._dll = self._dir = None
-        self.block = working_block(block)
+        self.block, register_value_map, memory_value_map = _as_block(
+            block, register_value_map, memory_value_map)
         self.block.sanity_check()
+        self._activity_wires = _counter_wires(self.block, activity_wires)
+        self._event_wires = _counter_wires(self.block, event_wires)
 
         if tracer is True:
-            tracer = SimulationTrace()
+            tracer = SimulationTrace(block=self.block)
         self.tracer = tracer
-        self._remove_untraceable()
+        self._probe_mapping = {}
+        self._last_run = None
+        if tracer is not None:
+            self._remove_untraceable()
 
         self.default_value = default_value
         self._regmap = {}  # Updated below
@@ -120,7 +153,7 @@ class CompiledSimulation(object):
         self._uid_counter = 0
         self.varname = {}  # mapping from wires and memories to C variables
 
-        for r in self.block.wirevector_subset(Register):
+        for r in self.block.wirevector_view(Register):
             rval = register_value_map.get(r, r.reset_value)
             if rval is None:
                 rval = self.default_value
@@ -129,11 +162,44 @@ class CompiledSimulation(object):
         # Passing the dictionary objects themselves since they aren't updated anywhere.
         # If that's ever not the case, will need to pass in deep copies of them like done
         # for the normal Simulation so we retain the initial values that had.
-        self.tracer._set_initial_values(default_value, self._regmap, self._memmap)
+        if tracer is not None:
+            self.tracer._set_initial_values(default_value, self._regmap, self._memmap)
 
         self._create_dll()
         self._initialize_mems()
 
+    def counters(self):
+        """ Read the counters accumulated since creation (or the last :meth:`reset_counters`).
+
+        :return: an :class:`.ActivityCounts`
+        """
+        def array(name, size):
+            return (ctypes.c_uint64 * size).in_dll(self._dll, name)
+
+        toggles, high = {}, {}
+        for k, w in enumerate(self._activity_wires):
+            toggles[w.name] = list(array('counter_toggles{}'.format(k), w.bitwidth))
+            high[w.name] = list(array('counter_high{}'.format(k), w.bitwidth))
+        events = {}
+        if self._event_wires:
+            counts = array('counter_events', len(self._event_wires))
+            events = {w.name: counts[k] for k, w in enumerate(self._event_wires)}
+        cycles = ctypes.c_uint64.in_dll(self._dll, 'counter_cycles').value
+        return ActivityCounts(cycles, toggles, high, events)
+
+    def reset_counters(self):
+        """ Set all the counters back to zero. """
+        def clear(name, size):
+            arr = (ctypes.c_uint64 * size).in_dll(self._dll, name)
+            ctypes.memset(arr, 0, ctypes.sizeof(arr))
+
+        for k, w in enumerate(self._activity_wires):
+            clear('counter_toggles{}'.format(k), w.bitwidth)
+            clear('counter_high{}'.format(k), w.bitwidth)
+        if self._event_wires:
+            clear('counter_events', len(self._event_wires))
+        clear('counter_cycles', 1)
+
     def inspect_mem(self, mem):
         """Get a view into the contents of a MemBlock."""
         return DllMemInspector(self, mem)
@@ -142,14 +208,13 @@ class CompiledSimulation(object):
         """Get the latest value of the wire given, if possible."""
         if isinstance(w, WireVector):
             w = w.name
-        try:
-            vals = self.tracer.trace[w]
-        except KeyError:
-            pass
-        else:
-            if not vals:
-                raise PyrtlError('No context available. Please run a simulation step')
-            return vals[-1]
+        if self._last_run is None:
+            raise PyrtlError('No context available. Please run a simulation step')
+        if self.tracer is not None and w in self.tracer.trace:
+            return self.tracer.trace[w][-1]
+        val = self._last_values(w, step=-1)
+        if val is not None:
+            return val
         raise PyrtlError('CompiledSimulation does not support inspecting internal WireVectors')
 
     def step(self, inputs):
@@ -170,18 +235,25 @@ class CompiledSimulation(object):
         self.run([inputs])
 
     def step_multiple(self, provided_inputs={}, expected_outputs={}, nsteps=None,
-                      file=sys.stdout, stop_after_first_error=False):
+                      file=sys.stdout, stop_after_first_error=False,
+                      max_mismatches=None):
         """Take the simulation forward N cycles, where N is the number of values
          for each provided input.
 
         :param provided_inputs: a dictionary mapping wirevectors to their values for N steps
+            (a sequence, string or any other iterable), or an iterable of per-step dictionaries
+            of input values
         :param expected_outputs: a dictionary mapping wirevectors to their expected values
             for N steps; use ``?`` to indicate you don't care what the value at that step is
         :param nsteps: number of steps to take (defaults to None, meaning step for each
             supplied input value)
-        :param file: where to write the output (if there are unexpected outputs detected)
+        :param file: where to write the output (if there are unexpected outputs detected);
+            None to not print anything
         :param stop_after_first_error: a boolean flag indicating whether to stop the simulation
             after the step where the first errors are encountered (defaults to False)
+        :param max_mismatches: stop recording unexpected outputs after this many (defaults
+            to None, meaning record them all)
+        :return: a :class:`.MismatchTable` of the unexpected outputs
 
         All input wires must be in the `provided_inputs` in order for the simulation
         to accept these values. Additionally, the length of the array of provided values for each
@@ -210,6 +282,9 @@ class CompiledSimulation(object):
         0 and 0, respectively, on the first cycle and 1 and 1, respectively, on the second
         cycle.
 
+        Values can also come from generators and other iterables, which are
+        consumed in fixed-size chunks, as described in :meth:`.Simulation.step_multiple`.
+
         Example: if the design had no inputs, like so::
 
             a = pyrtl.Register(8)
@@ -226,84 +301,49 @@ class CompiledSimulation(object):
 
         """
 
-        if not nsteps and len(provided_inputs) == 0:
-            raise PyrtlError('need to supply either input values or a number of steps to simulate')
-
-        if len(provided_inputs) > 0:
-            longest = sorted(list(provided_inputs.items()),
-                             key=lambda t: len(t[1]),
-                             reverse=True)[0]
-            msteps = len(longest[1])
-            if nsteps:
-                if (nsteps > msteps):
-                    raise PyrtlError('nsteps is specified but is greater than the '
-                                     'number of values supplied for each input')
+        chunks = _stimulus_chunks(provided_inputs, expected_outputs, nsteps)
+
+        mismatches = MismatchTable(max_mismatches, stop_after_first_error)
+        for start, inputs, expected_columns in chunks:
+            inputs = [{w: int(v) for w, v in step_inputs.items()} for step_inputs in inputs]
+            if stop_after_first_error and expected_columns:
+                # step one at a time so the simulation stops right at the first error
+                for i, step_inputs in enumerate(inputs):
+                    self.step(step_inputs)
+                    mismatches._add(self._compare_chunk(
+                        start + i, {w: c[i:i + 1] for w, c in expected_columns.items()}, None))
+                    if mismatches:
+                        break
             else:
-                nsteps = msteps
-
-        if nsteps < 1:
-            raise PyrtlError("must simulate at least one step")
-
-        if list(filter(lambda value: len(value) < nsteps,
-                       provided_inputs.values())):
-            raise PyrtlError(
-                "must supply a value for each provided wire "
-                "for each step of simulation")
-
-        if list(filter(lambda value: len(value) < nsteps,
-                       expected_outputs.values())):
-            raise PyrtlError(
-                "any expected outputs must have a supplied value "
-                "each step of simulation")
-
-        failed = []
-        for i in range(nsteps):
-            self.step({w: int(v[i]) for w, v in provided_inputs.items()})
-
-            for expvar in expected_outputs.keys():
-                expected = expected_outputs[expvar][i]
-                if expected == '?':
-                    continue
-                expected = int(expected)
-                actual = self.inspect(expvar)
-                if expected != actual:
-                    failed.append((i, expvar, expected, actual))
-
-            if failed and stop_after_first_error:
+                self._run_chunk(inputs)
+                mismatches._add(self._compare_chunk(start, expected_columns, mismatches.remaining))
+            if mismatches and stop_after_first_error:
                 break
 
-        if failed:
-            if stop_after_first_error:
-                s = "(stopped after step with first error):"
-            else:
-                s = "on one or more steps:"
-            file.write("Unexpected output " + s + "\n")
-            file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n"
-                       .format("step", "name", "expected", "actual"))
-
-            def _sort_tuple(t):
-                # Sort by step and then wire name
-                return (t[0], _trace_sort_key(t[1]))
-
-            failed_sorted = sorted(failed, key=_sort_tuple)
-            for (step, name, expected, actual) in failed_sorted:
-                file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n".format(step, name, expected, actual))
-            file.flush()
+        if mismatches and file is not None:
+            mismatches.render(file)
+        return mismatches
 
     def run(self, inputs):
         """ Run many steps of the simulation.
 
-        :param inputs: A list of input mappings for each step;
-            its length is the number of steps to be executed.
+        :param inputs: A list (or any other iterable, such as a generator) of
+            input mappings for each step; its length is the number of steps to
+            be executed.
+
+        Steps are packed into the input buffer of the compiled code and run
+        a fixed-size chunk at a time, so memory use does not depend on the
+        number of steps (apart from the trace itself, if there is a tracer).
         """
+        for chunk in _chunked(inputs):
+            self._run_chunk(chunk)
+
+    def _run_chunk(self, inputs):
+        """ Run one step of the simulation for each of the input mappings in a list. """
         steps = len(inputs)
         # create i/o arrays of the appropriate length
-        ibuf_type = ctypes.c_uint64 * (steps * self._ibufsz)
-        obuf_type = ctypes.c_uint64 * (steps * self._obufsz)
-        ibuf = ibuf_type()
-        obuf = obuf_type()
-        # these array will be passed to _crun
-        self._crun.argtypes = [ctypes.c_uint64, ibuf_type, obuf_type]
+        ibuf = (ctypes.c_uint64 * (steps * self._ibufsz))()
+        obuf = (ctypes.c_uint64 * (steps * self._obufsz))()
 
         # build the input array
         for n, inmap in enumerate(inputs):
@@ -326,20 +366,116 @@ class CompiledSimulation(object):
 
         # run the simulation
         self._crun(steps, ibuf, obuf)
+        self._last_run = steps, ibuf, obuf
 
         # save traced wires
-        for name in self.tracer.trace:
+        if self.tracer is not None:
+            for name in self.tracer.trace:
+                res = self._last_values(name)
+                if res is None:
+                    raise PyrtlInternalError('Untraceable wire in tracer')
+                self.tracer.trace[name].extend(res)
+
+    def _compare_chunk(self, start, expected_columns, limit):
+        """ Compare the last chunk run against columns of expected values.
+
+        Outputs are compared by sim_compare in the compiled code, against
+        buffers laid out like the output buffer plus a mask that is zero for
+        don't-care ('?') values.  Other traceable wires are compared in Python.
+
+        :param start: step number of the first step of the chunk
+        :param expected_columns: map from wire (or name) to list of expected values
+        :param limit: only the mismatches of the first `limit` failing steps
+            need to be found (None to find them all); those of at least one
+            more failing step are found, if there is one
+        :return: list of (step, name, expected, actual) tuples
+        """
+        steps, ibuf, obuf = self._last_run
+        sz = self._obufsz
+        size = steps * sz
+        expected_buf = (ctypes.c_uint64 * size)()
+        mask_buf = (ctypes.c_uint64 * size)()
+        limb_owner = {}  # output buffer position -> name of the wire compared there
+        expected_by_name = {}
+        allones = (1 << 64) - 1
+
+        rows = []
+        for expvar, column in expected_columns.items():
+            name = expvar.name if isinstance(expvar, WireVector) else expvar
             rname = self._probe_mapping.get(name, name)
-            if rname in self._outputpos:
-                start, count = self._outputpos[rname]
-                buf, sz = obuf, self._obufsz
-            elif rname in self._inputpos:
-                start, count = self._inputpos[rname]
-                buf, sz = ibuf, self._ibufsz
-            else:
-                raise PyrtlInternalError('Untraceable wire in tracer')
+            pos, count = self._outputpos.get(rname, (None, 0))
+            if pos is None or pos in limb_owner:
+                # not an output (or already being compared under another name)
+                actuals = self._last_values(name)
+                if actuals is None:
+                    raise PyrtlError('CompiledSimulation does not support inspecting '
+                                     'internal WireVectors')
+                rows.extend(_compare_columns(start, {name: column}, {name: actuals}))
+                continue
+            expected = [None if e == '?' else int(e) for e in column]
+            bound = 1 << (64 * count)
+            if any(e is not None and not 0 <= e < bound for e in expected):
+                # can never match, and can't be packed into the buffer
+                actuals = self._last_values(name)
+                rows.extend((start + i, name, e, actuals[i]) for i, e in enumerate(expected)
+                            if e is not None and not 0 <= e < bound)
+                expected = [None if e is None or not 0 <= e < bound else e for e in expected]
+            mask = [0 if e is None else allones for e in expected]
+            for limb in range(count):
+                shift = 64 * limb
+                expected_buf[pos + limb:size:sz] = [0 if e is None else (e >> shift) & allones
+                                                    for e in expected]
+                mask_buf[pos + limb:size:sz] = mask
+                limb_owner[pos + limb] = name
+            expected_by_name[name] = expected
+
+        if not limb_owner:
+            return rows
+        # look one failing step past the limit, so the caller can tell if
+        # there were more mismatches than it asked for
+        capacity = size if limit is None else min(size, (limit + 1) * sz)
+        failures = (ctypes.c_uint64 * max(capacity, 1))()
+        nfail = self._ccompare(size, obuf, expected_buf, mask_buf, capacity, failures)
+        failed = set()
+        for n in range(min(nfail, capacity)):
+            step, limb = divmod(failures[n], sz)
+            failed.add((step, limb_owner[limb]))
+        for step, name in failed:
+            rows.append((start + step, name, expected_by_name[name][step],
+                         self._last_values(name, step)))
+        return rows
+
+    def _last_values(self, w, step=None):
+        """ Values of an input or output in the last chunk run.
+
+        :param w: the wire or its name
+        :param step: index of the step in the chunk to get the value of (negative
+            indices count from the end), or None to get the values of all steps
+        :return: a value, a list of values, or None if the wire is neither an
+            input nor an output (nor a wire probed by an output)
+        """
+        name = w.name if isinstance(w, WireVector) else w
+        rname = self._probe_mapping.get(name, name)
+        steps, ibuf, obuf = self._last_run
+        if rname in self._outputpos:
+            start, count = self._outputpos[rname]
+            buf, sz = obuf, self._obufsz
+        elif rname in self._inputpos:
+            start, count = self._inputpos[rname]
+            buf, sz = ibuf, self._ibufsz
+        else:
+            return None
+        if step is None:
+            first, last = 0, steps
+        else:
+            first = step % steps
+            last = first + 1
+        if count == 1:
+            res = buf[start + first * sz:last * sz:sz]
+        else:
             res = []
-            for n in range(steps):
+            start += first * sz
+            for n in range(first, last):
                 val = 0
                 # unpack output
                 for pos in reversed(range(start, start + count)):
@@ -347,7 +483,7 @@ class CompiledSimulation(object):
                     val |= buf[pos]
                 res.append(val)
                 start += sz
-            self.tracer.trace[name].extend(res)
+        return res if step is None else res[0]
 
     def _traceable(self, wv):
         """ Check if wv is able to be traced.
@@ -392,7 +528,13 @@ class CompiledSimulation(object):
                               shell=(platform.system() == 'Windows'))
         self._dll = ctypes.CDLL(path.join(self._dir, 'pyrtlsim.so'))
         self._crun = self._dll.sim_run_all
-        self._crun.restype = None  # argtypes set on use
+        self._crun.restype = None
+        self._crun.argtypes = [ctypes.c_uint64, ctypes.POINTER(ctypes.c_uint64),
+                               ctypes.POINTER(ctypes.c_uint64)]
+        self._ccompare = self._dll.sim_compare
+        self._ccompare.restype = ctypes.c_uint64
+        self._ccompare.argtypes = [ctypes.c_uint64] + [ctypes.POINTER(ctypes.c_uint64)] * 3 + [
+            ctypes.c_uint64, ctypes.POINTER(ctypes.c_uint64)]
         self._initialize_mems = self._dll.initialize_mems
         self._initialize_mems.restype = None
         self._mem_lookup = self._dll.lookup
@@ -749,22 +891,12 @@ class CompiledSimulation(object):
         # multiplication macro
         #  for efficient 64x64 -> 128 bit multiplication without uint128_t
         #  as -O0 optimization does not handle uint128_t well
-        machine_alias = {'amd64': 'x86_64', 'aarch64': 'arm64', 'aarch64_be': 'arm64'}
-        machine = platform.machine().lower()
-        machine = machine_alias.get(machine, machine)
-        mulinstr = {
-            'x86_64': '"mulq %q3":"=a"(pl),"=d"(ph):"%0"(t0),"r"(t1):"cc"',
-            'arm64': '"mul %0, %2, %3\\n\\t" \\\n'
-                     '"umulh %1, %2, %3":"=&r"(pl),"=r"(ph):"r"(t0),"r"(t1):"cc"',
-            'mips64': '"dmultu %2, %3\\n\\t" \\\n'
-                      '"tmflo %0\\n\\t" \\\n'
-                      '"mfhi %1":"=r"(pl),"=r"(ph):"r"(t0),"r"(t1)',
-        }
-        if machine in mulinstr:
-            write('#define mul128(t0, t1, pl, ph) __asm__({})'.format(mulinstr[machine]))
+        machine = _machine()
+        if machine in _mulinstr:
+            write('#define mul128(t0, t1, pl, ph) __asm__({})'.format(_mulinstr[machine]))
 
         # declare memories
-        mems = {net.op_param[1] for net in self.block.logic_subset('m@')}
+        mems = {net.op_param[1] for net in self.block.logic_view('m@')}
         for key in self._memmap:
             if key not in mems:
                 raise PyrtlError('unrecognized MemBlock in memory_value_map')
@@ -776,6 +908,15 @@ class CompiledSimulation(object):
         mems = {mem for mem in mems if isinstance(mem, MemBlock) and not isinstance(mem, RomBlock)}
         self._declare_mems(write, mems)
 
+        # counters, which are read from python by name
+        write('EXPORT uint64_t counter_cycles = 0;')
+        for k, w in enumerate(self._activity_wires):
+            write('static uint64_t counter_prev{k}[{limbs}];'.format(k=k, limbs=self._limbs(w)))
+            write('EXPORT uint64_t counter_toggles{k}[{bw}];'.format(k=k, bw=w.bitwidth))
+            write('EXPORT uint64_t counter_high{k}[{bw}];'.format(k=k, bw=w.bitwidth))
+        if self._event_wires:
+            write('EXPORT uint64_t counter_events[{}];'.format(len(self._event_wires)))
+
         # single step function
         write('static void sim_run_step(uint64_t inputs[], uint64_t outputs[]) {')
         write('uint64_t tmp, carry, tmphi, tmplo;')  # temporary variables
@@ -785,7 +926,7 @@ class CompiledSimulation(object):
             self._declare_wv(write, w)
 
         # inputs copied in
-        inputs = list(self.block.wirevector_subset(Input))
+        inputs = list(self.block.wirevector_view(Input))
         self._inputpos = {}  # for each input wire, start and number of elements in input array
         self._inputbw = {}  # bitwidth of each input wire
         ipos = 0
@@ -825,7 +966,7 @@ class CompiledSimulation(object):
             op_builders[op](write, op, param, args, dest)
 
         # memory writes
-        for net in self.block.logic_subset('@'):
+        for net in self.block.logic_view('@'):
             mem = net.op_param[1]
             write('if ({enable}[0]) {{'.format(enable=self.varname[net.args[2]]))
             write('insert({mem}, {addr}[0], {vn});'.format(
@@ -835,8 +976,25 @@ class CompiledSimulation(object):
             ))
             write('}')
 
+        # counters, before registers take on their next values
+        for k, w in enumerate(self._activity_wires):
+            for n in range(self._limbs(w)):
+                write('tmp = {vn}[{n}];'.format(vn=self.varname[w], n=n))
+                write('if (counter_cycles) {')
+                write('carry = tmp ^ counter_prev{k}[{n}];'.format(k=k, n=n))
+                write('while (carry) {{ counter_toggles{k}[{base} + __builtin_ctzll(carry)]++; '
+                      'carry &= carry - 1; }}'.format(k=k, base=64 * n))
+                write('}')
+                write('counter_prev{k}[{n}] = tmp;'.format(k=k, n=n))
+                write('while (tmp) {{ counter_high{k}[{base} + __builtin_ctzll(tmp)]++; '
+                      'tmp &= tmp - 1; }}'.format(k=k, base=64 * n))
+        for k, w in enumerate(self._event_wires):
+            cond = ' | '.join('{}[{}]'.format(self.varname[w], n) for n in range(self._limbs(w)))
+            write('if ({cond}) counter_events[{k}]++;'.format(cond=cond, k=k))
+        write('counter_cycles++;')
+
         # register updates
-        regnets = list(self.block.logic_subset('r'))
+        regnets = list(self.block.logic_view('r'))
         for x, net in enumerate(regnets):
             rin = net.args[0]
             write('uint64_t regtmp{x}[{limbs}];'.format(x=x, limbs=self._limbs(rin)))
@@ -849,7 +1007,7 @@ class CompiledSimulation(object):
                 write('{vn}[{n}] = regtmp{x}[{n}];'.format(vn=self.varname[rout], x=x, n=n))
 
         # output copied out
-        outputs = list(self.block.wirevector_subset(Output))
+        outputs = list(self.block.wirevector_view(Output))
         self._outputpos = {}  # for each output wire, start and number of elements in output array
         opos = 0
         for w in outputs:
@@ -870,6 +1028,20 @@ class CompiledSimulation(object):
         write('output_pos += {};'.format(self._obufsz))
         write('}}')
 
+        # comparison of an output buffer against expected values, where mask
+        # is zero for limbs that are not checked
+        write('EXPORT')
+        write('uint64_t sim_compare(uint64_t count, uint64_t outputs[], uint64_t expected[], '
+              'uint64_t mask[], uint64_t maxfail, uint64_t failures[]) {')
+        write('uint64_t nfail = 0;')
+        write('for (uint64_t pos = 0; pos < count; pos++) {')
+        write('if ((outputs[pos] ^ expected[pos]) & mask[pos]) {')
+        write('if (nfail < maxfail) failures[nfail] = pos;')
+        write('nfail++;')
+        write('}}')
+        write('return nfail;')
+        write('}')
+
     def __del__(self):
         """Handle removal of the DLL when the simulator is deleted."""
         if self._dll is not None:
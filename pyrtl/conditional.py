@@ -70,6 +70,8 @@ called is currently elaborating hardware under a condition.
 # Access should be done through instances "conditional_update" and "otherwise",
 # as described above, not through the classes themselves.
 
+import contextvars
+
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
 from .wire import WireVector, Const, Register
 
@@ -83,7 +85,7 @@ from .wire import WireVector, Const, Register
 
 def currently_under_condition():
     """ Returns True if execution is currently in the context of a ``_ConditionalAssignment.`` """
-    return _depth > 0
+    return _state().depth > 0
 
 
 # -----------------------------------------------------------------------
@@ -91,18 +93,20 @@ def currently_under_condition():
 # instances (hopefully the only and unchanging instances) of the following two types.
 
 class _ConditionalAssignment(object):
-    def __init__(self):
-        self.defaults = {}
+    """ Context providing functionality of "conditional_assignment". """
+    def __init__(self, defaults=None):
+        self.defaults = {} if defaults is None else defaults
 
     def __call__(self, defaults):
-        self.defaults = defaults
-        return self
+        # a new instance, rather than setting the defaults on the shared one,
+        # so that other threads using conditional_assignment are not affected
+        return _ConditionalAssignment(defaults)
 
-    """ Context providing functionality of "conditional_assignment". """
     def __enter__(self):
-        global _depth
         _check_no_nesting()
-        _depth = 1
+        state = _ConditionalState()
+        state.depth = 1
+        _conditional_state.set(state)
 
     def __exit__(self, *exc_info):
         try:
@@ -110,7 +114,7 @@ class _ConditionalAssignment(object):
         finally:
             # even if the above finalization throws an error we need to
             # reset the state to prevent errors from bleeding over
-            _reset_conditional_state()  # sets _depth back to 0
+            _reset_conditional_state()  # sets depth back to 0
 
 
 class _Otherwise(object):
@@ -122,25 +126,37 @@ class _Otherwise(object):
         _pop_condition()
 
 
+class _ConditionalState(object):
+    """ The state of the conditional assignment being elaborated. """
+    def __init__(self):
+        self.depth = 0
+        self.conditions_list_stack = [[]]  # stack of lists of current conditions
+        # predicate_map: map wirevector or mem -> [(final_pred, rhs), ...]
+        self.predicate_map = {}
+        # conflicts_map: map wirevector or mem -> [ set([(pred,bool), (pred,bool)]), set([(pr..
+        # * each element maps to a list of sets of tuples of (predicate id, bool)
+        # * each time a value is written (lhs) we add the predicate set to the list
+        # * each new write happens we have to check that the new predicate has at least one
+        #   negated term with the value we are now trying to write.  Otherwise it is an error.
+        self.conflicts_map = {}
+
+
+# The state is kept in a context variable so that each thread (or asyncio task)
+# elaborates its own conditional assignments.  Entering conditional_assignment
+# always sets a new state, so the idle state below is never changed.
+_conditional_state = contextvars.ContextVar('pyrtl_conditional_state',
+                                            default=_ConditionalState())
+
+
+def _state():
+    return _conditional_state.get()
+
+
 def _reset_conditional_state():
-    """ Set or reset all the module state required for conditionals. """
-    global _conditions_list_stack
-    global _conflicts_map
-    global _predicate_map
-    global _depth
-    _depth = 0
-    _conditions_list_stack = [[]]  # stack of lists of current conditions
-    # _predicate_map: map wirevector or mem -> [(final_pred, rhs), ...]
-    _predicate_map = {}
-    # _conflicts_map: map wirevector or mem -> [ set([(pred,bool), (pred,bool)]), set([(pred,bool)..
-    # * each element maps to a list of sets of tuples of (predicate id, bool)
-    # * each time a value is written (lhs) we add the predicate set to the list
-    # * each new write happens we have to check that the new predicate has at least one negated
-    #   term with the value we are now trying to write.  Otherwise it is an error.
-    _conflicts_map = {}
-
-
-_reset_conditional_state()
+    """ Set or reset all the state required for conditionals (in the current context). """
+    _conditional_state.set(_ConditionalState())
+
+
 conditional_assignment = _ConditionalAssignment()
 otherwise = _Otherwise()
 
@@ -151,21 +167,21 @@ otherwise = _Otherwise()
 
 def _push_condition(predicate):
     """As we enter new conditions, this pushes them on the predicate stack."""
-    global _depth
     _check_under_condition()
-    _depth += 1
+    state = _state()
+    state.depth += 1
     if predicate is not otherwise and len(predicate) > 1:
         raise PyrtlError('all predicates for conditional assignments must be wirevectors of len 1')
-    _conditions_list_stack[-1].append(predicate)
-    _conditions_list_stack.append([])
+    state.conditions_list_stack[-1].append(predicate)
+    state.conditions_list_stack.append([])
 
 
 def _pop_condition():
     """As we exit conditions, this pops them off the stack."""
-    global _depth
     _check_under_condition()
-    _conditions_list_stack.pop()
-    _depth -= 1
+    state = _state()
+    state.conditions_list_stack.pop()
+    state.depth -= 1
 
 
 def _build(lhs, rhs):
@@ -173,7 +189,7 @@ def _build(lhs, rhs):
     _check_under_condition()
     final_predicate, pred_set = _current_select()
     _check_and_add_pred_set(lhs, pred_set)
-    _predicate_map.setdefault(lhs, []).append((final_predicate, rhs))
+    _state().predicate_map.setdefault(lhs, []).append((final_predicate, rhs))
 
 
 def _build_read_port(mem, addr):
@@ -185,7 +201,7 @@ def _build_read_port(mem, addr):
 # The following helper functions are used only internally
 
 def _check_no_nesting():
-    if _depth != 0:
+    if _state().depth != 0:
         raise PyrtlError('no nesting of conditional assignments allowed')
 
 
@@ -195,10 +211,11 @@ def _check_under_condition():
 
 
 def _check_and_add_pred_set(lhs, pred_set):
-    for test_set in _conflicts_map.setdefault(lhs, []):
+    conflicts = _state().conflicts_map.setdefault(lhs, [])
+    for test_set in conflicts:
         if _pred_sets_are_in_conflict(pred_set, test_set):
             raise PyrtlError('conflicting conditions for %s' % lhs)
-    _conflicts_map[lhs].append(pred_set)
+    conflicts.append(pred_set)
 
 
 def _pred_sets_are_in_conflict(pred_set_a, pred_set_b):
@@ -213,18 +230,35 @@ def _pred_sets_are_in_conflict(pred_set_a, pred_set_b):
 
 
 def _finalize(defaults):
-    """Build the required muxes and call back to WireVector to finalize the wirevector build."""
+    """Build the required muxes and call back to WireVector to finalize the wirevector build.
+
+    The conflict check in _build makes sure that the predicates of the
+    assignments to any one lhs are mutually exclusive, so the order in which
+    they are muxed together does not matter.  A chain of n muxes is n deep;
+    with more than 3 assignments a balanced tree of muxes is shallower.
+    """
     from .memory import MemBlock
     from pyrtl.corecircuits import select
-    for lhs in _predicate_map:
+    predicate_map = _state().predicate_map
+    for lhs in predicate_map:
         # handle memory write ports
         if isinstance(lhs, MemBlock):
-            p, (addr, data, enable) = _predicate_map[lhs][0]
+            predlist = predicate_map[lhs]
+            if len(predlist) > 3:
+                # when no predicate is true only the enable matters, so the
+                # fallback reuses the address and data of the last write
+                _, (addr, data, _) = predlist[-1]
+                _, (addr, data, enable) = _balanced_select(
+                    predlist + [(None, (addr, data, Const(0)))])
+                lhs._build(addr, data, enable)
+                continue
+
+            p, (addr, data, enable) = predlist[0]
             combined_enable = select(p, truecase=enable, falsecase=Const(0))
             combined_addr = addr
             combined_data = data
 
-            for p, (addr, data, enable) in _predicate_map[lhs][1:]:
+            for p, (addr, data, enable) in predlist[1:]:
                 combined_enable = select(p, truecase=enable, falsecase=combined_enable)
                 combined_addr = select(p, truecase=addr, falsecase=combined_addr)
                 combined_data = select(p, truecase=data, falsecase=combined_data)
@@ -245,28 +279,50 @@ def _finalize(defaults):
                     result = 0  # default for wire is "0"
             else:
                 raise PyrtlInternalError('unknown assignment in finalize')
-            predlist = _predicate_map[lhs]
-            for p, rhs in predlist:
-                result = select(p, truecase=rhs, falsecase=result)
+            predlist = predicate_map[lhs]
+            if len(predlist) > 3:
+                _, (result,) = _balanced_select(
+                    [(p, (rhs,)) for p, rhs in predlist] + [(None, (result,))])
+            else:
+                for p, rhs in predlist:
+                    result = select(p, truecase=rhs, falsecase=result)
             lhs._build(result)
 
 
+def _balanced_select(predlist, need_predicate=False):
+    """ Mux together values under mutually exclusive predicates with a balanced tree.
+
+    :param predlist: list of (predicate, values) pairs, where values is a tuple;
+        the last predicate may be None, for the values to use when no other
+        predicate is true
+    :param need_predicate: whether to build and return the predicate that is
+        true if any of those in predlist is (defaults to False)
+    :return: (predicate, values) where the predicate is None unless
+        `need_predicate` is set, and the values are those of the predicate
+        that is true
+
+    Each mux selects on the combined predicate of its left subtree, so those
+    are the only combined predicates built.
+    """
+    from pyrtl.corecircuits import select
+    if len(predlist) == 1:
+        return predlist[0] if need_predicate else (None, predlist[0][1])
+    half = len(predlist) // 2
+    p_left, left = _balanced_select(predlist[:half], need_predicate=True)
+    p_right, right = _balanced_select(predlist[half:], need_predicate)
+    values = tuple(lv if lv is rv else select(p_left, truecase=lv, falsecase=rv)
+                   for lv, rv in zip(left, right))
+    return (p_left | p_right if need_predicate else None), values
+
+
 def _current_select():
     """ Function to calculate the current "predicate" in the current context.
 
     Returns a tuple of information: (predicate, pred_set).
     The value pred_set is a set([ (predicate, bool), ... ]) as described in
-    the _reset_conditional_state
+    in _ConditionalState
     """
-
-    # helper to create the conjuction of predicates
-    def and_with_possible_none(a, b):
-        assert a is not None or b is not None
-        if a is None:
-            return b
-        if b is None:
-            return a
-        return a & b
+    from pyrtl.corecircuits import tree_reduce
 
     def between_otherwise_and_current(predlist):
         lastother = None
@@ -278,23 +334,25 @@ def _current_select():
         else:
             return predlist[lastother + 1:-1]
 
-    select = None
+    terms = []
     pred_set = set()
 
     # for all conditions except the current children (which should be [])
-    for predlist in _conditions_list_stack[:-1]:
+    for predlist in _state().conditions_list_stack[:-1]:
         # negate all of the predicates between "otherwise" and the current one
         for predicate in between_otherwise_and_current(predlist):
-            select = and_with_possible_none(select, ~predicate)
+            terms.append(~predicate)
             pred_set.add((predicate, True))
         # include the predicate for the current one (not negated)
         if predlist[-1] is not otherwise:
             predicate = predlist[-1]
-            select = and_with_possible_none(select, predicate)
+            terms.append(predicate)
             pred_set.add((predicate, False))
 
-    if select is None:
+    if not terms:
         raise PyrtlError('problem with conditional assignment')
+    # a balanced tree, so the predicate of the nth case is log(n) deep
+    select = tree_reduce(lambda a, b: a & b, terms)
     if len(select) != 1:
         raise PyrtlInternalError('conditional predicate with length greater than 1')
 
@@ -9,8 +9,13 @@ Included in this file you will find:
 
 """
 import collections
+import collections.abc
+import contextvars
 import re
 import keyword
+import sys
+import threading
+import types
 
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
 
@@ -97,6 +102,8 @@ class LogicNet(collections.namedtuple('LogicNet', ['op', 'op_param', 'args', 'de
 
     """
 
+    __slots__ = ()  # no per-net __dict__, just the tuple
+
     def __str__(self):
         rhs = ', '.join(str(x) for x in self.args)
         lhs = ', '.join(str(x) for x in self.dests)
@@ -161,9 +168,9 @@ class LogicNet(collections.namedtuple('LogicNet', ['op', 'op_param', 'args', 'de
             else:
                 raise PyrtlInternalError('error, unknown op "%s"' % str(self.op))
 
-    def __hash__(self):
-        # it seems that namedtuple is not always hashable
-        return hash(tuple(self))
+    # defining __eq__ hides the hash of the namedtuple, so put it back (it is
+    # hashed on every add to and removal from a block's logic)
+    __hash__ = tuple.__hash__
 
     def __eq__(self, other):
         # We can't be going and calling __eq__ recursively on the logic nets for all of
@@ -197,6 +204,188 @@ class LogicNet(collections.namedtuple('LogicNet', ['op', 'op_param', 'args', 'de
     __ge__ = _compare_error
 
 
+class _BlockSet(set):
+    """ A set of nets or wires that tells its Block about every element added or removed.
+
+    Block.logic and Block.wirevector_set are instances of this so that code
+    which manipulates them directly (as many of the passes do) still
+    invalidates everything the block has memoized and updates the indexes
+    the block maintains.  `on_change` is called with the elements added and
+    removed after every change (Block._nets_changed or Block._wires_changed).
+    """
+
+    def __init__(self, on_change, iterable=()):
+        super(_BlockSet, self).__init__(iterable)
+        self._changed = on_change
+
+    def __reduce__(self):
+        return (type(self), (self._changed, list(self)))
+
+    def add(self, item):
+        if item not in self:
+            set.add(self, item)
+            self._changed((item,), ())
+
+    def remove(self, item):
+        set.remove(self, item)
+        self._changed((), (item,))
+
+    def discard(self, item):
+        if item in self:
+            set.remove(self, item)
+            self._changed((), (item,))
+
+    def pop(self):
+        item = set.pop(self)
+        self._changed((), (item,))
+        return item
+
+    def clear(self):
+        removed = list(self)
+        set.clear(self)
+        self._changed((), removed)
+
+    def update(self, *others):
+        added = [x for x in set().union(*others) if x not in self]
+        set.update(self, added)
+        self._changed(added, ())
+
+    def difference_update(self, *others):
+        removed = [x for x in set().union(*others) if x in self]
+        set.difference_update(self, removed)
+        self._changed((), removed)
+
+    def intersection_update(self, *others):
+        removed = list(set.difference(self, set.intersection(self, *others)))
+        set.difference_update(self, removed)
+        self._changed((), removed)
+
+    def symmetric_difference_update(self, other):
+        other = set(other)
+        removed = [x for x in other if x in self]
+        added = [x for x in other if x not in self]
+        set.difference_update(self, removed)
+        set.update(self, added)
+        self._changed(added, removed)
+
+    def __ior__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.symmetric_difference_update(other)
+        return self
+
+
+class _BucketView(collections.abc.Set):
+    """ A read-only, live view of the union of some of a Block's buckets.
+
+    :param buckets: function returning the (disjoint) sets to view
+    """
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def __contains__(self, item):
+        return any(item in bucket for bucket in self._buckets())
+
+    def __iter__(self):
+        for bucket in self._buckets():
+            yield from bucket
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets())
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, set(self))
+
+
+class ConnectionIndex(object):
+    """ A live map from each wire to the nets that drive it and the nets that use it.
+
+    Get the index of a block with :meth:`.Block.connection_index`.  Unlike the
+    maps returned by :meth:`.Block.net_connections`, which are a snapshot,
+    the index is kept up to date by the block itself as nets are added and
+    removed, at a cost proportional to the number of wires each net touches.
+    A pass that makes many small edits can therefore look up drivers and
+    sinks after each edit without recomputing anything.
+    """
+
+    def __init__(self, nets=()):
+        self._drivers = {}  # wire -> {net: None}, used as an ordered set
+        self._sinks = {}
+        for net in nets:
+            self._add(net)
+
+    def driver(self, wire):
+        """ Get the net driving a wire.
+
+        :param WireVector wire: the wire to look up
+        :return: the LogicNet with `wire` as a dest, or None if nothing drives it
+            (as for an Input or Const)
+        """
+        nets = self._drivers.get(wire)
+        if not nets:
+            return None
+        if len(nets) > 1:
+            raise PyrtlError('Wire "%s" has multiple drivers: %s'
+                             % (wire.name, ', '.join(str(n) for n in nets)))
+        return next(iter(nets))
+
+    def sinks(self, wire):
+        """ Get the nets using a wire as an argument.
+
+        :param WireVector wire: the wire to look up
+        :return: tuple of the LogicNets with `wire` among their args (each
+            listed once, even if it uses `wire` more than once)
+        """
+        return tuple(self._sinks.get(wire, ()))
+
+    def fanout(self, wire):
+        """ Number of places a wire is used as an argument (see :func:`.fanout`). """
+        return sum(arg is wire for net in self._sinks.get(wire, ()) for arg in net.args)
+
+    def _add(self, net):
+        for arg in set(net.args):
+            self._sinks.setdefault(arg, {})[net] = None
+        for dest in net.dests:
+            self._drivers.setdefault(dest, {})[net] = None
+
+    def _remove(self, net):
+        for wire_map, wires in ((self._sinks, set(net.args)), (self._drivers, net.dests)):
+            for w in wires:
+                nets = wire_map[w]
+                del nets[net]
+                if not nets:
+                    del wire_map[w]
+
+    def _rebuild(self, nets):
+        self._drivers = {}
+        self._sinks = {}
+        for net in nets:
+            self._add(net)
+
+
 class Block(object):
     """Block encapsulates a netlist.
 
@@ -291,6 +480,17 @@ class Block(object):
 
     def __init__(self):
         """Creates an empty hardware block."""
+        self._generation = 0  # bumped on every change to logic or wirevector_set
+        self._memo = {}  # results memoized for the generation in _memo_generation
+        self._memo_generation = None
+        self._connection_index = None  # live ConnectionIndex, once one is asked for
+        self._wires_by_type = {}  # map from WireVector class->set of wires of exactly that class
+        self._nets_by_op = {}  # map from op->set of nets with that op
+        self._const_pool = None  # map from (val, bitwidth)->Const, when interning Consts
+        self._net_table = None  # map from net key->dest wire, when hashing nets
+        # nets and wires changed since the last passing sanity_check (None until there is one)
+        self._dirty_nets = self._dirty_wires = None
+        self._logic = self._wirevector_set = None
         self.logic = set()  # set of nets, each is a LogicNet named tuple
         self.wirevector_set = set()  # set of all WireVectors
         self.wirevector_by_name = {}  # map from name->WireVector, used for performance
@@ -298,6 +498,7 @@ class Block(object):
         self.legal_ops = set('w~&|^n+-*<>=xcsrm@')  # set of legal OPS
         self.rtl_assert_dict = {}   # map from WireVectors -> exceptions, used by rtl_assert
         self.memblock_by_name = {}  # map from name->memblock, for easy access to memblock objs
+        self.instances = {}  # map from name->ModuleInstance, see pyrtl.hierarchy
 
     def __str__(self):
         """String form has one LogicNet per line."""
@@ -309,6 +510,210 @@ class Block(object):
         else:
             return '\n'.join(str(net) for net in self)
 
+    def __getstate__(self):
+        """ Leave the memoized results out of copies and pickles. """
+        state = self.__dict__.copy()
+        state['_memo'] = {}
+        state['_memo_generation'] = None
+        state['_connection_index'] = None
+        state['_dirty_nets'] = state['_dirty_wires'] = None
+        return state
+
+    @property
+    def logic(self):
+        """ The set of :class:`LogicNets <.LogicNet>` in the block. """
+        return self._logic
+
+    @logic.setter
+    def logic(self, nets):
+        if nets is not self._logic:  # "block.logic |= nets" has already been handled
+            self._logic = _BlockSet(self._nets_changed, nets)
+            self._generation += 1
+            self._nets_by_op = {}
+            self._bucket(self._nets_by_op, self._logic, (), lambda net: net.op)
+            if self._connection_index is not None:
+                self._connection_index._rebuild(self._logic)
+            if self._net_table is not None:
+                self._net_table = {}
+            self._dirty_nets = self._dirty_wires = None
+
+    @property
+    def wirevector_set(self):
+        """ The set of all WireVectors in the block. """
+        return self._wirevector_set
+
+    @wirevector_set.setter
+    def wirevector_set(self, wires):
+        if wires is not self._wirevector_set:  # see the logic setter
+            self._wirevector_set = _BlockSet(self._wires_changed, wires)
+            self._generation += 1
+            self._wires_by_type = {}
+            self._bucket(self._wires_by_type, self._wirevector_set, (), type)
+            if self._const_pool:
+                self._const_pool = {k: c for k, c in self._const_pool.items()
+                                    if c in self._wirevector_set}
+            self._dirty_nets = self._dirty_wires = None
+
+    @property
+    def generation(self):
+        """ A counter that changes whenever the nets or wires of the block change.
+
+        Every change to :attr:`logic` or :attr:`wirevector_set`, including
+        through :meth:`add_net`, :meth:`add_wirevector`,
+        :meth:`remove_wirevector` or by replacing either set outright, bumps
+        it.  Results computed from the structure of the block (such as the
+        topological order and :meth:`connections`) are memoized until the
+        generation changes.
+        """
+        return self._generation
+
+    @property
+    def intern_consts(self):
+        """ Whether identical unnamed Consts in the block are shared.
+
+        Off by default.  When set to True, creating a :class:`.Const` without
+        a name (including the Consts made for integer literals, as in
+        ``x == 0``) returns the Const already in the block with the same value
+        and bitwidth, if there is one, instead of a new wire.  Large designs
+        then carry one Const per distinct value rather than one per use,
+        which makes elaboration and every later pass cheaper.  Consts given
+        an explicit name are never shared.  Setting it back to False forgets
+        the Consts seen so far.
+        """
+        return self._const_pool is not None
+
+    @intern_consts.setter
+    def intern_consts(self, enable):
+        if not enable:
+            self._const_pool = None
+        elif self._const_pool is None:
+            self._const_pool = {}
+
+    @property
+    def hash_nets(self):
+        """ Whether building an expression reuses an identical net already in the block.
+
+        Off by default.  When set to True, the operators on WireVectors
+        (``&``, ``+``, ``==``, ``~``, slicing, ...), :func:`.concat`,
+        :func:`.select` and the extension functions first look for a net
+        already built with the same op, op_param and args (in either order for
+        commutative ops, and with Consts compared by value), and if there is
+        one return its dest instead of adding a new net and wire.  Generators
+        that rebuild the same subexpressions many times then elaborate
+        straight into a netlist without the redundancy that
+        :func:`.common_subexp_elimination` would otherwise have to remove.
+        Only nets built while it is on are found.  Setting it back to False
+        forgets them.
+        """
+        return self._net_table is not None
+
+    @hash_nets.setter
+    def hash_nets(self, enable):
+        if not enable:
+            self._net_table = None
+        elif self._net_table is None:
+            self._net_table = {}
+
+    @staticmethod
+    def _net_key(op, op_param, args):
+        """ Key under which a net is found when hashing nets. """
+        from .wire import Const
+        args = tuple((a.bitwidth, a.val) if isinstance(a, Const) else a for a in args)
+        if op in '&|^n+*=':  # commutative, as in common_subexp_elimination
+            args = tuple(sorted(args, key=hash))
+        return op, op_param, args
+
+    def _hashed_net_dest(self, op, op_param, args, bitwidth):
+        """ Add a net computing a new wire of `bitwidth` from `args` and return the wire.
+
+        When :attr:`hash_nets` is set and an identical net is already in the
+        block, that net's dest is returned and nothing is added.
+        """
+        from .wire import WireVector
+        table = self._net_table
+        if table is not None:
+            key = self._net_key(op, op_param, args)
+            dest = table.get(key)
+            if dest is not None:
+                return dest
+        dest = WireVector(bitwidth=bitwidth, block=self)
+        self.add_net(LogicNet(op=op, op_param=op_param, args=args, dests=(dest,)))
+        if table is not None:
+            table[key] = dest
+        return dest
+
+    @staticmethod
+    def _bucket(buckets, added, removed, key):
+        """ Keep a map from key to the set of elements with that key up to date. """
+        for x in removed:
+            buckets[key(x)].remove(x)
+        for x in added:
+            k = key(x)
+            if k in buckets:
+                buckets[k].add(x)
+            else:
+                buckets[k] = {x}
+
+    def _nets_changed(self, added, removed):
+        """ Called by Block.logic whenever nets are added to or removed from it. """
+        self._generation += 1
+        if self._dirty_nets is not None:
+            self._dirty_nets.update(added)
+            for net in removed:
+                self._dirty_nets.discard(net)
+                self._dirty_wires.update(net.args)
+                self._dirty_wires.update(net.dests)
+        self._bucket(self._nets_by_op, added, removed, lambda net: net.op)
+        if self._net_table:
+            for net in removed:
+                if net.dests:
+                    key = self._net_key(net.op, net.op_param, net.args)
+                    if self._net_table.get(key) is net.dests[0]:
+                        del self._net_table[key]
+        index = self._connection_index
+        if index is not None:
+            for net in removed:
+                index._remove(net)
+            for net in added:
+                index._add(net)
+
+    def _wires_changed(self, added, removed):
+        """ Called by Block.wirevector_set whenever wires are added to or removed from it. """
+        self._generation += 1
+        self._bucket(self._wires_by_type, added, removed, type)
+        if self._dirty_wires is not None:
+            self._dirty_wires.update(added)
+            self._dirty_wires.update(removed)
+        if self._const_pool:
+            from .wire import Const
+            for w in removed:
+                if isinstance(w, Const) and self._const_pool.get((w.val, w.bitwidth)) is w:
+                    del self._const_pool[(w.val, w.bitwidth)]
+
+    def connection_index(self):
+        """ Get the live :class:`.ConnectionIndex` of drivers and sinks of every wire.
+
+        :return: the block's ConnectionIndex
+
+        The first call builds the index, in time linear in the size of the
+        block.  From then on the block keeps it up to date on every change to
+        :attr:`logic`, so later calls are free.
+        """
+        if self._connection_index is None:
+            self._connection_index = ConnectionIndex(self.logic)
+        return self._connection_index
+
+    def _memoized(self, key, compute):
+        """ Return compute(), reusing the result until the block's generation changes. """
+        if self._memo_generation != self._generation:
+            self._memo = {}
+            self._memo_generation = self._generation
+        try:
+            return self._memo[key]
+        except KeyError:
+            result = self._memo[key] = compute()
+            return result
+
     def add_wirevector(self, wirevector):
         """ Add a WireVector object to the block.
 
@@ -318,6 +723,17 @@ class Block(object):
         self.sanity_check_wirevector(wirevector)
         self.wirevector_set.add(wirevector)
         self.wirevector_by_name[wirevector.name] = wirevector
+        if self._dirty_wires is not None:
+            self._dirty_wires.add(wirevector)  # it may have been renamed
+
+    def _add_wirevectors_unchecked(self, wirevectors):
+        """ Add many WireVectors to the block at once, without checking them.
+
+        For wires copied from a block that has already been checked, such as
+        those made by ``wire._unchecked_wire``; the names must be unique.
+        """
+        self.wirevector_set.update(wirevectors)
+        self.wirevector_by_name.update((w.name, w) for w in wirevectors)
 
     def remove_wirevector(self, wirevector):
         """ Remove a WireVector object from the block.
@@ -435,15 +851,13 @@ class Block(object):
 
             # returns set of all non-input WireVectors
             non_inputs = pyrtl.working_block().wirevector_subset(exclude=pyrtl.Input)
+
+        A new set is built on every call; code that only reads the result can
+        use :meth:`wirevector_view` instead.
         """
-        if cls is None:
-            initial_set = self.wirevector_set
-        else:
-            initial_set = (x for x in self.wirevector_set if isinstance(x, cls))
-        if exclude == tuple():
-            return set(initial_set)
-        else:
-            return set(x for x in initial_set if not isinstance(x, exclude))
+        if cls is None and exclude == tuple():
+            return set(self.wirevector_set)
+        return set().union(*self._wire_buckets(cls, exclude))
 
     def logic_subset(self, op=None):
         """Return set of LogicNets, filtered by the type(s) of logic op provided as op.
@@ -453,11 +867,50 @@ class Block(object):
 
         If no `op` is specified, the full set of LogicNets associated with the Block are
         returned.  This is helpful for getting all memories of a block for example.
+        Otherwise a new set is built on every call; code that only reads the result can
+        use :meth:`logic_view` instead.
         """
         if op is None:
             return self.logic
         else:
-            return set(x for x in self.logic if x.op in op)
+            return set().union(*self._net_buckets(op))
+
+    def wirevector_view(self, cls=None, exclude=tuple()):
+        """Return a read-only view of the WireVectors of some types.
+
+        :param cls: Type of WireVector objects in the view
+        :param exclude: Type of WireVector objects to exclude
+        :return: a live, read-only set of the WireVectors that are both a cls type
+            and not an excluded type
+
+        This selects the same wires as :meth:`wirevector_subset`, but without
+        building a new set: the block keeps its wires bucketed by type, and
+        the view looks through the matching buckets.  The view reflects later
+        changes to the block, so copy it (e.g. with ``set(view)``) before
+        adding or removing wires while iterating over it.
+        """
+        return _BucketView(lambda: self._wire_buckets(cls, exclude))
+
+    def logic_view(self, op=None):
+        """Return a read-only view of the LogicNets with some op(s).
+
+        :param op: Operation(s) of LogicNet in the view. Defaults to None, meaning all.
+        :return: a live, read-only set of LogicNets with corresponding op
+
+        This is the :meth:`wirevector_view` counterpart of :meth:`logic_subset`.
+        """
+        if op is None:
+            return _BucketView(lambda: (self.logic,))
+        return _BucketView(lambda: self._net_buckets(op))
+
+    def _wire_buckets(self, cls, exclude):
+        if cls is None:
+            cls = object
+        return [wires for t, wires in self._wires_by_type.items()
+                if issubclass(t, cls) and not issubclass(t, exclude)]
+
+    def _net_buckets(self, op):
+        return [nets for o, nets in self._nets_by_op.items() if o in op]
 
     def get_wirevector_by_name(self, name, strict=False):
         """Return the WireVector matching name.
@@ -515,7 +968,41 @@ class Block(object):
         Look at :func:`.net_graph` for one such graph that uses the information
         from this function.
 
+        The dictionaries are new on every call, so callers are free to modify
+        them.  Code that only reads them should use :meth:`connections`,
+        which avoids the copy.
         """
+        src_dict, dst_dict = self._connections(include_virtual_nodes)
+        return (Block._NetConnectionsDict(src_dict),
+                Block._NetConnectionsDict((w, list(nets)) for w, nets in dst_dict.items()))
+
+    def connections(self, include_virtual_nodes=False):
+        """ Read-only version of :meth:`net_connections` that is memoized.
+
+        :param bool include_virtual_nodes: as for :meth:`net_connections`
+        :return: the same two maps as :meth:`net_connections`, as read-only
+            mappings (and with tuples of nets rather than lists in
+            `wire_sink_dict`)
+
+        The maps are computed once per :attr:`generation` of the block, so
+        analyses that only read them can call this as often as they like.
+        Each call returns a snapshot: after the block changes, maps returned
+        earlier still describe the block as it was.
+        """
+        return self._memoized(('connections', include_virtual_nodes),
+                              lambda: self._connections_view(include_virtual_nodes))
+
+    def _connections_view(self, include_virtual_nodes):
+        src_dict, dst_dict = self._connections(include_virtual_nodes)
+        return (types.MappingProxyType(Block._NetConnectionsDict(src_dict)),
+                types.MappingProxyType(Block._NetConnectionsDict(dst_dict)))
+
+    def _connections(self, include_virtual_nodes):
+        """ The maps of net_connections, with tuples of sinks, memoized per generation. """
+        return self._memoized(('raw_connections', include_virtual_nodes),
+                              lambda: self._compute_connections(include_virtual_nodes))
+
+    def _compute_connections(self, include_virtual_nodes):
         src_list = {}
         dst_list = {}
 
@@ -537,10 +1024,10 @@ class Block(object):
 
         if include_virtual_nodes:
             from .wire import Input, Output, Const
-            for wire in self.wirevector_subset((Input, Const)):
+            for wire in self.wirevector_view((Input, Const)):
                 add_wire_src(wire, wire)
 
-            for wire in self.wirevector_subset(Output):
+            for wire in self.wirevector_view(Output):
                 add_wire_dst(wire, wire)
 
         for net in self.logic:
@@ -549,7 +1036,7 @@ class Block(object):
             for dest in net.dests:
                 add_wire_src(dest, net)
 
-        return Block._NetConnectionsDict(src_list), Block._NetConnectionsDict(dst_list)
+        return src_list, {w: tuple(nets) for w, nets in dst_list.items()}
 
     def _repr_svg_(self):
         """ IPython display support for Block. """
@@ -565,12 +1052,20 @@ class Block(object):
         logic that do not involve registers.
         Also, the order of the nets is not guaranteed to be the same
         over multiple iterations.
+
+        The order is memoized, so iterating again over an unchanged block
+        (see :attr:`generation`) does not redo the sort.
         """
+        return iter(self._memoized('topological_order', self._topological_order))
+
+    def _topological_order(self):
+        """ Compute the tuple of nets iterated over by __iter__. """
         from .wire import Input, Const, Register
-        src_dict, dest_dict = self.net_connections()
+        src_dict, dest_dict = self._connections(False)
         to_clear = self.wirevector_subset((Input, Const, Register))
         cleared = set()
-        remaining = self.logic.copy()
+        remaining = set(self.logic)
+        order = []
         try:
             while len(to_clear):
                 wire_to_check = to_clear.pop()
@@ -578,7 +1073,7 @@ class Block(object):
                 if wire_to_check in dest_dict:
                     for gate in dest_dict[wire_to_check]:  # loop over logicnets not yet returned
                         if all(arg in cleared for arg in gate.args):  # if all args ready
-                            yield gate
+                            order.append(gate)
                             remaining.remove(gate)
                             if gate.op != 'r':
                                 to_clear.update(gate.dests)
@@ -589,22 +1084,102 @@ class Block(object):
             from pyrtl.helperfuncs import find_and_print_loop
             find_and_print_loop(self)
             raise PyrtlError("Failure in Block Iterator due to non-register loops")
+        return tuple(order)
 
-    def sanity_check(self):
+    def sanity_check(self, full=False):
         """ Check block and throw PyrtlError or PyrtlInternalError if there is an issue.
 
+        :param bool full: check the whole block, even if it passed a check before
+            (defaults to False)
+
         Should not modify anything, only check data structures to make sure they have been
         built according to the assumptions stated in the Block comments.
+
+        Once a block has passed a check, the next check only looks at the nets
+        and wires added, removed or renamed since then, together with the nets
+        driving or using those wires, and at the memory read ports.  Changes
+        made to the block through :attr:`logic`, :attr:`wirevector_set` and
+        the methods of Block are all tracked, but changes made behind the
+        block's back (such as setting the bitwidth of a wire already in use,
+        or editing ``wirevector_by_name`` directly) are not; use ``full=True``
+        after those.  Any problem found by a partial check is reported by
+        rerunning the full check, so the errors raised are the same either way.
+        In debug mode every check is a full one.
         """
+        if full or debug_mode or not self._sanity_check_changes():
+            self._sanity_check_full()
+        self._dirty_nets = set()
+        self._dirty_wires = set()
+
+    def _sanity_check_changes(self):
+        """ Check only what changed since the last passing check.
 
+        :return: True if the block is good; False if a full check is needed, either
+            because there has not been a passing check yet or because something
+            looks wrong.
+        """
+        from .wire import Input, Const
+        from .hierarchy import _check_instance_ports
+
+        if self._dirty_nets is None:
+            return False
+        index = self.connection_index()
+        nets = set(n for n in self._dirty_nets if n in self.logic)
+        for w in self._dirty_wires:
+            nets.update(index._drivers.get(w, ()))
+            nets.update(index._sinks.get(w, ()))
+        wires = set(self._dirty_wires)
+        for net in nets:
+            wires.update(net.args)
+            wires.update(net.dests)
+
+        try:
+            for net in nets:
+                self.sanity_check_net(net)
+        except (PyrtlError, PyrtlInternalError):
+            return False
+        if len(self.wirevector_by_name) != len(self.wirevector_set):
+            return False
+        instance_outputs, instance_inputs = self._instance_ports()
+        for w in wires:
+            named = self.wirevector_by_name.get(w.name) is w
+            if w not in self.wirevector_set:
+                if named or w in index._drivers or w in index._sinks:
+                    return False
+                continue
+            drivers = index._drivers.get(w, ())
+            if w in instance_outputs:
+                drivers = tuple(drivers) + (None,)
+            if not named or w.bitwidth is None or len(drivers) > 1:
+                return False
+            if not drivers and not isinstance(w, (Input, Const)):
+                return False  # used but never driven, or not connected at all
+
+        try:
+            self.sanity_check_memory_sync()
+            _check_instance_ports(self.instances.values())
+        except PyrtlError:
+            return False
+        return True
+
+    def _instance_ports(self):
+        """ The sets of wires driven by, and used by, the module instances of the block. """
+        outputs, inputs = set(), set()
+        for instance in self.instances.values():
+            outputs.update(instance.outputs.values())
+            inputs.update(instance.inputs.values())
+        return outputs, inputs
+
+    def _sanity_check_full(self):
         from .wire import Input, Const, Output
         from .helperfuncs import get_stack, get_stacks
+        from .hierarchy import _check_instance_ports
 
         # check for valid LogicNets (and wires)
         for net in self.logic:
             self.sanity_check_net(net)
 
-        for w in self.wirevector_subset():
+        for w in self.wirevector_set:
             if w.bitwidth is None:
                 raise PyrtlError(
                     'error, missing bitwidth for WireVector "%s" \n\n %s' % (w.name, get_stack(w)))
@@ -621,9 +1196,17 @@ class Block(object):
                              'internal use)' % repr(wirevector_names_list))
 
         # The following line also checks for duplicate wire drivers
-        wire_src_dict, wire_dst_dict = self.net_connections()
+        wire_src_dict, wire_dst_dict = self.connections()
         dest_set = set(wire_src_dict.keys())
         arg_set = set(wire_dst_dict.keys())
+        instance_outputs, instance_inputs = self._instance_ports()
+        driven_twice = dest_set & instance_outputs
+        if driven_twice:
+            raise PyrtlError('Wires driven by both a module instance and a net: %s'
+                             % [w.name for w in driven_twice])
+        _check_instance_ports(self.instances.values())
+        dest_set |= instance_outputs
+        arg_set |= instance_inputs
         full_set = dest_set | arg_set
         connected_minus_allwires = full_set.difference(self.wirevector_set)
         if len(connected_minus_allwires) > 0:
@@ -631,7 +1214,7 @@ class Block(object):
             raise PyrtlError('Unknown wires found in net:\n %s \n\n %s' % (bad_wire_names,
                              get_stacks(*connected_minus_allwires)))
 
-        all_input_and_consts = self.wirevector_subset((Input, Const))
+        all_input_and_consts = self.wirevector_view((Input, Const))
 
         # Check for wires that aren't connected to anything (inputs and consts can be unconnected)
         allwires_minus_connected = self.wirevector_set.difference(full_set)
@@ -674,7 +1257,7 @@ class Block(object):
             # Check for wires that are destinations of a logicNet, but are not outputs and are never
             # used as args.
             outs = dest_set.difference(arg_set)
-            unused = outs.difference(self.wirevector_subset(Output))
+            unused = outs.difference(self.wirevector_view(Output))
             if len(unused) > 0:
                 names = [w.name for w in unused]
                 print('Warning: Wires driven but never used { %s } ' % names)
@@ -689,23 +1272,27 @@ class Block(object):
         and throw an error on any memory if finds that has an index that is not ready at the
         beginning of the cycle.
         """
-        sync_mems = set(m for m in self.logic_subset('m') if not m.op_param[1].asynchronous)
+        sync_mems = set(m for m in self.logic_view('m') if not m.op_param[1].asynchronous)
         if not len(sync_mems):
             return  # nothing to check here
 
         if wire_src_dict is None:
-            wire_src_dict, wdd = self.net_connections()
+            driver = self.connection_index().driver
+        else:
+            driver = wire_src_dict.__getitem__
 
         from .wire import Input, Const
         sync_src = 'r'
         sync_prop = 'wcs'
+        # what drives the outputs of module instances is only known once flattened
+        instance_outputs = self._instance_ports()[0]
         for net in sync_mems:
             wires_to_check = list(net.args)
             while len(wires_to_check):
                 wire = wires_to_check.pop()
-                if isinstance(wire, (Input, Const)):
+                if isinstance(wire, (Input, Const)) or wire in instance_outputs:
                     continue
-                src_net = wire_src_dict[wire]
+                src_net = driver(wire)
                 if src_net.op == sync_src:
                     continue
                 elif src_net.op in sync_prop:
@@ -867,10 +1454,12 @@ class PostSynthBlock(Block):
 #    |/\| \__/ |  \ |  \ | | \| \__>    |__) |___ \__/ \__, |  \
 #
 
-# Right now we use singleton_block to store the one global
-# block, but in the future we should support multiple Blocks.
-# The argument "singleton_block" should never be passed.
-_singleton_block = Block()
+# The working block is kept in a context variable, so that each thread (and
+# each asyncio task, which starts with a copy of its creator's context) can
+# elaborate into its own block.  A context that has never set a working block
+# gets a new, empty one the first time it asks for it.
+_working_block = contextvars.ContextVar('pyrtl_working_block')
+_working_block.set(Block())
 
 # settings help tweak the behavior of pyrtl as needed, especially
 # when there is a trade off between speed and debugability.  These
@@ -900,25 +1489,50 @@ def _get_useful_callpoint_name():
     if not _setting_slower_but_more_descriptive_tmps:
         return None
 
-    import inspect
+    # walk the raw frames rather than inspect.stack(), which reads the source
+    # of every frame and is far too slow to call for every temporary wire
     loc = None
-    frame_stack = inspect.stack()
+    frame = sys._getframe(1)
     try:
-        for frame in frame_stack:
-            modname = inspect.getmodule(frame[0]).__name__
+        while frame is not None:
+            modname = frame.f_globals.get('__name__') or ''
             if not modname.startswith('pyrtl.'):
-                full_filename = frame[0].f_code.co_filename
+                full_filename = frame.f_code.co_filename
                 filename = full_filename.split('/')[-1].rstrip('.py')
-                lineno = frame[0].f_lineno
-                loc = (filename, lineno)
+                loc = (filename, frame.f_lineno)
                 break
-    except Exception:
-        loc = None
+            frame = frame.f_back
     finally:
-        del frame_stack
+        del frame
     return loc
 
 
+def _capture_call_frames():
+    """ Capture the current call stack cheaply, for formatting only if it is needed.
+
+    :return: tuple of (code object, line number) pairs, innermost call last, from
+        the caller of this function outwards
+
+    Unlike traceback.format_stack(), this neither looks up source lines nor
+    keeps the frames (and so their locals) alive.  Format the result with
+    :func:`_format_call_frames`.
+    """
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        frames.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    frames.reverse()
+    return tuple(frames)
+
+
+def _format_call_frames(frames):
+    """ Format frames from _capture_call_frames() the way traceback.format_stack() does. """
+    import traceback
+    return traceback.format_list([traceback.FrameSummary(code.co_filename, lineno, code.co_name)
+                                  for code, lineno in frames])
+
+
 def working_block(block=None):
     """ Convenience function for capturing the current working block.
 
@@ -926,10 +1540,18 @@ def working_block(block=None):
     this will return the "current working block".  However, if a block
     is passed in it will simply return that block instead.  This feature
     is useful in allowing functions to "override" the current working block.
+
+    The working block is local to the current thread (or asyncio task): a
+    new thread starts with an empty working block of its own.
     """
 
     if block is None:
-        return _singleton_block
+        try:
+            return _working_block.get()
+        except LookupError:
+            block = Block()
+            _working_block.set(block)
+            return block
     elif not isinstance(block, Block):
         raise PyrtlError('error, expected instance of Block as block argument')
     else:
@@ -938,8 +1560,7 @@ def working_block(block=None):
 
 def reset_working_block():
     """ Reset the working block to be empty. """
-    global _singleton_block
-    _singleton_block = Block()
+    _working_block.set(Block())
 
 
 class set_working_block(object):
@@ -952,13 +1573,12 @@ class set_working_block(object):
 
     @staticmethod
     def _set_working_block(block, no_sanity_check=False):
-        global _singleton_block
         if not isinstance(block, Block):
             raise PyrtlError('error, expected instance of Block as block argument')
-        if block is not _singleton_block:  # don't update if the blocks are the same
+        if block is not working_block():  # don't update if the blocks are the same
             if not no_sanity_check:
                 block.sanity_check()
-            _singleton_block = block
+            _working_block.set(block)
 
     def __init__(self, block, no_sanity_check=False):
         self.old_block = working_block()  # for with statement compatibility
@@ -990,6 +1610,10 @@ def set_debug_mode(debug=True):
     mode set to true, all temporary WireVectors created will be given a name based
     on the line of code on which they were created and a snapshot of the call-stack
     for those WireVectors will be kept as well.
+
+    The call-stack is recorded as bare (code, line number) pairs when each
+    WireVector is created and only turned into text when its ``init_call_stack``
+    is read, so debug mode costs little more than normal elaboration.
     """
     global debug_mode
     global _setting_keep_wirevector_call_stack
@@ -1003,20 +1627,40 @@ _py_regex = r'^[^\d\W]\w*\Z'
 
 
 class _NameIndexer(object):
-    """ Provides internal names that are based on a prefix and an index. """
+    """ Provides internal names that are based on a prefix and an index.
+
+    The index is shared by all threads, so that names generated while two
+    threads elaborate into the same block never collide.
+    """
     def __init__(self, internal_prefix='_sani_temp'):
         self.internal_prefix = internal_prefix
         self.internal_index = 0
+        self._lock = threading.Lock()
 
     def make_valid_string(self):
         """ Build a valid string based on the prefix and internal index. """
         return self.internal_prefix + str(self.next_index())
 
     def next_index(self):
-        index = self.internal_index
-        self.internal_index += 1
+        with self._lock:
+            index = self.internal_index
+            self.internal_index += 1
         return index
 
+    def reset(self):
+        """ Restart the index at 0. """
+        with self._lock:
+            self.internal_index = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
 
 class _NameSanitizer(_NameIndexer):
     """ Sanitizes the names so that names can be used in places that don't allow
@@ -4,7 +4,7 @@ import itertools
 import math
 
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
-from .core import LogicNet, working_block
+from .core import working_block
 from .wire import Const, WireVector, WrappedWireVector
 from pyrtl.rtllib import barrel
 from pyrtl.rtllib import muxes
@@ -102,11 +102,8 @@ def select(sel, truecase, falsecase):
     """
     sel, f, t = (as_wires(w) for w in (sel, falsecase, truecase))
     f, t = match_bitwidth(f, t)
-    outwire = WireVector(bitwidth=len(f))
-
-    net = LogicNet(op='x', op_param=None, args=(sel, f, t), dests=(outwire,))
-    working_block().add_net(net)  # this includes sanity check on the mux
-    return outwire
+    # adding the net includes the sanity check on the mux
+    return working_block()._hashed_net_dest('x', None, (sel, f, t), len(f))
 
 
 def concat(*args):
@@ -132,14 +129,7 @@ def concat(*args):
 
     arg_wirevectors = tuple(as_wires(arg) for arg in args)
     final_width = sum(len(arg) for arg in arg_wirevectors)
-    outwire = WireVector(bitwidth=final_width)
-    net = LogicNet(
-        op='c',
-        op_param=None,
-        args=arg_wirevectors,
-        dests=(outwire,))
-    working_block().add_net(net)
-    return outwire
+    return working_block()._hashed_net_dest('c', None, arg_wirevectors, final_width)
 
 
 def concat_list(wire_list):
@@ -0,0 +1,329 @@
+"""Asyncio co-simulation of a block with Python models of its environment."""
+
+import asyncio
+import heapq
+import itertools
+import warnings
+
+from .pyrtlexceptions import PyrtlError
+from .wire import Input, WireVector
+
+
+class CoSimulation(object):
+    """ Drive a simulation from asyncio coroutines.
+
+    Testbench components (bus masters, memory models, monitors, ...) are
+    written as coroutines that set inputs, read outputs, and wait for the
+    clock.  A scheduler interleaves them with the simulation, and whenever
+    every coroutine is waiting on the clock it runs the simulation up to the
+    earliest cycle any of them is waiting for in a single batch (a single
+    `step_multiple` call, which for :class:`.CompiledSimulation` is a single
+    pass through the compiled code).  A driver waiting on ``await
+    clock.cycles(1000)`` while nothing else needs to react therefore costs
+    one batch of 1000 cycles rather than 1000 individual steps.
+
+    Example::
+
+        sim = pyrtl.CompiledSimulation()
+        cosim = pyrtl.CoSimulation(sim)
+        clock = cosim.clock
+        req, ack = cosim.input('req'), cosim.output('ack')
+
+        async def master():
+            req.value = 1
+            await ack.wait_for(1)   # steps one cycle at a time
+            req.value = 0
+            await clock.cycles(1000)   # runs 1000 cycles in one batch
+
+        cosim.run(master())
+
+    Time is measured in completed cycles: :attr:`Clock.cycle` starts at 0,
+    and each rising edge runs one step of the simulation.  Values set on an
+    :class:`InputHandle` are held for every step until they are changed, and
+    all inputs start at 0.  Values read from an :class:`OutputHandle` are the
+    values from the most recent step.
+
+    Coroutines should only block on the clock, on these handles, or on each
+    other (e.g. through an :class:`asyncio.Queue`).  When no coroutine can make
+    progress without the clock advancing, the clock advances.  Create queues
+    and other asyncio objects inside a coroutine: :meth:`run` uses its own
+    event loop, and before Python 3.10 such objects bind to the event loop
+    that was current when they were created.
+    """
+
+    def __init__(self, sim):
+        """ Wrap a simulation for use from coroutines.
+
+        :param sim: a :class:`.Simulation`, :class:`.FastSimulation` or
+            :class:`.CompiledSimulation` that has not been stepped yet
+        """
+        self.sim = sim
+        self.clock = Clock(self)
+        self.batches = 0  # number of step_multiple calls made to the simulation
+        self._inputs = {w.name: 0 for w in sim.block.wirevector_view(Input)}
+        self._waiters = []  # heap of (cycle, seq, future)
+        self._seq = itertools.count()
+        self._progress = 0  # bumped whenever a coroutine interacts with the cosimulation
+        self._woken = None  # set whenever a coroutine interacts with the cosimulation
+        self._cycle = 0
+        self._background = []
+        self._running = False
+
+    def input(self, w):
+        """ Get a handle through which coroutines drive an :class:`.Input`.
+
+        :param w: the Input or its name
+        :return: an :class:`InputHandle`
+        """
+        name = w.name if isinstance(w, WireVector) else w
+        if name not in self._inputs:
+            raise PyrtlError('"%s" is not an Input of the simulated block' % name)
+        return InputHandle(self, self.sim.block.get_wirevector_by_name(name))
+
+    def output(self, w):
+        """ Get a handle through which coroutines read a wire.
+
+        :param w: the wire or its name; any wire the simulation can inspect
+            works, which for :class:`.CompiledSimulation` means an
+            :class:`.Input` or :class:`.Output`
+        :return: an :class:`OutputHandle`
+        """
+        name = w.name if isinstance(w, WireVector) else w
+        return OutputHandle(self, self.sim.block.get_wirevector_by_name(name))
+
+    def start(self, coroutine):
+        """ Run a background coroutine, such as a monitor that loops forever.
+
+        :param coroutine: the coroutine to run alongside the ones passed to :meth:`run`
+        :return: the :class:`asyncio.Task` running it
+
+        Background coroutines are cancelled once all the coroutines passed to
+        :meth:`run` have finished.  This can only be called while :meth:`run`
+        is running.
+        """
+        if not self._running:
+            raise PyrtlError('CoSimulation.start can only be called from inside run')
+        task = asyncio.ensure_future(coroutine)
+        self._background.append(task)
+        return task
+
+    def run(self, *coroutines, max_cycles=None):
+        """ Run coroutines against the simulation until they are all done.
+
+        :param coroutines: the coroutines to run
+        :param int max_cycles: stop (cancelling all coroutines) once the
+            clock reaches this cycle, even if coroutines are still waiting
+        :return: the number of cycles simulated so far
+
+        Exceptions raised by any coroutine are propagated.
+        """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning)
+                previous = asyncio.get_event_loop()
+        except RuntimeError:
+            previous = None
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(self._run(coroutines, max_cycles))
+        finally:
+            asyncio.set_event_loop(previous)
+            loop.close()
+
+    async def _run(self, coroutines, max_cycles):
+        self._running = True
+        self._woken = asyncio.Event()
+        tasks = [asyncio.ensure_future(c) for c in coroutines]
+        try:
+            while not all(t.done() for t in tasks):
+                await self._settle(tasks)
+                for t in tasks + self._background:
+                    if t.done() and not t.cancelled() and t.exception() is not None:
+                        raise t.exception()
+                if all(t.done() for t in tasks):
+                    break
+                if not self._waiters:
+                    # everybody is blocked on something other than the clock, so
+                    # sleep until a coroutine finishes or touches the cosimulation
+                    self._woken.clear()
+                    woken = asyncio.ensure_future(self._woken.wait())
+                    pending = [t for t in tasks + self._background if not t.done()]
+                    try:
+                        await asyncio.wait(pending + [woken],
+                                           return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        woken.cancel()
+                    continue
+                target = self._waiters[0][0]
+                if max_cycles is not None and target > max_cycles:
+                    target = max_cycles
+                if target > self._cycle:
+                    self._advance(target - self._cycle)
+                if max_cycles is not None and self._cycle >= max_cycles:
+                    break
+                while self._waiters and self._waiters[0][0] <= self._cycle:
+                    _, _, future = heapq.heappop(self._waiters)
+                    if not future.done():
+                        future.set_result(self._cycle)
+        finally:
+            for t in tasks + self._background:
+                if not t.done():
+                    t.cancel()
+            await asyncio.gather(*tasks, *self._background, return_exceptions=True)
+            self._background = []
+            self._waiters = []
+            self._woken = None
+            self._running = False
+        for t in tasks:
+            if not t.cancelled() and t.exception() is not None:
+                raise t.exception()
+        return self._cycle
+
+    async def _settle(self, tasks):
+        """ Let the coroutines run until none of them can make progress. """
+        idle = 0
+        while idle < 2:
+            before = self._progress
+            await asyncio.sleep(0)
+            live = [t for t in tasks + self._background if not t.done()]
+            if self._progress == before:
+                idle += 1
+            else:
+                idle = 0
+            if len(self._pending_waiters()) == len(live):
+                break
+
+    def _poke(self):
+        """ Record that a coroutine interacted with the cosimulation. """
+        self._progress += 1
+        if self._woken is not None:
+            self._woken.set()
+
+    def _pending_waiters(self):
+        return [f for _, _, f in self._waiters if not f.done()]
+
+    def _advance(self, ncycles):
+        """ Run the simulation for ncycles with the current input values. """
+        if self._inputs:
+            stimulus = {name: itertools.repeat(val, ncycles) for name, val in self._inputs.items()}
+            self.sim.step_multiple(stimulus, nsteps=ncycles)
+        else:
+            self.sim.step_multiple(nsteps=ncycles)
+        self._cycle += ncycles
+        self.batches += 1
+
+    def _wait_until(self, cycle):
+        self._poke()
+        future = asyncio.get_running_loop().create_future()
+        if cycle <= self._cycle:
+            future.set_result(self._cycle)
+        else:
+            heapq.heappush(self._waiters, (cycle, next(self._seq), future))
+        return future
+
+
+class Clock(object):
+    """ The clock of a :class:`CoSimulation`, which coroutines wait on. """
+
+    def __init__(self, cosim):
+        self._cosim = cosim
+
+    @property
+    def cycle(self):
+        """ Number of cycles simulated so far. """
+        return self._cosim._cycle
+
+    def rising(self):
+        """ Wait for the next rising edge, i.e. until one more cycle has been simulated.
+
+        :return: an awaitable resolving to the new cycle count
+        """
+        return self._cosim._wait_until(self._cosim._cycle + 1)
+
+    def cycles(self, n):
+        """ Wait until `n` more cycles have been simulated.
+
+        :param int n: number of cycles to wait (0 returns immediately)
+        :return: an awaitable resolving to the new cycle count
+        """
+        if n < 0:
+            raise PyrtlError('cannot wait for a negative number of cycles')
+        return self._cosim._wait_until(self._cosim._cycle + n)
+
+
+class InputHandle(object):
+    """ Handle through which coroutines drive an :class:`.Input` of a :class:`CoSimulation`. """
+
+    def __init__(self, cosim, wire):
+        self._cosim = cosim
+        self.wire = wire
+
+    @property
+    def value(self):
+        """ Value the input takes on every cycle until it is set again. """
+        return self._cosim._inputs[self.wire.name]
+
+    @value.setter
+    def value(self, val):
+        val = int(val)
+        if val < 0 or val > self.wire.bitmask:
+            raise PyrtlError('Wire {} has value {} which cannot be represented '
+                             'using its bitwidth'.format(self.wire.name, val))
+        self._cosim._poke()
+        self._cosim._inputs[self.wire.name] = val
+
+    async def drive(self, val, cycles=1):
+        """ Set the input, hold it for a number of cycles, and wait for them to pass.
+
+        :param int val: value to drive
+        :param int cycles: number of cycles to wait (defaults to 1)
+        """
+        self.value = val
+        await self._cosim.clock.cycles(cycles)
+
+
+class OutputHandle(object):
+    """ Handle through which coroutines read a wire of a :class:`CoSimulation`. """
+
+    def __init__(self, cosim, wire):
+        self._cosim = cosim
+        self.wire = wire
+
+    @property
+    def value(self):
+        """ Value of the wire in the most recently simulated cycle. """
+        self._cosim._poke()
+        return self._cosim.sim.inspect(self.wire.name)
+
+    async def next(self):
+        """ Wait for the next rising edge and return the wire's value in that cycle. """
+        await self._cosim.clock.rising()
+        return self.value
+
+    async def wait_for(self, expected, timeout=None):
+        """ Simulate cycle by cycle until the wire has an expected value.
+
+        :param expected: the value to wait for, or a function from the value
+            to a bool
+        :param int timeout: give up after this many cycles (defaults to waiting forever)
+        :return: the matching value
+
+        If the wire already matches in the most recent cycle, this returns
+        without simulating.  Otherwise, since the value must be examined every
+        cycle, the simulation is stepped one cycle at a time until it matches.
+        """
+        def matches(val):
+            return expected(val) if callable(expected) else val == expected
+
+        waited = 0
+        if self._cosim.clock.cycle > 0 and matches(self.value):
+            return self.value
+        while True:
+            if timeout is not None and waited >= timeout:
+                raise PyrtlError('timed out after {} cycles waiting on "{}"'
+                                 .format(waited, self.wire.name))
+            val = await self.next()
+            waited += 1
+            if matches(val):
+                return val
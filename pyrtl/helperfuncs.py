@@ -1600,12 +1600,15 @@ def wire_matrix(component_schema, size: int):
             elif component_type is Input or component_type is Register:
                 values = [None for _ in range(self._size)]
 
-            self._components = [None for i in range(len(schema))]
+            # Stored in __dict__ so WrappedWireVector does not forward the
+            # assignment to the concatenated WireVector.
+            components = [None for i in range(len(schema))]
+            self.__dict__['_components'] = components
             if len(values) == 1:
                 # Concatenated value was provided. Slice it into components.
                 _slice(block=block, schema=schema, bitwidth=self._bitwidth,
                        component_type=component_type, name=name,
-                       concatenated=concatenated, components=self._components,
+                       concatenated=concatenated, components=components,
                        concatenated_value=values[0])
             else:
                 if len(values) != len(schema):
@@ -1617,7 +1620,7 @@ def wire_matrix(component_schema, size: int):
                 _concatenate(block=block, schema=schema,
                              component_type=component_type, name=name,
                              concatenated=concatenated,
-                             components=self._components, component_map=values)
+                             components=components, component_map=values)
 
         def __getitem__(self, key):
             return self._components[key]
@@ -0,0 +1,282 @@
+""" Hierarchical designs: sub-designs elaborated once and instantiated many times.
+
+Included in this file you will find:
+
+* `Module` -- a sub-design with named Input and Output ports, held in its own block
+* `ModuleInstance` -- a use of a Module inside another block
+* `flatten` -- replace the instances in a block with copies of their logic
+
+PyRTL netlists are flat, so building the same sub-circuit N times normally
+means running its Python generator N times and storing N copies of its nets.
+A `Module` is elaborated once; instantiating it only adds wires for its ports
+to the parent block, and the instance refers to the definition's netlist.
+:func:`.synthesize` and :func:`.optimize` flatten the instances into their
+block first, the simulations simulate a flattened copy of the block (leaving
+its hierarchy in place), and :func:`.output_to_verilog` writes each definition
+out once as its own Verilog module.
+"""
+
+from .pyrtlexceptions import PyrtlError
+from .core import working_block, set_working_block, Block, _NameIndexer
+from .wire import WireVector, Input, Output, Const, next_tempvar_name, _constIndexer
+from .corecircuits import as_wires
+
+
+class Module(object):
+    """ A sub-design with named Input and Output ports, to be instantiated by reference.
+
+    Build the logic of a module with the module as the working block, using
+    named :class:`.Input` and :class:`.Output` wires as its ports::
+
+        lane = pyrtl.Module('lane')
+        with lane:
+            a, b = pyrtl.Input(8, 'a'), pyrtl.Input(8, 'b')
+            acc = pyrtl.Register(8, 'acc')
+            acc.next <<= acc + a * b
+            out = pyrtl.Output(8, 'out')
+            out <<= acc
+
+        outs = [lane.instantiate({'a': x[i], 'b': y[i]})['out'] for i in range(64)]
+
+    The module's logic is elaborated (and stored) once no matter how many
+    times it is instantiated.  Modules can instantiate other modules.
+    """
+
+    def __init__(self, name, block=None):
+        """ Create a Module.
+
+        :param str name: name of the module, used to name its instances and as
+            the name of its Verilog module
+        :param Block block: block holding the module's logic (defaults to a new,
+            empty block)
+        """
+        if not isinstance(name, str) or not name:
+            raise PyrtlError('a Module needs a name')
+        self.name = name
+        self.block = Block() if block is None else block
+        self._instance_names = _NameIndexer(name + '_')
+        self._context = None
+
+    def __enter__(self):
+        """ Make the module's block the working block, for elaborating its logic. """
+        self._context = set_working_block(self.block, no_sanity_check=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._context.__exit__(exc_type, exc_val, exc_tb)
+        self._context = None
+
+    def __repr__(self):
+        return 'Module(%r)' % self.name
+
+    @property
+    def inputs(self):
+        """ Dict from the name of each input port to its Input wire. """
+        return {w.name: w for w in self.block.wirevector_subset(Input)}
+
+    @property
+    def outputs(self):
+        """ Dict from the name of each output port to its Output wire.
+
+        The Outputs made by :func:`.rtl_assert` inside the module are not ports.
+        """
+        return {w.name: w for w in self.block.wirevector_subset(Output)
+                if w not in self.block.rtl_assert_dict}
+
+    def _definition_blocks(self):
+        """ The blocks of this module and of every module instantiated in it. """
+        blocks, todo = set(), [self]
+        while todo:
+            module = todo.pop()
+            if module.block not in blocks:
+                blocks.add(module.block)
+                todo.extend(i.module for i in module.block.instances.values())
+        return blocks
+
+    def instantiate(self, inputs, name='', block=None):
+        """ Add an instance of the module to a block.
+
+        :param dict inputs: map from the name of each input port to the
+            WireVector (or int) driving it; values narrower than the port are
+            zero extended
+        :param str name: name of the instance (defaults to the module name
+            followed by a number)
+        :param Block block: block to add the instance to (defaults to the working block)
+        :return: dict from the name of each output port to a new WireVector in
+            `block` driven by that port of the instance
+
+        Only the wires for the ports are created; the instance refers to the
+        module's logic until the block is flattened (see :func:`flatten`).
+        """
+        block = working_block(block)
+        if block in self._definition_blocks():
+            raise PyrtlError('module "%s" cannot be instantiated inside itself' % self.name)
+        self.block.sanity_check()
+
+        ports = self.inputs
+        missing = set(ports).difference(inputs)
+        unknown = set(inputs).difference(ports)
+        if missing or unknown:
+            raise PyrtlError('inputs of module "%s" do not match its ports: missing %s, '
+                             'unknown %s' % (self.name, sorted(missing), sorted(unknown)))
+        if not name:
+            name = self._instance_names.make_valid_string()
+            while name in block.instances:
+                name = self._instance_names.make_valid_string()
+        elif name in block.instances:
+            raise PyrtlError('duplicate instance name "%s"' % name)
+
+        with set_working_block(block, no_sanity_check=True):
+            in_wires = {p: as_wires(inputs[p], bitwidth=w.bitwidth, truncating=False)
+                        for p, w in ports.items()}
+            for p, w in in_wires.items():
+                if w.bitwidth != ports[p].bitwidth:
+                    raise PyrtlError('input "%s" of module "%s" is %d bits, but got %d bits'
+                                     % (p, self.name, ports[p].bitwidth, w.bitwidth))
+            out_wires = {p: WireVector(w.bitwidth) for p, w in self.outputs.items()}
+        block.instances[name] = ModuleInstance(name, self, in_wires, out_wires)
+        return dict(out_wires)
+
+
+class ModuleInstance(object):
+    """ A use of a :class:`Module` inside a block.
+
+    The instances of a block are in its ``instances`` dict, by name.  Each one
+    has the attributes `name`, `module`, and `inputs` and `outputs`, dicts from
+    port names to the wires of the block connected to those ports.
+    """
+
+    def __init__(self, name, module, inputs, outputs):
+        self.name = name
+        self.module = module
+        self.inputs = inputs
+        self.outputs = outputs
+
+    def __repr__(self):
+        return 'ModuleInstance(%r, %r)' % (self.name, self.module)
+
+    def _remapped(self, name, wire_map):
+        """ This instance renamed, with its port wires replaced through `wire_map`. """
+        return ModuleInstance(name, self.module,
+                              {p: wire_map[w] for p, w in self.inputs.items()},
+                              {p: wire_map[w] for p, w in self.outputs.items()})
+
+
+def _check_instance_ports(instances):
+    """ Raise a PyrtlError if an instance does not connect exactly the ports of its module.
+
+    A module can gain or lose ports after it has been instantiated, which
+    would otherwise leave its instances connected to ports that do not exist.
+    """
+    module_ports = {}
+    for instance in instances:
+        module = instance.module
+        if module not in module_ports:
+            module_ports[module] = (
+                {p: w.bitwidth for p, w in module.inputs.items()},
+                {p: w.bitwidth for p, w in module.outputs.items()})
+        problems = []
+        for kind, ports, wires in zip(('inputs', 'outputs'), module_ports[module],
+                                      (instance.inputs, instance.outputs)):
+            missing = sorted(set(ports).difference(wires))
+            extra = sorted(set(wires).difference(ports))
+            resized = sorted(p for p, w in wires.items()
+                             if p in ports and w.bitwidth != ports[p])
+            if missing:
+                problems.append('unconnected %s %s' % (kind, missing))
+            if extra:
+                problems.append('%s %s not in the module' % (kind, extra))
+            if resized:
+                problems.append('%s %s of the wrong bitwidth' % (kind, resized))
+        if problems:
+            raise PyrtlError('instance "%s" does not match the ports of module "%s" (was the '
+                             'module changed after it was instantiated?): %s'
+                             % (instance.name, module.name, ', '.join(problems)))
+
+
+def flatten(block=None):
+    """ Replace every module instance in a block with a copy of the module's logic.
+
+    :param Block block: block to flatten, in place (defaults to working block)
+    :return: the block
+
+    The wires and memories of an instance named ``inst`` are copied into the
+    block with names prefixed by ``inst.`` (unnamed temporaries get new
+    temporary names), and its ports are connected directly to the wires the
+    instance was connected to.  Instances nested inside modules are
+    flattened as well.
+    """
+    block = working_block(block)
+    while block.instances:
+        _, instance = block.instances.popitem()
+        _inline_instance(block, instance)
+    return block
+
+
+def _flattened_copy(block):
+    """ Flatten a copy of `block`, leaving `block` and its instances as they are.
+
+    :return: the flattened copy, and a map from each wire and memory of
+        `block` to its copy (the wires keep their names, the memories their ids)
+    """
+    from .transform import _clone_block_and_wires, _copy_nets
+
+    copy, copy_map = _clone_block_and_wires(block)
+    mem_map = {}
+    _copy_nets(copy, block.logic, copy_map, mem_map)
+    for w, exp in block.rtl_assert_dict.items():
+        copy.rtl_assert_dict[copy_map[w]] = exp
+    copy_map.update(mem_map)
+    return flatten(copy), copy_map
+
+
+def _inline_instance(block, instance):
+    from .transform import _unchecked_clone, _copy_nets
+
+    _check_instance_ports([instance])
+    definition = instance.module.block
+    prefix = instance.name + '.'
+    wire_map = {}
+    new_wires = []
+    pool = block._const_pool
+    for w in definition.wirevector_set:
+        if isinstance(w, Input):
+            wire_map[w] = instance.inputs[w.name]
+        elif isinstance(w, Output) and w.name in instance.outputs:
+            wire_map[w] = instance.outputs[w.name]
+        else:
+            unnamed_const = isinstance(w, Const) and w.name.startswith('const_')
+            if unnamed_const and pool is not None:
+                shared = pool.get((w.val, w.bitwidth))
+                if shared is not None:
+                    wire_map[w] = shared
+                    continue
+            if w.name.startswith('tmp'):
+                name = next_tempvar_name()
+            elif unnamed_const:
+                name = _constIndexer.make_valid_string() + '_' + str(w.val)
+            else:
+                name = prefix + w.name
+                if name in block.wirevector_by_name:
+                    raise PyrtlError('cannot flatten instance "%s": the block already has '
+                                     'a wire named "%s"' % (instance.name, name))
+            wire_map[w] = _unchecked_clone(w, name, block)
+            new_wires.append(wire_map[w])
+            if unnamed_const and pool is not None:
+                pool[(w.val, w.bitwidth)] = wire_map[w]
+    block._add_wirevectors_unchecked(new_wires)
+
+    mem_map = {}
+    for net in definition.logic_subset('m@'):
+        mem = net.op_param[1]
+        if mem not in mem_map:
+            mem_map[mem] = mem._make_copy(block, name=prefix + mem.name)
+    _copy_nets(block, definition.logic, wire_map, mem_map)
+
+    for w, exp in definition.rtl_assert_dict.items():
+        block.rtl_assert_dict[wire_map[w]] = exp
+    for name, sub in definition.instances.items():
+        if prefix + name in block.instances:
+            raise PyrtlError('cannot flatten instance "%s": the block already has an '
+                             'instance named "%s"' % (instance.name, prefix + name))
+        block.instances[prefix + name] = sub._remapped(prefix + name, wire_map)
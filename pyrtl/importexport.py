@@ -21,6 +21,7 @@ from .wire import WireVector, Input, Output, Const, Register, next_tempvar_name
 from .corecircuits import concat_list, rtl_all, rtl_any, select
 from .memory import RomBlock
 from .passes import two_way_concat, one_bit_selects
+from .hierarchy import _check_instance_ports
 
 
 def _natural_sort_key(key):
@@ -624,6 +625,44 @@ def output_to_verilog(dest_file, add_reset=True, block=None):
 
     block = working_block(block)
     file = dest_file
+
+    # Each module definition (see pyrtl.Module) used by the block, directly or
+    # not, is written once as its own Verilog module, ahead of its first use.
+    modules = []
+    _verilog_modules_used(block, modules, set())
+    module_names = _VerilogSanitizer('_ver_out_module_')
+    module_names.make_valid_string('toplevel')
+    verilog_modules = {}
+    for module in modules:
+        verilog_modules[module.block] = module_names.make_valid_string(module.name)
+    verilog_modules[block] = 'toplevel'
+
+    print('// Generated automatically via PyRTL', file=file)
+    print('// As one initial test of synthesis, map to FPGA with:', file=file)
+    print('//   yosys -p "synth_xilinx -top toplevel" thisfile.v\n', file=file)
+    ports = {}
+    for module_block in [m.block for m in modules] + [block]:
+        _to_verilog_module(file, module_block, add_reset, verilog_modules, ports)
+
+
+def _verilog_modules_used(block, modules, seen):
+    """ Append the modules instantiated in `block`, each after the modules it uses. """
+    _check_instance_ports(block.instances.values())
+    for instance in sorted(block.instances.values(), key=lambda i: i.name):
+        module = instance.module
+        if module.block not in seen:
+            seen.add(module.block)
+            _verilog_modules_used(module.block, modules, seen)
+            modules.append(module)
+
+
+def _to_verilog_module(file, block, add_reset, verilog_modules, ports):
+    """ Print one Verilog module for `block`.
+
+    `ports` maps each block already printed to the Verilog names of its ports,
+    which the instances in later modules connect to; it is updated with the
+    ports of `block`.
+    """
     internal_names = _VerilogSanitizer('_ver_out_tmp_')
 
     if add_reset:  # True or 'asynchronous'
@@ -633,14 +672,19 @@ def output_to_verilog(dest_file, add_reset=True, block=None):
 
     for wire in block.wirevector_set:
         internal_names.make_valid_string(wire.name)
+    instance_names = {i: internal_names.make_valid_string(i.name)
+                      for i in block.instances.values()}
 
     def varname(wire):
         return internal_names[wire.name]
 
-    _to_verilog_header(file, block, varname, add_reset)
+    ports[block] = {w.name: varname(w) for w in block.wirevector_subset((Input, Output))}
+    _to_verilog_header(file, block, varname, add_reset, verilog_modules[block])
     _to_verilog_combinational(file, block, varname)
     _to_verilog_sequential(file, block, varname, add_reset)
     _to_verilog_memories(file, block, varname)
+    _to_verilog_instances(file, block, varname, add_reset, instance_names,
+                          verilog_modules, ports)
     _to_verilog_footer(file)
 
 
@@ -691,11 +735,11 @@ def _verilog_block_parts(block):
     outputs = block.wirevector_subset(Output)
     registers = block.wirevector_subset(Register)
     wires = block.wirevector_subset() - (inputs | outputs | registers)
-    memories = {n.op_param[1] for n in block.logic_subset('m@')}
+    memories = {n.op_param[1] for n in block.logic_view('m@')}
     return inputs, outputs, registers, wires, memories
 
 
-def _to_verilog_header(file, block, varname, add_reset):
+def _to_verilog_header(file, block, varname, add_reset, module_name='toplevel'):
     """ Print the header of the verilog implementation. """
 
     def name_sorted(wires):
@@ -704,10 +748,6 @@ def _to_verilog_header(file, block, varname, add_reset):
     def name_list(wires):
         return [varname(w) for w in wires]
 
-    print('// Generated automatically via PyRTL', file=file)
-    print('// As one initial test of synthesis, map to FPGA with:', file=file)
-    print('//   yosys -p "synth_xilinx -top toplevel" thisfile.v\n', file=file)
-
     inputs, outputs, registers, wires, memories = _verilog_block_parts(block)
 
     # module name
@@ -717,7 +757,7 @@ def _to_verilog_header(file, block, varname, add_reset):
     if any(w.startswith('tmp') for w in io_list):
         raise PyrtlError('input or output with name starting with "tmp" indicates unnamed IO')
     io_list_str = ', '.join(io_list)
-    print('module toplevel({:s});'.format(io_list_str), file=file)
+    print('module {:s}({:s});'.format(module_name, io_list_str), file=file)
 
     # inputs and outputs
     print('    input clk;', file=file)
@@ -810,7 +850,7 @@ def _to_verilog_combinational(file, block, varname):
 
 def _to_verilog_sequential(file, block, varname, add_reset):
     """ Print the sequential logic of the verilog implementation. """
-    if not block.logic_subset(op='r'):
+    if not block.logic_view(op='r'):
         return
 
     print('    // Registers', file=file)
@@ -844,11 +884,16 @@ def _to_verilog_sequential(file, block, varname, add_reset):
 
 def _to_verilog_memories(file, block, varname):
     """ Print the memories of the verilog implementation. """
-    memories = {n.op_param[1] for n in block.logic_subset('m@')}
+    memories = {n.op_param[1] for n in block.logic_view('m@')}
+    writes_by_mem = collections.defaultdict(list)
+    for net in _net_sorted(block.logic_view('@'), varname):
+        writes_by_mem[net.op_param[1]].append(net)
+    reads_by_mem = collections.defaultdict(list)
+    for net in _net_sorted(block.logic_view('m'), varname):
+        reads_by_mem[net.op_param[1]].append(net)
     for m in sorted(memories, key=lambda m: m.id):
         print('    // Memory mem_{}: {}'.format(m.id, m.name), file=file)
-        writes = [net for net in _net_sorted(block.logic_subset('@'), varname)
-                  if net.op_param[1] == m]
+        writes = writes_by_mem[m]
         if writes:
             print('    always @(posedge clk)', file=file)
             print('    begin', file=file)
@@ -859,9 +904,7 @@ def _to_verilog_memories(file, block, varname):
                        '            mem_%s[%s] <= %s;\n'
                        '        end') % t, file=file)
             print('    end', file=file)
-        reads = [net for net in _net_sorted(block.logic_subset('m'), varname)
-                 if net.op_param[1] == m]
-        for net in reads:
+        for net in reads_by_mem[m]:
             dest = varname(net.dests[0])
             m_id = net.op_param[0]
             index = varname(net.args[0])
@@ -869,6 +912,23 @@ def _to_verilog_memories(file, block, varname):
         print('', file=file)
 
 
+def _to_verilog_instances(file, block, varname, add_reset, instance_names,
+                          verilog_modules, ports):
+    """ Print the module instances of the verilog implementation. """
+    if not block.instances:
+        return
+    print('    // Instances', file=file)
+    for instance in sorted(block.instances.values(), key=lambda i: instance_names[i]):
+        module_ports = ports[instance.module.block]
+        connections = ['.clk(clk)'] + (['.rst(rst)'] if add_reset else [])
+        for p, w in sorted(list(instance.inputs.items()) + list(instance.outputs.items())):
+            connections.append('.{:s}({:s})'.format(module_ports[p], varname(w)))
+        print('    {:s} {:s}({:s});'.format(verilog_modules[instance.module.block],
+                                            instance_names[instance],
+                                            ', '.join(connections)), file=file)
+    print('', file=file)
+
+
 def _to_verilog_footer(file):
     print('endmodule\n', file=file)
 
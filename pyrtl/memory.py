@@ -33,8 +33,7 @@ _MemAssignment = collections.namedtuple('_MemAssignment', 'rhs, is_conditional')
 
 
 def _reset_memory_indexer():
-    global _memIndex
-    _memIndex = _NameIndexer()
+    _memIndex.reset()
 
 
 class _MemIndexed(WireVector):
@@ -46,6 +45,7 @@ class _MemIndexed(WireVector):
     but if you try to *set* the value with <<= or |= then it will generate a
     _MemAssignment object rather than the normal wire assignment.
     """
+    __slots__ = ('mem', 'index', 'wire')
 
     def __init__(self, mem, index):
         self.mem = mem
@@ -240,11 +240,11 @@ class MemBlock(object):
         working_block().add_net(writeport_net)
         self.writeport_nets.append(writeport_net)
 
-    def _make_copy(self, block=None):
+    def _make_copy(self, block=None, name=None):
         block = working_block(block)
         return MemBlock(bitwidth=self.bitwidth,
                         addrwidth=self.addrwidth,
-                        name=self.name,
+                        name=self.name if name is None else name,
                         max_read_ports=self.max_read_ports,
                         max_write_ports=self.max_write_ports,
                         asynchronous=self.asynchronous,
@@ -351,9 +351,10 @@ class RomBlock(MemBlock):
             self.current_copy = self._make_copy()
         return super(RomBlock, self.current_copy)._build_read_port(addr)
 
-    def _make_copy(self, block=None,):
+    def _make_copy(self, block=None, name=None):
         block = working_block(block)
         return RomBlock(bitwidth=self.bitwidth, addrwidth=self.addrwidth,
-                        romdata=self.data, name=self.name, max_read_ports=self.max_read_ports,
+                        romdata=self.data, name=self.name if name is None else name,
+                        max_read_ports=self.max_read_ports,
                         asynchronous=self.asynchronous, pad_with_zeros=self.pad_with_zeros,
                         block=block)
@@ -0,0 +1,315 @@
+""" A compact, array-backed representation of a netlist.
+
+Included in this file you will find:
+
+* `CompactNetlist` -- the wires and nets of a block stored as flat integer arrays
+
+A :class:`.Block` stores each net as a :class:`.LogicNet` tuple of tuples of
+:class:`.WireVector` objects, held in Python sets.  That is convenient to
+build and to transform, but after :func:`.synthesize` almost every net is a
+1-bit gate and the per-object overhead dominates.  A `CompactNetlist` holds
+the same information as a handful of arrays indexed by integer wire and net
+ids, and converts losslessly back to a block.
+"""
+from array import array
+
+from .pyrtlexceptions import PyrtlError, PyrtlInternalError
+from .core import working_block, LogicNet
+from .wire import WireVector, Const, Register, Input
+
+
+class CompactNetlist(object):
+    """ The wires and nets of a block stored struct-of-arrays style.
+
+    Build one from a block with ``CompactNetlist(block)`` and get a block
+    back with :meth:`to_block`.  Wires are numbered ``0 .. num_wires - 1`` and
+    nets ``0 .. num_nets - 1``; all the per-wire and per-net data lives in
+    the following attributes, indexed by those ids:
+
+    * ``names``: list of wire names
+    * ``bitwidths``: ``array('I')`` of wire bitwidths (0 for a wire without one)
+    * ``wire_kinds``: ``array('H')`` of indices into ``wire_types``, the list of
+      WireVector classes used in the netlist
+    * ``const_vals``, ``reset_values``: dicts from wire id to the value of each
+      Const and to the reset value of each Register that has one
+    * ``ops``: ``array('B')`` of op codes, indices into :attr:`OPS`
+    * ``op_params``: dict from net id to op_param, for the nets that have one
+    * ``arg_offsets``, ``args``: the arg wire ids of net `n` are
+      ``args[arg_offsets[n]:arg_offsets[n + 1]]``
+    * ``dests``: ``array('I')`` with the dest wire id of each net, or
+      :attr:`NO_ID` for nets without a dest (memory writes)
+    * ``drivers``: ``array('I')`` with the id of the net driving each wire, or
+      :attr:`NO_ID` if nothing drives it
+    * ``sink_offsets``, ``sinks``: the nets using wire `w` as an argument are
+      ``sinks[sink_offsets[w]:sink_offsets[w + 1]]`` (a net that uses a wire
+      twice is listed twice)
+
+    A CompactNetlist is a snapshot: changing the source block afterwards does
+    not change it.  :func:`.optimize`, :class:`.TimingAnalysis`,
+    :func:`.netlist_footprint` and the simulators all accept one in place of
+    a block.
+    """
+
+    OPS = 'w~&|^n+-*<>=xcsrm@'
+    NO_ID = 0xFFFFFFFF
+
+    def __init__(self, block=None):
+        """ Pack the wires and nets of a block.
+
+        :param Block block: block to pack (defaults to working block)
+        """
+        self._load(working_block(block))
+
+    def _load(self, block):
+        if array('I').itemsize < 4:
+            raise PyrtlInternalError('array("I") must hold at least 32 bits')
+        if block.instances:
+            raise PyrtlError('cannot pack a block with module instances; flatten it first '
+                             '(see pyrtl.flatten)')
+        self.block_class = type(block)
+        wires = list(block.wirevector_set)
+        ids = {w: i for i, w in enumerate(wires)}
+
+        self.names = [w.name for w in wires]
+        self.bitwidths = array('I', (w.bitwidth or 0 for w in wires))
+        self.wire_types = []
+        type_ids = {}
+        kinds = array('H')
+        self.const_vals = {}
+        self.reset_values = {}
+        for i, w in enumerate(wires):
+            cls = type(w)
+            if cls not in type_ids:
+                type_ids[cls] = len(self.wire_types)
+                self.wire_types.append(cls)
+            kinds.append(type_ids[cls])
+            if isinstance(w, Const):
+                self.const_vals[i] = w.val
+            elif isinstance(w, Register) and w.reset_value is not None:
+                self.reset_values[i] = w.reset_value
+        self.wire_kinds = kinds
+
+        op_codes = {op: i for i, op in enumerate(self.OPS)}
+        self.ops = array('B')
+        self.op_params = {}
+        self.arg_offsets = array('I', [0])
+        self.args = array('I')
+        self.dests = array('I')
+        for n, net in enumerate(block.logic):
+            self.ops.append(op_codes[net.op])
+            if net.op_param is not None:
+                self.op_params[n] = net.op_param
+            self.args.extend([ids[a] for a in net.args])
+            self.arg_offsets.append(len(self.args))
+            if len(net.dests) > 1:
+                raise PyrtlInternalError('net "%s" has more than one dest' % str(net))
+            self.dests.append(ids[net.dests[0]] if net.dests else self.NO_ID)
+
+        self._build_adjacency()
+
+        # wires in io_map and reg_map are stored by id; wires no longer in the
+        # block (removed by a pass after synthesis) are kept as they are
+        def pack(w):
+            return ids.get(w, w)
+
+        self._maps = {}
+        for attr in ('io_map', 'reg_map'):
+            if hasattr(block, attr):
+                self._maps[attr] = {
+                    k: pack(v) if isinstance(v, WireVector) else [pack(w) for w in v]
+                    for k, v in getattr(block, attr).items()}
+        if hasattr(block, 'mem_map'):
+            self._maps['mem_map'] = dict(block.mem_map)
+        self._ids_by_name = None
+        self._order = None
+
+    def _build_adjacency(self):
+        num_wires = len(self.names)
+        self.drivers = array('I', [self.NO_ID]) * num_wires
+        for n, d in enumerate(self.dests):
+            if d != self.NO_ID:
+                self.drivers[d] = n
+
+        counts = array('I', [0]) * (num_wires + 1)
+        for a in self.args:
+            counts[a + 1] += 1
+        for w in range(num_wires):
+            counts[w + 1] += counts[w]
+        self.sink_offsets = counts
+        fill = array('I', counts[:-1])
+        self.sinks = array('I', [0]) * len(self.args)
+        offsets = self.arg_offsets
+        for n in range(len(self.ops)):
+            for a in self.args[offsets[n]:offsets[n + 1]]:
+                self.sinks[fill[a]] = n
+                fill[a] += 1
+
+    @property
+    def num_wires(self):
+        """ Number of wires in the netlist. """
+        return len(self.names)
+
+    @property
+    def num_nets(self):
+        """ Number of nets in the netlist. """
+        return len(self.ops)
+
+    def wire_id(self, name):
+        """ Get the id of the wire with the given name.
+
+        :param str name: name of the wire
+        :return: the integer wire id
+        """
+        if self._ids_by_name is None:
+            self._ids_by_name = {n: i for i, n in enumerate(self.names)}
+        try:
+            return self._ids_by_name[name]
+        except KeyError:
+            raise PyrtlError('no wire named "%s" in the netlist' % name)
+
+    def op(self, net):
+        """ The op (such as ``'&'``) of net id `net`. """
+        return self.OPS[self.ops[net]]
+
+    def net_args(self, net):
+        """ The arg wire ids of net id `net`, as an array. """
+        return self.args[self.arg_offsets[net]:self.arg_offsets[net + 1]]
+
+    def wire_sinks(self, wire):
+        """ The ids of the nets using wire id `wire` as an argument, as an array. """
+        return self.sinks[self.sink_offsets[wire]:self.sink_offsets[wire + 1]]
+
+    def is_source(self, wire):
+        """ True if wire id `wire` is an Input, Const or Register.
+
+        These are the wires whose values are known at the start of a cycle,
+        where combinational paths start.
+        """
+        return issubclass(self.wire_types[self.wire_kinds[wire]], (Input, Const, Register))
+
+    def topological_order(self):
+        """ Get the net ids ordered so every net comes after the nets driving its args.
+
+        :return: ``array('I')`` of net ids, in the same sense as iterating over a
+            :class:`.Block`
+
+        The order is computed once over the integer arrays and then reused.
+        """
+        if self._order is not None:
+            return self._order
+        NO_ID, ops, dests, drivers = self.NO_ID, self.ops, self.dests, self.drivers
+        reg_code = self.OPS.index('r')
+        num_nets = len(ops)
+        pending = array('I', [0]) * num_nets
+        offsets, args = self.arg_offsets, self.args
+        ready = []
+        for n in range(num_nets):
+            count = 0
+            for a in args[offsets[n]:offsets[n + 1]]:
+                d = drivers[a]
+                if d != NO_ID and ops[d] != reg_code:
+                    count += 1
+            pending[n] = count
+            if not count:
+                ready.append(n)
+
+        order = array('I')
+        sink_offsets, sinks = self.sink_offsets, self.sinks
+        while ready:
+            n = ready.pop()
+            order.append(n)
+            d = dests[n]
+            if d == NO_ID or ops[n] == reg_code:
+                continue
+            for s in sinks[sink_offsets[d]:sink_offsets[d + 1]]:
+                pending[s] -= 1
+                if not pending[s]:
+                    ready.append(s)
+
+        if len(order) != num_nets:
+            raise PyrtlError('Failure in CompactNetlist ordering due to non-register loops')
+        self._order = order
+        return order
+
+    def to_block(self):
+        """ Unpack the netlist into a new block.
+
+        :return: a new block, of the same class as the block the netlist was
+            built from, with equivalent wires (same names, types, bitwidths,
+            Const values and Register reset values), nets and memories; a
+            :class:`.PostSynthBlock` also gets its ``io_map``, ``reg_map`` and
+            ``mem_map`` back, pointing at the new wires.
+
+        The working block is left unchanged.
+        """
+        from .transform import _get_new_block_mem_instance
+
+        block = self.block_class()
+        wires = []
+        for i, name in enumerate(self.names):
+            cls = self.wire_types[self.wire_kinds[i]]
+            bitwidth = self.bitwidths[i] or None
+            if issubclass(cls, Const):
+                w = cls(self.const_vals[i], bitwidth, name=name, block=block)
+            elif issubclass(cls, Register):
+                w = cls(bitwidth, name=name, reset_value=self.reset_values.get(i), block=block)
+            else:
+                w = cls(bitwidth=bitwidth, name=name, block=block)
+            wires.append(w)
+
+        mems = {}
+        nets = []
+        offsets = self.arg_offsets
+        for n, code in enumerate(self.ops):
+            op = self.OPS[code]
+            param = self.op_params.get(n)
+            if op in 'm@':
+                param = _get_new_block_mem_instance(param, mems, block)
+            args = tuple([wires[a] for a in self.args[offsets[n]:offsets[n + 1]]])
+            d = self.dests[n]
+            dests = () if d == self.NO_ID else (wires[d],)
+            if op == 'r':
+                dests[0].reg_in = args[0]
+            nets.append(LogicNet(op, param, args, dests))
+        block.logic.update(nets)
+
+        for attr, mapping in self._maps.items():
+            if attr == 'mem_map':
+                remapped = {
+                    k: _get_new_block_mem_instance((None, m), mems, block)[1]
+                    for k, m in mapping.items()}
+            else:
+                def unpack(w):
+                    return wires[w] if isinstance(w, int) else w
+
+                remapped = {
+                    k: [unpack(w) for w in v] if isinstance(v, list) else unpack(v)
+                    for k, v in mapping.items()}
+            current = getattr(block, attr, None)
+            if isinstance(current, dict):
+                current.clear()
+                current.update(remapped)
+            else:
+                setattr(block, attr, remapped)
+        return block
+
+
+def _as_block(block, register_value_map, memory_value_map):
+    """ The block to simulate, and the initial register and memory values for it.
+
+    The block is `block` itself, the working block if None, or the unpacked
+    block if `block` is a :class:`CompactNetlist`.  If it has module instances,
+    a flattened copy of it is simulated instead, so that the block keeps its
+    hierarchy, and the registers and memories that are keys of
+    `register_value_map` and `memory_value_map` are replaced by their copies.
+    """
+    if isinstance(block, CompactNetlist):
+        return block.to_block(), register_value_map, memory_value_map
+    block = working_block(block)
+    if not block.instances:
+        return block, register_value_map, memory_value_map
+    from .hierarchy import _flattened_copy
+    block, copy_map = _flattened_copy(block)
+    return (block,
+            {copy_map.get(r, r): v for r, v in register_value_map.items()},
+            {copy_map.get(m, m): v for m, v in memory_value_map.items()})
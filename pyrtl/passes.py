@@ -5,15 +5,18 @@ ways to change a block.
 """
 
 import collections
+import functools
 
 from .core import working_block, set_working_block, _get_debug_mode, LogicNet, PostSynthBlock
-from .helperfuncs import _NetCount
 from .corecircuits import (_basic_mult, _basic_add, _basic_sub, _basic_eq,
                            _basic_lt, _basic_gt, _basic_select, concat_list,
                            as_wires, concat)
 from .memory import MemBlock
+from .netlist import CompactNetlist
+from .hierarchy import flatten
+from .passmanager import PassManager
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
-from .wire import WireVector, Input, Output, Const, Register
+from .wire import WireVector, Input, Output, Const, Register, _unchecked_wire, _constIndexer
 from .transform import net_transform, _get_new_block_mem_instance, copy_block, replace_wires
 from . import transform
 from pyrtl import wire  # transform.all_nets looks better than all_nets
@@ -26,7 +29,8 @@ from pyrtl import wire  # transform.all_nets looks better than all_nets
 #
 
 
-def optimize(update_working_block=True, block=None, skip_sanity_check=False):
+def optimize(update_working_block=True, block=None, skip_sanity_check=False,
+             keep_assertions=True):
     """
     Return an optimized version of a synthesized hardware block.
 
@@ -36,25 +40,56 @@ def optimize(update_working_block=True, block=None, skip_sanity_check=False):
     :param bool skip_sanity_check: Don't perform sanity checks on the block
         before/during/after the optimization passes (defaults to False).
         Sanity checks will always be performed if in debug mode.
+    :param bool keep_assertions: Keep the checks added by :func:`.rtl_assert`
+        (defaults to True).  If False, they are removed along with any logic
+        that only they used.
 
     Note:
     optimize works on all hardware designs, both synthesized and non synthesized
+
+    `block` may also be a :class:`.CompactNetlist`: it is unpacked, optimized
+    and packed again, updated in place if `update_working_block` is True
+    (and returned either way).  Module instances are flattened (see
+    :func:`.flatten`) before optimizing.  The passes run are those of
+    :func:`optimization_passes`; run them with a :class:`.PassManager` to
+    see how long each one takes and how much it removes.
     """
+    if isinstance(block, CompactNetlist):
+        optimized = optimize(block=block.to_block(), skip_sanity_check=skip_sanity_check,
+                             keep_assertions=keep_assertions)
+        if not update_working_block:
+            return CompactNetlist(optimized)
+        block._load(optimized)
+        return block
+
     block = working_block(block)
     if not update_working_block:
         block = copy_block(block)
 
-    with set_working_block(block, no_sanity_check=True):
-        if (not skip_sanity_check) or _get_debug_mode():
-            block.sanity_check()
-        _remove_wire_nets(block, skip_sanity_check)
-        _remove_slice_nets(block, skip_sanity_check)
-        constant_propagation(block, True)
-        _remove_unlistened_nets(block)
-        common_subexp_elimination(block)
-        if (not skip_sanity_check) or _get_debug_mode():
-            block.sanity_check()
-    return block
+    pass_manager = PassManager(optimization_passes(keep_assertions),
+                               sanity_check=not skip_sanity_check)
+    return pass_manager.run(block, update_working_block=False)
+
+
+def optimization_passes(keep_assertions=True):
+    """ Get the list of passes run by :func:`optimize`, for use with a :class:`.PassManager`.
+
+    :param bool keep_assertions: Keep the checks added by :func:`.rtl_assert`
+        (defaults to True)
+    :return: the passes, in order
+
+    They flatten module instances, remove wire and slice nets that only pass
+    values through, fold constants, remove logic no Output depends on, and
+    eliminate common subexpressions.
+    """
+    return [
+        flatten,
+        functools.partial(_remove_wire_nets, skip_sanity_check=True),
+        functools.partial(_remove_slice_nets, skip_sanity_check=True),
+        functools.partial(constant_propagation, silence_unexpected_net_warnings=True),
+        functools.partial(_remove_unlistened_nets, keep_assertions=keep_assertions),
+        common_subexp_elimination,
+    ]
 
 
 class _ProducerList(object):
@@ -171,259 +206,452 @@ def _remove_slice_nets(block, skip_sanity_check=False):
 def constant_propagation(block, silence_unexpected_net_warnings=False):
     """ Removes excess constants in the block.
 
+    Nets whose args are all Consts are replaced by a Const holding their
+    value (for every op except memory reads and writes), and nets with some
+    Const args are simplified where that leaves an existing wire or a single
+    inversion: ``x & 0``, ``x | 0``, ``x ^ 1...1``, ``x * 0``, a select
+    with a Const selector, and so on, for wires of any width.  Each net is
+    revisited only when one of its args is replaced, so the pass does work
+    linear in the size of the block rather than sweeping the whole block
+    once per level of folding.
+
     Note on resulting block:
     The output of the block can have WireVectors that are driven but not
     listened to. This is to be expected. These are to be removed by
     :py:func:`._remove_unlistened_nets`
     """
-    net_count = _NetCount(block)
-    while net_count.shrinking():
-        _constant_prop_pass(block, silence_unexpected_net_warnings)
-
-
-def _constant_prop_pass(block, silence_unexpected_net_warnings=False):
-    """ Does one constant propagation pass """
-    valid_net_ops = '~&|^nrwcsm@'
-    no_optimization_ops = 'wcsm@'
-    one_var_ops = {
-        '~': lambda x, mask: ~x & mask,
-        'r': lambda x, _: x   # This is only valid for constant folding purposes
-    }
-    two_var_ops = {
-        '&': lambda left, right: left & right,
-        '|': lambda left, right: left | right,
-        '^': lambda left, right: left ^ right,
-        'n': lambda left, right: 1 - (left & right),
-    }
-
-    def _constant_prop_error(net, error_str):
-        if not silence_unexpected_net_warnings:
-            raise PyrtlError("Unexpected net, {}, has {}".format(net, error_str))
-
-    def constant_prop_check(net_checking):
-        def replace_net(new_net):
-            nets_to_remove.add(net_checking)
-            nets_to_add.add(new_net)
-
-        def replace_net_with_const(const_val):
-            bitwidth = len(net_checking.dests[0])
-            new_const_wire = Const(bitwidth=bitwidth, val=const_val, block=block)
-            wire_add_set.add(new_const_wire)
-            replace_net_with_wire(new_const_wire)
-
-        def replace_net_with_wire(new_wire):
-            if isinstance(net_checking.dests[0], Output):
-                replace_net(LogicNet('w', None, args=(new_wire,),
-                                     dests=net_checking.dests))
-            else:
-                nets_to_remove.add(net_checking)
-                new_wire_src[net_checking.dests[0]] = new_wire
-
-        if net_checking.op not in valid_net_ops:
-            _constant_prop_error(net_checking, "has a net not handled by constant_propagation")
-            return  # skip if we are ignoring unoptimizable ops
-
-        num_constants = sum((isinstance(arg, Const) for arg in net_checking.args))
-
-        if num_constants == 0 or net_checking.op in no_optimization_ops:
-            return  # assuming wire nets are already optimized
-
-        if (net_checking.op in two_var_ops) and num_constants == 1:
-            long_wires = [w for w in net_checking.args + net_checking.dests if len(w) != 1]
-            if len(long_wires):
-                _constant_prop_error(net_checking, "has wire(s) {} with bitwidths that are not 1"
-                                     .format(long_wires))
-                return  # skip if we are ignoring unoptimizable ops
-
-            # special case
-            const_wire, other_wire = net_checking.args
-            if isinstance(other_wire, Const):
-                const_wire, other_wire = other_wire, const_wire
-
-            outputs = [two_var_ops[net_checking.op](const_wire.val, other_val)
-                       for other_val in (0, 1)]
-
-            if outputs[0] == outputs[1]:
-                replace_net_with_const(outputs[0])
-            elif outputs[0] == 0:
-                replace_net_with_wire(other_wire)
-            else:
-                replace_net(LogicNet('~', None, args=(other_wire,),
-                                     dests=net_checking.dests))
+    index = block.connection_index()
+    consts = {}  # (val, bitwidth) -> Const made by this pass
+    worklist = [net for net in block.logic if any(isinstance(a, Const) for a in net.args)]
+    while worklist:
+        net = worklist.pop()
+        if net not in block.logic:
+            continue  # replaced since it was added to the worklist
+        if net.op not in _foldable_ops:
+            if not silence_unexpected_net_warnings:
+                raise PyrtlError("Unexpected net, {}, has a net not handled by "
+                                 "constant_propagation".format(net))
+            continue
+        replacement = _fold_net(net, block, consts)
+        if replacement is None:
+            continue
 
+        block.logic.remove(net)
+        dest = net.dests[0]
+        if isinstance(replacement, LogicNet):
+            block.logic.add(replacement)
+        elif isinstance(dest, Output):
+            block.logic.add(LogicNet('w', None, args=(replacement,), dests=net.dests))
         else:
-            # this optimization is actually compatible with long wires
-            if net_checking.op in two_var_ops:
-                output = two_var_ops[net_checking.op](net_checking.args[0].val,
-                                                      net_checking.args[1].val)
-            else:
-                output = one_var_ops[net_checking.op](net_checking.args[0].val,
-                                                      net_checking.args[0].bitmask)
-            replace_net_with_const(output)
-
-    new_wire_src = _ProducerList()
-    wire_add_set = set()
-    nets_to_add = set()
-    nets_to_remove = set()
+            # rewire everything using dest to use the replacement instead
+            for sink in index.sinks(dest):
+                new_args = tuple(replacement if arg is dest else arg for arg in sink.args)
+                new_sink = LogicNet(sink.op, sink.op_param, new_args, sink.dests)
+                block.logic.remove(sink)
+                block.logic.add(new_sink)
+                worklist.append(new_sink)
 
-    for a_net in block.logic:
-        constant_prop_check(a_net)
-    # second full pass to cleanup
+    _remove_unused_wires(block)
 
-    new_logic = set()
-    for net in block.logic.union(nets_to_add) - nets_to_remove:
-        new_args = tuple(new_wire_src.find_producer(x) for x in net.args)
-        new_net = LogicNet(net.op, net.op_param, new_args, net.dests)
-        new_logic.add(new_net)
 
-    block.logic = new_logic
-    for new_wirevector in wire_add_set:
-        block.add_wirevector(new_wirevector)
+_foldable_ops = '~&|^nrwcsm@+-*<>=x'
+
+_const_folds = {
+    '~': lambda net, a: ~a,
+    '&': lambda net, a, b: a & b,
+    '|': lambda net, a, b: a | b,
+    '^': lambda net, a, b: a ^ b,
+    'n': lambda net, a, b: ~(a & b),
+    '+': lambda net, a, b: a + b,
+    '-': lambda net, a, b: a - b,
+    '*': lambda net, a, b: a * b,
+    '<': lambda net, a, b: int(a < b),
+    '>': lambda net, a, b: int(a > b),
+    '=': lambda net, a, b: int(a == b),
+    'x': lambda net, sel, f, t: t if sel else f,
+    'c': lambda net, *args: _concat_vals(zip(args, net.args)),
+    's': lambda net, a: sum(((a >> bit) & 1) << i for i, bit in enumerate(net.op_param)),
+    'r': lambda net, a: a,  # This is only valid for constant folding purposes
+}
+
+
+def _concat_vals(vals_and_wires):
+    result = 0
+    for val, wire in vals_and_wires:
+        result = (result << wire.bitwidth) | val
+    return result
+
+
+def _fold_net(net, block, consts):
+    """ What a net with Const args can be replaced by, if anything.
+
+    :return: None if the net cannot be simplified; otherwise a wire (often a
+        new Const) with the value of the net's dest, or a simpler LogicNet
+        driving the same dest
+    """
+    op, args = net.op, net.args
+    if op in 'wm@' or not any(isinstance(arg, Const) for arg in args):
+        return None  # assuming wire nets are already optimized
+    dest = net.dests[0]
 
-    _remove_unused_wires(block)
+    def const(val):
+        key = (val & dest.bitmask, dest.bitwidth)
+        if key not in consts:
+            name = _constIndexer.make_valid_string() + '_' + str(key[0])
+            consts[key] = _unchecked_wire(Const, name, key[1], block, val=key[0])
+            block._add_wirevectors_unchecked((consts[key],))
+        return consts[key]
+
+    if all(isinstance(arg, Const) for arg in args):
+        return const(_const_folds[op](net, *(arg.val for arg in args)))
+
+    if op == 'x':
+        sel, falsecase, truecase = args
+        if isinstance(sel, Const):
+            return truecase if sel.val else falsecase
+    elif op == '*':
+        if any(isinstance(arg, Const) and arg.val == 0 for arg in args):
+            return const(0)
+    elif op in '&|^n':
+        const_wire, other_wire = args
+        if isinstance(other_wire, Const):
+            const_wire, other_wire = other_wire, const_wire
+        if const_wire.val == 0:
+            if op == '&':
+                return const(0)
+            elif op == 'n':
+                return const(-1)
+            return other_wire
+        elif const_wire.val == const_wire.bitmask:
+            if op == '&':
+                return other_wire
+            elif op == '|':
+                return const(-1)
+            return LogicNet('~', None, args=(other_wire,), dests=net.dests)
+    return None
 
 
 def common_subexp_elimination(block=None, abs_thresh=1, percent_thresh=0):
     """ Common Subexpression Elimination for PyRTL blocks.
 
     :param Block block: the block to run the subexpression elimination on
-    :param float abs_thresh: absolute threshold for stopping optimization
-    :param float percent_thresh: percent threshold for stopping optimization
+    :param float abs_thresh: no longer used (kept for compatibility)
+    :param float percent_thresh: no longer used (kept for compatibility)
+
+    The values computed by the nets are numbered in topological order, so
+    duplicated expressions are found however deeply they are nested, and
+    all of them are removed in a single pass.
     """
     block = working_block(block)
-    net_count = _NetCount(block)
+    kept = _value_numbers(block)
 
-    while net_count.shrinking(block, percent_thresh, abs_thresh):
-        net_table = _find_common_subexps(block)
-        _replace_subexps(block, net_table)
+    wire_map = {}
+    unnecessary_nets = []
+    for net, same_net in kept.items():
+        if same_net is not net:
+            wire_map[net.dests[0]] = same_net.dests[0]
+            unnecessary_nets.append(net)
+    if unnecessary_nets:
+        block.logic.difference_update(unnecessary_nets)
+        replace_wires(wire_map, block)
 
 
 ops_where_arg_order_matters = 'm@xc<>-'
 
 
-def _find_common_subexps(block):
-    """ Finds nets that can be considered the same based on op type, op param, and arguments.
+def _value_numbers(block):
+    """ Finds the nets that compute the same value as an earlier net.
 
     :param block: Block to operate over
-    :return dict[LogicNet, [LogicNet]]: mapping from a logic net (with a placehold dest)
-        representing the common subexp, to a list of nets matching that common subexp that
-        can be replaced with the single common subexp.
-
-    Nets are the "same" if 1) their op types are the same, 2) their op_params are
-    the same (e.g. same memory if a memory-related op), and 3) their arguments are
-    the same (same constant value and bitwidth for const wires, otherwise same wire
-    object). The destination wire for a net is not considered.
+    :return dict[LogicNet, LogicNet]: mapping from each net that could be
+        replaced to the net (possibly itself) whose dest it can be replaced with
+
+    The nets are visited in topological order, treating Inputs, Consts,
+    Registers and undriven wires as sources, and the value of each wire is
+    numbered by the wire first found to hold it.  Nets are the "same" if
+    1) their op types are the same, 2) their op_params are the same (e.g.
+    same memory if a memory-related op), and 3) their arguments have the
+    same value numbers (same constant value and bitwidth for const wires),
+    in any order unless the op is in `ops_where_arg_order_matters`.  The
+    destination wire for a net is not considered, and nets writing Registers
+    or Outputs are never replaced.
     """
-    net_table = {}  # {net (without dest) : [net, ...]
-    t = tuple()  # just a placeholder
-    const_dict = {}
-    for net in block.logic:
-        if net.op in ops_where_arg_order_matters:
-            new_args = tuple(_const_to_int(w, const_dict) for w in net.args)
-        else:
-            new_args = tuple(sorted((_const_to_int(w, const_dict) for w in net.args), key=hash))
-        net_sub = LogicNet(net[0], net[1], new_args, t)  # don't care about dests
-        if net_sub in net_table:
-            net_table[net_sub].append(net)
-        else:
-            net_table[net_sub] = [net]
-    return net_table
+    index = block.connection_index()
 
+    def combinational_driver(wire):
+        net = index.driver(wire)
+        return net is not None and net.op != 'r'
 
-def _const_to_int(wire, const_dict):
-    """ Return a repr a Const (a tuple composed of width and value) for comparison with an 'is'.
-
-    If the wire is not a Const, just return the wire itself; comparison will be
-    done on the identity of the wire object instead.
-    """
-    if isinstance(wire, Const):
-        # a very bad hack to make sure two consts will compare
-        # correctly with an 'is'
-        bitwidth = wire.bitwidth
-        val = wire.val
-        if bitwidth not in const_dict:
-            const_dict[bitwidth] = {val: (bitwidth, val)}
+    # number of distinct args of each net still waiting for a value number
+    waiting = {}
+    ready = collections.deque()
+    for net in block.logic:
+        count = sum(1 for w in set(net.args) if combinational_driver(w))
+        if count:
+            waiting[net] = count
         else:
-            if val not in const_dict[bitwidth]:
-                const_dict[bitwidth][val] = (bitwidth, val)
-        return const_dict[bitwidth][val]
-
-    return wire
-
-
-def _replace_subexps(block, net_table):
-    """ Removes unnecessary nets, connecting the common net's dest wire to unnecessary net's dest.
-
-    :param block: The block to operate over.
-    :param net_table: A mapping from common subexpression (a net) to a list of nets
-        that can be replaced with that common net.
-    """
-    wire_map = {}
-    unnecessary_nets = []
-    for nets in net_table.values():
-        _process_nets_to_discard(nets, wire_map, unnecessary_nets)
-
-    block.logic.difference_update(unnecessary_nets)
-    replace_wires(wire_map, block)
+            ready.append(net)
+
+    numbers = {}  # wire -> wire first found to hold the same value
+    table = {}  # (op, op_param, numbered args) -> first net computing them
+    kept = {}
+    while ready:
+        net = ready.popleft()
+        if net.op != 'r' and net.dests and _has_normal_dest_wire(net):
+            args = tuple((w.bitwidth, w.val) if isinstance(w, Const) else numbers.get(w, w)
+                         for w in net.args)
+            if net.op not in ops_where_arg_order_matters:
+                args = tuple(sorted(args, key=hash))
+            same_net = table.setdefault((net.op, net.op_param, args), net)
+            kept[net] = same_net
+            numbers[net.dests[0]] = same_net.dests[0]
+        if net.op == 'r':
+            continue
+        for dest in net.dests:
+            for sink in index.sinks(dest):
+                waiting[sink] -= 1
+                if not waiting[sink]:
+                    ready.append(sink)
+    return kept
 
 
 def _has_normal_dest_wire(net):
     return not isinstance(net.dests[0], (Register, Output))
 
 
-def _process_nets_to_discard(nets, wire_map, unnecessary_nets):
-    """ Helper for tracking how a group of related nets should be replaced with a common one.
-
-    :param nets: List of nets that are considered equal and which should
-        be replaced by a single common net.
-    :param wire_map: Dict that will be updated with a mapping from every
-        old destination wire that needs to be removed, to the new destination
-        wire with which it should be replaced.
-    :param unnecessary_nets: List of nets that are to be discarded.
-
+def narrow_bitwidths(block=None):
+    """ Narrow internal wires to the fewest bits that can ever be nonzero.
+
+    :param Block block: the block to narrow (defaults to working block)
+    :return: the number of bits removed from the wires of the block
+
+    ``+`` adds a bit, ``*`` doubles the width, and extending an argument to
+    match the other pads it with zeros, so the high bits of many wires can
+    never be one.  This pass finds those bits from the nets driving each wire
+    (constants, ``&`` masks, selects, concats, comparisons, and the widths
+    the arithmetic ops can actually produce), then narrows each WireVector
+    to the widest of what it can hold and what the nets using it need, so
+    that every value the block computes stays the same.  Narrower wires
+    speed up :class:`.CompiledSimulation`, especially where a wire no longer
+    needs more than 64 bits; :class:`.FastSimulation` gains nothing from
+    them, and may have to mask more results.
+
+    Inputs, Outputs, Registers, Consts and memory reads keep their bitwidths,
+    as do wires with a width that the nets using them depend on (such as the
+    low args of a concat).  Concats drop the args above their highest one
+    that can be nonzero, padding with zeros instead.  Registers and memories are assumed to hold
+    any value, so that a simulation may still start them at any value.
+    Consts are replaced by narrower copies where an op needs that.
     """
-    if len(nets) == 1:
-        return  # also deals with nets with no dest wires
-    nets_to_consider = list(filter(_has_normal_dest_wire, nets))
-
-    if len(nets_to_consider) > 1:  # needed to handle cases with only special wires
-        net_to_keep = nets_to_consider[0]
-        nets_to_discard = nets_to_consider[1:]
-        dest_w = net_to_keep.dests[0]
-        for net in nets_to_discard:
-            old_dst = net.dests[0]
-            wire_map[old_dst] = dest_w
-            unnecessary_nets.append(net)
+    block = working_block(block)
+    index = block.connection_index()
+
+    # the number of low bits of each wire that can be nonzero
+    known = {}
 
+    def known_bits(w):
+        if isinstance(w, Const):
+            return w.val.bit_length()
+        return known.get(w, w.bitwidth)
 
-def _remove_unlistened_nets(block):
+    for net in block:  # topological order, with Registers and memories as sources
+        if not net.dests or net.op == 'r':
+            continue
+        known[net.dests[0]] = min(_known_bits(net, known_bits), net.dests[0].bitwidth)
+
+    # the new bitwidth of each wire that can be narrowed
+    widths = {}
+    for w in block.wirevector_set:
+        driver = index.driver(w)
+        if type(w) is WireVector and driver is not None and driver.op != 'm':
+            widths[w] = max(known[w], 1)
+
+    def width(w):
+        if isinstance(w, Const):
+            return max(w.val.bit_length(), 1)  # Consts can be replaced with any width
+        return widths.get(w, w.bitwidth)
+
+    # widen the wires until every net gets args as wide as it needs
+    to_visit = collections.deque(block.logic)
+    queued = set(block.logic)
+    while to_visit:
+        net = to_visit.popleft()
+        queued.discard(net)
+        for arg, needed in zip(net.args, _needed_arg_widths(net, width, known_bits)):
+            if arg in widths and needed > widths[arg]:
+                widths[arg] = needed
+                for changed in (index.driver(arg),) + index.sinks(arg):
+                    if changed is not None and changed not in queued:
+                        queued.add(changed)
+                        to_visit.append(changed)
+
+    narrowed = {w: n for w, n in widths.items() if n < w.bitwidth}
+    if not narrowed:
+        return 0
+    # which args each concat keeps, worked out before any widths change
+    concat_tops = {net: _concat_top(net, width(net.dests[0]), known_bits)
+                   for net in block.logic_subset('c')}
+    bits_removed = sum(w.bitwidth - n for w, n in narrowed.items())
+    for w, n in narrowed.items():
+        w.bitwidth = n
+
+    # rebuild the nets using narrowed wires, with Consts and selects to match
+    nets_to_update = set()
+    for w in narrowed:
+        nets_to_update.update(index.sinks(w))
+        nets_to_update.add(index.driver(w))
+    nets_to_update.update(net for net in block.logic if any(
+        isinstance(arg, Const) for arg in net.args) and net.op not in 'cm@')
+    new_nets = []
+    for net in nets_to_update:
+        args = net.args
+        if net.op == 'c':
+            # the args above the highest one that can be nonzero are replaced by zeros
+            args = args[concat_tops[net]:]
+            pad = net.dests[0].bitwidth - sum(a.bitwidth for a in args)
+            if pad > 0:
+                args = (Const(0, bitwidth=pad, block=block),) + args
+        elif net.op not in 'm@':
+            args = tuple(a if not isinstance(a, Const) or a.bitwidth == max(n, width(a))
+                         else Const(a.val, bitwidth=max(n, width(a)), block=block)
+                         for a, n in zip(net.args, _needed_arg_widths(net, width, known_bits)))
+        op_param = net.op_param
+        if net.op == 's':
+            op_param = op_param[:net.dests[0].bitwidth]
+        new_nets.append(LogicNet(net.op, op_param, args, net.dests))
+    block.logic.difference_update(nets_to_update)
+    block.logic.update(new_nets)
+    if block._net_table:
+        block._net_table = {}
+
+    used = set(w for net in block.logic for w in net.args)
+    for net in nets_to_update:
+        for w in net.args:
+            if isinstance(w, Const) and w not in used and w in block.wirevector_set:
+                block.remove_wirevector(w)
+    return bits_removed
+
+
+def _known_bits(net, known_bits):
+    """ The number of low bits of the dest of `net` that can be nonzero. """
+    dest = net.dests[0]
+    op = net.op
+    if op == 'w':
+        return known_bits(net.args[0])
+    elif op == '&':
+        return min(known_bits(a) for a in net.args)
+    elif op in '|^':
+        return max(known_bits(a) for a in net.args)
+    elif op == '+':
+        a, b = (known_bits(a) for a in net.args)
+        return max(a, b) + (1 if min(a, b) > 0 else 0)
+    elif op == '*':
+        a, b = (known_bits(a) for a in net.args)
+        return a + b if min(a, b) > 0 else 0
+    elif op in '<>=':
+        return 1
+    elif op == 'x':
+        return max(known_bits(a) for a in net.args[1:])
+    elif op == 'c':
+        bits, offset = 0, 0
+        for arg in reversed(net.args):  # the last arg holds the low bits
+            if known_bits(arg):
+                bits = offset + known_bits(arg)
+            offset += arg.bitwidth
+        return bits
+    elif op == 's':
+        arg_bits = known_bits(net.args[0])
+        return max((i + 1 for i, p in enumerate(net.op_param) if p < arg_bits), default=0)
+    else:  # '~', 'n' and '-' can set any bit, and memories can hold any value
+        return dest.bitwidth
+
+
+def _concat_top(net, dest_width, known_bits):
+    """ Index in the args of a concat of the highest arg with bits that are kept and can be 1.
+
+    The args below it keep their bitwidths, and the ones above it can be
+    replaced with zeros.  It is ``len(net.args)`` if no arg can be nonzero.
+    """
+    top, offset = len(net.args), 0
+    for i in reversed(range(len(net.args))):  # the last arg holds the low bits
+        if offset >= dest_width:
+            break
+        if known_bits(net.args[i]):
+            top = i
+        offset += net.args[i].bitwidth
+    return top
+
+
+def _needed_arg_widths(net, width, known_bits):
+    """ The bitwidth each arg of `net` needs, given the bitwidths of the dest and args.
+
+    The args that must keep their bitwidths (of 'm' and '@' nets, and those
+    of a concat below the highest arg that can be nonzero) need exactly
+    that width.
+    """
+    op = net.op
+    if op in 'm@':
+        return [a.bitwidth for a in net.args]
+    dest_width = width(net.dests[0])
+    if op == 'c':
+        top = _concat_top(net, dest_width, known_bits)
+        return [a.bitwidth if i > top else 1 for i, a in enumerate(net.args)]
+    elif op == 'x':
+        data = max(dest_width, width(net.args[1]), width(net.args[2]))
+        return [1, data, data]
+    elif op == 's':
+        return [max(net.op_param[:dest_width]) + 1]
+    elif op in 'w~&|^nr':
+        needed = dest_width
+    elif op in '+-':
+        needed = dest_width - 1
+    elif op == '*':
+        needed = (dest_width + 1) // 2
+    else:  # '<', '>' and '='
+        needed = 1
+    if op in '&|^n+-*<>=':
+        needed = max(needed, width(net.args[0]), width(net.args[1]))
+    return [max(needed, 1)] * len(net.args)
+
+
+def _remove_unlistened_nets(block, keep_assertions=True):
     """ Removes all nets that are not connected to an output wirevector.
 
     :param block: The block to operate over.
+    :param bool keep_assertions: If False, the assertions made with
+        :func:`.rtl_assert` are removed along with the logic only they use.
+
+    A breadth-first search backwards from the Outputs and memory writes
+    finds every net they depend on, in time linear in the size
+    of the block; all other nets are removed.  Registers are only kept if
+    something kept reads them, so a register (or a loop of registers) that
+    nothing observes is removed with the logic computing its next value.
     """
+    dropped = set()
+    if not keep_assertions:
+        dropped = set(block.rtl_assert_dict)
+        block.rtl_assert_dict.clear()
 
+    index = block.connection_index()
     listened_nets = set()
-    listened_wires = set()
-    prev_listened_net_count = 0
-
-    def add_to_listened(net):
+    to_visit = collections.deque(
+        net for net in block.logic
+        if net.op == '@' or any(isinstance(dest, Output) and dest not in dropped
+                                for dest in net.dests))
+
+    # walk backwards from the outputs and memory writes to everything they depend on
+    while to_visit:
+        net = to_visit.popleft()
+        if net in listened_nets:
+            continue
         listened_nets.add(net)
-        listened_wires.update(net.args)
-
-    for a_net in block.logic:
-        if a_net.op == '@':
-            add_to_listened(a_net)
-        elif any(isinstance(destW, Output) for destW in a_net.dests):
-            add_to_listened(a_net)
-
-    while len(listened_nets) > prev_listened_net_count:
-        prev_listened_net_count = len(listened_nets)
-
-        for net in block.logic - listened_nets:
-            if any((destWire in listened_wires) for destWire in net.dests):
-                add_to_listened(net)
+        for arg in net.args:
+            src_net = index.driver(arg)
+            if src_net is not None and src_net not in listened_nets:
+                to_visit.append(src_net)
 
-    block.logic = listened_nets
+    if len(listened_nets) < len(block.logic):
+        block.logic.intersection_update(listened_nets)
     _remove_unused_wires(block)
 
 
@@ -497,6 +725,13 @@ def synthesize(update_working_block=True, merge_io_vectors=True, block=None):
     block_pre = working_block(block)
     block_pre.sanity_check()  # before going further, make sure that presynth is valid
     block_in = copy_block(block_pre, update_working_block=False)
+    if block_in.instances:
+        flatten(block_in)
+        # the registers and assertion Outputs copied out of modules have no
+        # pre-synthesis wire, so they map to themselves
+        for wire_map, cls in ((block_in.io_map, Output), (block_in.reg_map, Register)):
+            for w in block_in.wirevector_subset(cls).difference(wire_map.values()):
+                wire_map[w] = w
 
     block_out = PostSynthBlock()
     # resulting block should only have one of a restricted set of net ops
@@ -808,7 +1043,7 @@ def direct_connect_outputs(block=None):
     # NOTE: would use transform.all_nets(), but it becomes tricky when
     # we want to remove more than just the current net on a single pass
     block = working_block(block)
-    _, dst_nets = block.net_connections()
+    _, dst_nets = block.connections()
 
     nets_to_remove = set()
     nets_to_add = set()
@@ -870,7 +1105,7 @@ def two_way_fanout(block=None):
     from .analysis import fanout
     block = working_block(block)
 
-    _, dst_map = block.net_connections()
+    _, dst_map = block.connections()
     # Two-pass approach: Remember which nets will need to change, in case
     # there are multiple arguments which will be changing along the way.
     nets_to_update = collections.defaultdict(list)
@@ -0,0 +1,193 @@
+""" Run a pipeline of passes over a block, recording what each pass costs and does.
+
+Included in this file you will find:
+
+* `PassManager` -- runs an ordered list of passes over a block
+* `FixedPoint` -- a group of passes repeated until the block stops changing
+* `net_pass` -- turns a net transform function into a pass
+* `PassStats` -- the time, memory and netlist sizes of one run of a pass
+
+A pass is any function that takes a block as the keyword argument `block`,
+like :func:`.constant_propagation`, :func:`.common_subexp_elimination`,
+:func:`.two_way_fanout` or the net transforms decorated with
+:func:`.all_nets` (:func:`.and_inverter_synth`, :func:`.nand_synth`, ...).
+It either changes the block in place, or returns a new :class:`.Block` (as
+:func:`.synthesize` does) which the passes after it then work on.  Use
+:func:`functools.partial` to give a pass other arguments::
+
+    pm = pyrtl.PassManager([
+        pyrtl.synthesize,
+        pyrtl.FixedPoint(pyrtl.optimization_passes()),
+        pyrtl.and_inverter_synth,
+        pyrtl.net_pass(my_transform),
+    ])
+    pm.run()
+    print(pm.report())
+"""
+
+import collections
+import functools
+import time
+import tracemalloc
+
+from .pyrtlexceptions import PyrtlError
+from .core import working_block, set_working_block, _get_debug_mode, Block
+from .transform import net_transform
+
+
+PassStats = collections.namedtuple(
+    'PassStats', 'name, seconds, peak_memory, nets_before, nets_after, wires_before, wires_after')
+PassStats.__doc__ = """ What one run of a pass took and did, as recorded by a :class:`PassManager`.
+
+    `seconds` is the wall time the pass took.  `peak_memory` is the largest
+    number of bytes the pass had allocated at any one time, or None if the
+    manager was not tracing memory.  The other fields count the nets and
+    wires of the block before and after the pass.
+    """
+
+
+def net_pass(transform_func):
+    """ Make a pass that applies `transform_func` to every net, as :func:`.net_transform` does.
+
+    :param transform_func: function taking a LogicNet and returning True to keep it
+    :return: a pass for a :class:`PassManager`, with the name of `transform_func`
+    """
+    @functools.wraps(transform_func)
+    def run_net_pass(block):
+        net_transform(transform_func, block=block)
+    return run_net_pass
+
+
+class FixedPoint(object):
+    """ A group of passes run over and over until the block stops changing.
+
+    The passes are repeated, in order, until a run of all of them leaves the
+    number of nets and wires in the block unchanged, or `max_iterations`
+    runs have been made.  A FixedPoint can be used anywhere a pass can in
+    the list given to a :class:`PassManager`, including inside another
+    FixedPoint.
+    """
+
+    def __init__(self, passes, max_iterations=100):
+        self.passes = list(passes)
+        self.max_iterations = max_iterations
+
+    def __repr__(self):
+        return 'FixedPoint([%s])' % ', '.join(_pass_name(p) for p in self.passes)
+
+
+class PassManager(object):
+    """ Runs an ordered list of passes over a block, keeping statistics on each one.
+
+    Every time a pass runs, a :class:`PassStats` is added to `stats` with the
+    wall time it took, the memory it used (if `trace_memory` is set) and the
+    number of nets and wires before and after it.
+    """
+
+    def __init__(self, passes, sanity_check=True, trace_memory=False):
+        """ Create a PassManager.
+
+        :param passes: the passes (and :class:`FixedPoint` groups of passes) to run, in order
+        :param bool sanity_check: check the block before the first pass and after
+            every pass (defaults to True, and always done in debug mode)
+        :param bool trace_memory: record the peak memory used by each pass with
+            :mod:`tracemalloc` (defaults to False, as tracing slows the passes down)
+        """
+        self.passes = list(passes)
+        self.sanity_check = sanity_check
+        self.trace_memory = trace_memory
+        self.stats = []
+
+    def run(self, block=None, update_working_block=True):
+        """ Run the passes over a block.
+
+        :param Block block: block to run the passes over (defaults to working block)
+        :param bool update_working_block: if a pass returns a new block, make
+            the final block the working block (defaults to True)
+        :return: the final block, which is `block` unless a pass returned a new one
+
+        The statistics of any earlier run are cleared first.
+        """
+        block = working_block(block)
+        self.stats = []
+        check = self.sanity_check or _get_debug_mode()
+        if check:
+            block.sanity_check()
+
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            final_block = self._run_passes(self.passes, block, check)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        if update_working_block and final_block is not block:
+            set_working_block(final_block)
+        return final_block
+
+    def _run_passes(self, passes, block, check):
+        for p in passes:
+            if isinstance(p, FixedPoint):
+                for _ in range(p.max_iterations):
+                    size = _size(block)
+                    block = self._run_passes(p.passes, block, check)
+                    if _size(block) == size:
+                        break
+            else:
+                block = self._run_pass(p, block, check)
+        return block
+
+    def _run_pass(self, p, block, check):
+        name = _pass_name(p)
+        nets_before, wires_before = _size(block)
+        if self.trace_memory:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:  # before Python 3.9, clearing the traces is the only way to reset the peak
+                tracemalloc.clear_traces()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        with set_working_block(block, no_sanity_check=True):
+            result = p(block=block)
+        seconds = time.perf_counter() - start
+
+        peak_memory = None
+        if self.trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1] - memory_before
+        if isinstance(result, Block):
+            block = result
+        if check:
+            try:
+                block.sanity_check()
+            except PyrtlError as e:
+                raise PyrtlError('sanity check failed after pass "%s": %s' % (name, e)) from e
+        self.stats.append(PassStats(name, seconds, peak_memory, nets_before, len(block.logic),
+                                    wires_before, len(block.wirevector_set)))
+        return block
+
+    def report(self):
+        """ Get a table of the statistics of the last run, one line per pass, as a string. """
+        lines = ['%-32s %10s %12s %17s %17s' % ('pass', 'seconds', 'peak memory',
+                                                'nets', 'wires')]
+        for s in self.stats:
+            memory = '-' if s.peak_memory is None else str(s.peak_memory)
+            lines.append('%-32s %10.4f %12s %8d -> %-6d %8d -> %-6d'
+                         % (s.name, s.seconds, memory, s.nets_before, s.nets_after,
+                            s.wires_before, s.wires_after))
+        total = sum(s.seconds for s in self.stats)
+        lines.append('%-32s %10.4f' % ('total', total))
+        return '\n'.join(lines)
+
+
+def _size(block):
+    return len(block.logic), len(block.wirevector_set)
+
+
+def _pass_name(p):
+    """ Name of a pass for reports: its function's name, looking through partials. """
+    while isinstance(p, functools.partial):
+        p = p.func
+    return getattr(p, '__name__', type(p).__name__)
@@ -0,0 +1,253 @@
+""" Elaborate rtllib-style component generators once and copy the result on later calls.
+
+A generator such as :func:`.kogge_stone` or :func:`.tree_multiplier` builds
+the same netlist every time it is called with wires of the same bitwidths
+and the same options.  Wrapping it in a :class:`ComponentCache` runs the
+generator once per distinct call signature, into a template block, and
+answers later calls by copying the template's wires and nets into the
+working block, connected to the new arguments::
+
+    from pyrtl.rtllib import adders, cache
+
+    add = cache.component_cache(adders.kogge_stone)
+    sums = [add(a[i], b[i]) for i in range(1000)]  # elaborated once
+    print(cache.component_cache.stats())
+"""
+
+import collections
+import functools
+import threading
+import time
+
+from ..core import Block, set_working_block, working_block
+from ..wire import WireVector, Const, Input, next_tempvar_name, _constIndexer
+from ..transform import _unchecked_clone, _copy_nets
+
+
+CacheStats = collections.namedtuple('CacheStats', 'hits, misses, hit_rate, time_saved, entries')
+CacheStats.__doc__ = """ Statistics of a :class:`ComponentCache`.
+
+    `hits` and `misses` count the calls answered from a template and the
+    calls that had to run the generator; `hit_rate` is hits / (hits +
+    misses).  `time_saved` is the estimated number of seconds saved by the
+    hits: for each one, the time the generator took to elaborate its
+    template less the time taken to copy it.  `entries` is the number of
+    templates held.
+    """
+
+
+class _Uncacheable(Exception):
+    """ Raised when a call cannot be answered from a template. """
+
+
+class _Template(object):
+    """ The netlist built by one call to a generator, ready to be copied. """
+    def __init__(self, block, inputs, result, elaboration_time):
+        self.inputs = inputs
+        placeholders = set(inputs)
+        self.wires = [w for w in block.wirevector_set if w not in placeholders]
+        self.nets = list(block.logic)
+        self.result = result
+        self.elaboration_time = elaboration_time
+
+
+class ComponentCache(object):
+    """ Cache of the netlists built by component generators, keyed by their arguments.
+
+    Calls are keyed by the generator, and by each argument: the bitwidth of
+    a :class:`.WireVector`, the value and bitwidth of a :class:`.Const`, and
+    the value of anything else (ints, strings, or functions such as the
+    `reducer` of :func:`.tree_multiplier`).  Lists, tuples and dicts of
+    these are keyed element by element.  Wires are copied with new
+    temporary names, so generators that name the wires they build should
+    not be cached.
+
+    Calls with unhashable arguments, and generators whose netlists contain
+    memories, assertions or module instances, are passed straight on to the
+    generator.  A cache can be shared by several threads.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._time_saved = 0.0
+
+    def __call__(self, generator):
+        """ Wrap `generator` so its calls go through the cache (usable as a decorator). """
+        @functools.wraps(generator)
+        def cached_generator(*args, **kwargs):
+            return self.elaborate(generator, *args, **kwargs)
+        return cached_generator
+
+    def elaborate(self, generator, *args, **kwargs):
+        """ Same as ``generator(*args, **kwargs)``, but copied from a template if possible.
+
+        :return: what the generator returns, with the wires of the template
+            replaced by their copies in the working block
+        """
+        kwargs = dict(sorted(kwargs.items()))  # so the order of the keywords does not matter
+        try:
+            key = (generator, _signature(args), _signature(kwargs))
+            hash(key)
+        except TypeError:  # unhashable arguments
+            return generator(*args, **kwargs)
+
+        with self._lock:
+            template = self._templates.get(key)
+        if template is None:
+            template = self._make_template(generator, args, kwargs)
+            with self._lock:
+                self._misses += 1
+                template = self._templates.setdefault(key, template)
+            if template is _UNCACHEABLE:
+                return generator(*args, **kwargs)
+            return _stamp(template, _wire_args((args, kwargs)), working_block())
+
+        if template is _UNCACHEABLE:
+            with self._lock:
+                self._misses += 1
+            return generator(*args, **kwargs)
+        start = time.perf_counter()
+        result = _stamp(template, _wire_args((args, kwargs)), working_block())
+        saved = template.elaboration_time - (time.perf_counter() - start)
+        with self._lock:
+            self._hits += 1
+            self._time_saved += saved
+        return result
+
+    @staticmethod
+    def _make_template(generator, args, kwargs):
+        block = Block()
+        inputs = []
+        start = time.perf_counter()
+        with set_working_block(block, no_sanity_check=True):
+            t_args, t_kwargs = _placeholders((args, kwargs), inputs)
+            result = generator(*t_args, **t_kwargs)
+        elaboration_time = time.perf_counter() - start
+        if block.logic_subset('m@') or block.rtl_assert_dict or block.instances:
+            return _UNCACHEABLE
+        # wires reached some other way than through the arguments cannot be replaced
+        wires = block.wirevector_set
+        if any(w not in wires for net in block.logic for w in net.args + net.dests):
+            return _UNCACHEABLE
+        try:
+            _check_result(result, block)
+        except _Uncacheable:
+            return _UNCACHEABLE
+        return _Template(block, inputs, result, elaboration_time)
+
+    def stats(self):
+        """ Get the hits, misses, hit rate and time saved so far, as a :class:`CacheStats`. """
+        with self._lock:
+            calls = self._hits + self._misses
+            return CacheStats(self._hits, self._misses, self._hits / calls if calls else 0.0,
+                              self._time_saved, len(self._templates))
+
+    def clear(self):
+        """ Forget all templates and reset the statistics. """
+        with self._lock:
+            self._templates.clear()
+            self._hits = self._misses = 0
+            self._time_saved = 0.0
+
+
+_UNCACHEABLE = object()
+
+component_cache = ComponentCache()
+""" A ComponentCache shared by the whole process, for convenience. """
+
+
+def _signature(arg):
+    """ Hashable description of `arg`, equal for args that elaborate the same netlist. """
+    if isinstance(arg, Const):
+        return ('const', arg.val, arg.bitwidth)
+    elif isinstance(arg, WireVector):
+        return ('wire', arg.bitwidth)
+    elif type(arg) in (list, tuple):
+        return (type(arg), tuple(_signature(a) for a in arg))
+    elif type(arg) is dict:
+        return (dict, tuple((k, _signature(v)) for k, v in arg.items()))
+    else:
+        return ('value', type(arg), arg)
+
+
+def _placeholders(arg, inputs):
+    """ Copy of `arg` for the template block: wires become new Inputs, added to `inputs`. """
+    if isinstance(arg, Const):
+        return Const(arg.val, arg.bitwidth)
+    elif isinstance(arg, WireVector):
+        inputs.append(Input(arg.bitwidth))
+        return inputs[-1]
+    elif type(arg) in (list, tuple):
+        return type(arg)(_placeholders(a, inputs) for a in arg)
+    elif type(arg) is dict:
+        return {k: _placeholders(v, inputs) for k, v in arg.items()}
+    else:
+        return arg
+
+
+def _wire_args(arg, wires=None):
+    """ The non-Const wires in `arg`, in the order _placeholders() makes their Inputs. """
+    if wires is None:
+        wires = []
+    if isinstance(arg, Const):
+        pass
+    elif isinstance(arg, WireVector):
+        wires.append(arg)
+    elif type(arg) in (list, tuple):
+        for a in arg:
+            _wire_args(a, wires)
+    elif type(arg) is dict:
+        for a in arg.values():
+            _wire_args(a, wires)
+    return wires
+
+
+def _check_result(result, block):
+    if isinstance(result, WireVector):
+        if result not in block.wirevector_set:
+            raise _Uncacheable()
+    elif type(result) in (list, tuple):
+        for r in result:
+            _check_result(r, block)
+    elif type(result) is dict:
+        for r in result.values():
+            _check_result(r, block)
+
+
+def _remap_result(result, wire_map):
+    if isinstance(result, WireVector):
+        return wire_map[result]
+    elif type(result) in (list, tuple):
+        return type(result)(_remap_result(r, wire_map) for r in result)
+    elif type(result) is dict:
+        return {k: _remap_result(v, wire_map) for k, v in result.items()}
+    else:
+        return result
+
+
+def _stamp(template, wires, block):
+    """ Copy the template into `block` with its inputs replaced by `wires`. """
+    wire_map = dict(zip(template.inputs, wires))
+    new_wires = []
+    pool = block._const_pool
+    for w in template.wires:
+        if isinstance(w, Const):
+            if pool is not None:
+                shared = pool.get((w.val, w.bitwidth))
+                if shared is not None:
+                    wire_map[w] = shared
+                    continue
+            new_wire = _unchecked_clone(w, _constIndexer.make_valid_string() + '_' + str(w.val),
+                                        block)
+            if pool is not None:
+                pool[(w.val, w.bitwidth)] = new_wire
+        else:
+            new_wire = _unchecked_clone(w, next_tempvar_name(), block)
+        wire_map[w] = new_wire
+        new_wires.append(new_wire)
+    block._add_wirevectors_unchecked(new_wires)
+    _copy_nets(block, template.nets, wire_map, {})
+    return _remap_result(template.result, wire_map)
@@ -1,11 +1,16 @@
 """Classes for executing and tracing circuit simulations."""
 
+import collections
 import copy
+import itertools
+import logging
 import math
 import numbers
 import os
 import re
+import shutil
 import sys
+import time
 import typing
 
 from .pyrtlexceptions import PyrtlError, PyrtlInternalError
@@ -14,12 +19,15 @@ from .wire import Input, Register, Const, Output, WireVector
 from .memory import RomBlock
 from .helperfuncs import check_rtl_assertions, _currently_in_jupyter_notebook
 from .importexport import _VerilogSanitizer
+from .netlist import _as_block
 
 try:
     from collections.abc import Mapping
 except ImportError:
     from collections import Mapping
 
+_logger = logging.getLogger(__name__)
+
 # ----------------------------------------------------------------
 #    __                         ___    __
 #   /__` |  |\/| |  | |     /\   |  | /  \ |\ |
@@ -79,7 +87,7 @@ class Simulation(object):
 
     def __init__(
             self, tracer=True, register_value_map={}, memory_value_map={},
-            default_value=0, block=None):
+            default_value=0, block=None, activity_wires=None, event_wires=None):
         """Creates a new circuit simulator.
 
         :param SimulationTrace tracer: Stores execution results.  Defaults to a
@@ -100,7 +108,14 @@ class Simulation(object):
             specified ``reset_value``, and isn't found in the
             `register_value_map`.
         :param Block block: the hardware block to be traced (which might be of
-            type :class:`.PostSynthBlock`).  Defaults to the working block
+            type :class:`.PostSynthBlock`, or a :class:`.CompactNetlist`, which is
+            unpacked first).  Defaults to the working block
+        :param activity_wires: wires (or names of wires) for which to count,
+            per bit, the number of toggles and the number of cycles spent
+            high; True counts every wire.  Read the counts with
+            :meth:`counters`.  Defaults to None.
+        :param event_wires: wires (or names of wires) for which to count the
+            number of cycles in which they are nonzero.  Defaults to None.
 
         Warning: Simulation initializes some things when called with
         :meth:`~.Simulation.__init__`, so changing items in the block for
@@ -112,7 +127,8 @@ class Simulation(object):
         register_value_map, memory_value_map, and default_value are passed on to _initialize.
         """
 
-        block = working_block(block)
+        block, register_value_map, memory_value_map = _as_block(
+            block, register_value_map, memory_value_map)
         block.sanity_check()  # check that this is a good hw block
 
         self.value = {}  # map from signal->value
@@ -121,8 +137,12 @@ class Simulation(object):
         self.block = block
         self.default_value = default_value
         if tracer is True:
-            tracer = SimulationTrace()
+            tracer = SimulationTrace(block=block)
         self.tracer = tracer
+        self._activity_wires = _counter_wires(block, activity_wires)
+        self._event_wires = _counter_wires(block, event_wires)
+        self._counter_state = {}
+        self.reset_counters()
         self._initialize(register_value_map, memory_value_map)
 
     def _initialize(self, register_value_map={}, memory_value_map={}):
@@ -136,7 +156,7 @@ class Simulation(object):
             and isn't found in the register_value_map.
         """
         # set registers to their values
-        reg_set = self.block.wirevector_subset(Register)
+        reg_set = self.block.wirevector_view(Register)
         for r in reg_set:
             rval = register_value_map.get(r, r.reset_value)
             if rval is None:
@@ -144,12 +164,12 @@ class Simulation(object):
             self.value[r] = self.regvalue[r] = rval
 
         # set constants to their set values
-        for w in self.block.wirevector_subset(Const):
+        for w in self.block.wirevector_view(Const):
             self.value[w] = w.val
             assert isinstance(w.val, numbers.Integral)  # for now
 
         # set memories to their passed values
-        for mem_net in self.block.logic_subset('m@'):
+        for mem_net in self.block.logic_view('m@'):
             memid = mem_net.op_param[1].id
             if memid not in self.memvalue:
                 self.memvalue[memid] = {}
@@ -175,8 +195,8 @@ class Simulation(object):
                 self.value[w] = self.default_value
 
         self.ordered_nets = tuple((i for i in self.block))
-        self.reg_update_nets = tuple((self.block.logic_subset('r')))
-        self.mem_update_nets = tuple((self.block.logic_subset('@')))
+        self.reg_update_nets = tuple((self.block.logic_view('r')))
+        self.mem_update_nets = tuple((self.block.logic_view('@')))
 
         self.tracer._set_initial_values(self.default_value, self.regvalue.copy(),
                                         copy.deepcopy(self.memvalue))
@@ -209,7 +229,7 @@ class Simulation(object):
         """
 
         # Check that all Input have a corresponding provided_input
-        input_set = self.block.wirevector_subset(Input)
+        input_set = self.block.wirevector_view(Input)
         supplied_inputs = set()
         for i in provided_inputs:
             if isinstance(i, WireVector):
@@ -237,7 +257,7 @@ class Simulation(object):
 
         # Check that only inputs are specified, and set the values
         if input_set != supplied_inputs:
-            for i in input_set.difference(supplied_inputs):
+            for i in input_set - supplied_inputs:
                 raise PyrtlError('Input "%s" has no input value specified' % i.name)
 
         self.value.update(self.regvalue)  # apply register updates from previous step
@@ -253,6 +273,7 @@ class Simulation(object):
         # print self.value # Helpful Debug Print
         if self.tracer is not None:
             self.tracer.add_step(self.value)
+        self._count()
 
         # Do all of the reg updates based off of the new values
         for net in self.reg_update_nets:
@@ -264,22 +285,27 @@ class Simulation(object):
         check_rtl_assertions(self)
 
     def step_multiple(self, provided_inputs={}, expected_outputs={}, nsteps=None,
-                      file=sys.stdout, stop_after_first_error=False):
+                      file=sys.stdout, stop_after_first_error=False,
+                      max_mismatches=None):
         """Take the simulation forward N cycles, based on the number of values
         for each input
 
         :param provided_inputs: a dictionary mapping WireVectors to their
-            values for N steps
+            values for N steps (a sequence, string or any other iterable), or
+            an iterable of per-step dictionaries of input values
         :param expected_outputs: a dictionary mapping WireVectors to their
             expected values for N steps; use ``?`` to indicate you don't care
             what the value at that step is
         :param nsteps: number of steps to take (defaults to None, meaning step
             for each supplied input value)
         :param file: where to write the output (if there are unexpected outputs
-            detected)
+            detected); None to not print anything
         :param stop_after_first_error: a boolean flag indicating whether to
             stop the simulation after encountering the first error (defaults to
             False)
+        :param max_mismatches: stop recording unexpected outputs after this
+            many (defaults to None, meaning record them all)
+        :return: a :class:`.MismatchTable` of the unexpected outputs
 
         All input wires must be in the `provided_inputs` in order for the
         simulation to accept these values. Additionally, the length of the
@@ -311,6 +337,22 @@ class Simulation(object):
         respectively, on the first cycle and 1 and 1, respectively, on the
         second cycle.
 
+        Values do not have to be in memory ahead of time: the values for
+        each wire can come from any iterable, such as a generator, and
+        `provided_inputs` (or `expected_outputs`) can itself be an iterable
+        yielding one dictionary of values per step, e.g.::
+
+            sim.step_multiple({'a': (i % 256 for i in range(10**7)), 'b': itertools.repeat(1)},
+                              nsteps=10**7)
+            sim.step_multiple({'a': i, 'b': 1} for i in range(256))
+
+        Stimulus is consumed (and expected outputs are checked) in fixed-size
+        chunks, so memory use does not grow with the number of steps.
+        Iterables without a length can only be checked as they are consumed,
+        so an input running out before the others (or before `nsteps`) raises
+        an error after the earlier steps have been simulated.  Without
+        `nsteps`, such inputs are simulated until they are exhausted.
+
         Example: if the design had no inputs, like so::
 
             a = pyrtl.Register(8)
@@ -327,69 +369,8 @@ class Simulation(object):
 
         """
 
-        if not nsteps and len(provided_inputs) == 0:
-            raise PyrtlError('need to supply either input values or a number of steps to simulate')
-
-        if len(provided_inputs) > 0:
-            longest = sorted(list(provided_inputs.items()),
-                             key=lambda t: len(t[1]),
-                             reverse=True)[0]
-            msteps = len(longest[1])
-            if nsteps:
-                if (nsteps > msteps):
-                    raise PyrtlError('nsteps is specified but is greater than the '
-                                     'number of values supplied for each input')
-            else:
-                nsteps = msteps
-
-        if nsteps < 1:
-            raise PyrtlError("must simulate at least one step")
-
-        if list(filter(lambda value: len(value) < nsteps,
-                       provided_inputs.values())):
-            raise PyrtlError(
-                "must supply a value for each provided wire "
-                "for each step of simulation")
-
-        if list(filter(lambda value: len(value) < nsteps,
-                       expected_outputs.values())):
-            raise PyrtlError(
-                "any expected outputs must have a supplied value "
-                "each step of simulation")
-
-        failed = []
-        for i in range(nsteps):
-            self.step({w: int(v[i]) for w, v in provided_inputs.items()})
-
-            for expvar in expected_outputs.keys():
-                expected = expected_outputs[expvar][i]
-                if expected == '?':
-                    continue
-                expected = int(expected)
-                actual = self.inspect(expvar)
-                if expected != actual:
-                    failed.append((i, expvar, expected, actual))
-
-            if failed and stop_after_first_error:
-                break
-
-        if failed:
-            if stop_after_first_error:
-                s = "(stopped after step with first error):"
-            else:
-                s = "on one or more steps:"
-            file.write("Unexpected output " + s + "\n")
-            file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n"
-                       .format("step", "name", "expected", "actual"))
-
-            def _sort_tuple(t):
-                # Sort by step and then wire name
-                return (t[0], _trace_sort_key(t[1]))
-
-            failed_sorted = sorted(failed, key=_sort_tuple)
-            for (step, name, expected, actual) in failed_sorted:
-                file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n".format(step, name, expected, actual))
-            file.flush()
+        return _step_and_compare(self, provided_inputs, expected_outputs, nsteps, file,
+                                 stop_after_first_error, max_mismatches, int)
 
     def inspect(self, w):
         """ Get the value of a WireVector in the last simulation cycle.
@@ -407,6 +388,32 @@ class Simulation(object):
         wire = self.block.wirevector_by_name.get(w, w)
         return self.value[wire]
 
+    def counters(self):
+        """ Read the counters accumulated since creation (or the last :meth:`reset_counters`).
+
+        :return: an :class:`.ActivityCounts`
+        """
+        return _read_counters(self._activity_wires, self._event_wires, self._counter_state)
+
+    def reset_counters(self):
+        """ Set all the counters back to zero. """
+        _reset_counter_state(self._counter_state, self._activity_wires, self._event_wires)
+
+    def _count(self):
+        """ Accumulate the counters with the values of the current step. """
+        state = self._counter_state
+        state['cycles'] += 1
+        prev, toggles, high = state['prev'], state['toggles'], state['high']
+        for k, wire in enumerate(self._activity_wires):
+            v = self.value[wire]
+            _vertical_add(high[k], v)
+            if prev[k] is not None:
+                _vertical_add(toggles[k], prev[k] ^ v)
+            prev[k] = v
+        for k, wire in enumerate(self._event_wires):
+            if self.value[wire]:
+                state['events'][k] += 1
+
     def inspect_mem(self, mem):
         """ Get the values in a map during the current simulation cycle.
 
@@ -481,6 +488,256 @@ class Simulation(object):
             self.memvalue[memid][write_addr] = write_val
 
 
+class SimulationMismatch(collections.namedtuple(
+        'SimulationMismatch', ['step', 'name', 'expected', 'actual'])):
+    """ A step at which a wire did not have its expected value in ``step_multiple``. """
+    __slots__ = ()
+
+
+class MismatchTable(object):
+    """ The steps at which wires did not have their expected values in ``step_multiple``.
+
+    Returned by the ``step_multiple`` method of every simulation.  It is a
+    sequence of :class:`SimulationMismatch` rows ordered by step and then by
+    wire name, and is empty (and false) when every expected value matched.
+
+    When ``step_multiple`` is given `max_mismatches`, only that many rows are
+    kept and :attr:`truncated` is set if more mismatches were found.
+    """
+
+    def __init__(self, limit=None, stop_after_first_error=False):
+        self.rows = []
+        self.limit = limit
+        self.truncated = False
+        self.stop_after_first_error = stop_after_first_error
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    @property
+    def remaining(self):
+        """ Number of rows that can still be added, or None if there is no limit. """
+        return None if self.limit is None else self.limit - len(self.rows)
+
+    def _add(self, rows):
+        """ Add (step, name, expected, actual) tuples found in one chunk of simulation. """
+        if not rows:
+            return
+        rows = sorted(rows, key=lambda t: (t[0], _trace_sort_key(t[1])))
+        remaining = self.remaining
+        if remaining is not None and len(rows) > remaining:
+            rows = rows[:remaining]
+            self.truncated = True
+        self.rows.extend(SimulationMismatch(*row) for row in rows)
+
+    def render(self, file=sys.stdout):
+        """ Print the mismatches as a table, the way ``step_multiple`` reports them. """
+        if self.stop_after_first_error:
+            s = "(stopped after step with first error):"
+        else:
+            s = "on one or more steps:"
+        file.write("Unexpected output " + s + "\n")
+        file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n"
+                   .format("step", "name", "expected", "actual"))
+        for (step, name, expected, actual) in self.rows:
+            file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n".format(step, name, expected, actual))
+        if self.truncated:
+            file.write("(stopped recording after the first {} mismatches)\n".format(self.limit))
+        file.flush()
+
+    def render_csv(self, file=sys.stdout):
+        """ Print the mismatches as comma-separated values, with a header row. """
+        file.write("step,name,expected,actual\n")
+        for row in self.rows:
+            file.write("{},{},{},{}\n".format(*row))
+        file.flush()
+
+
+def _step_and_compare(sim, provided_inputs, expected_outputs, nsteps, file,
+                      stop_after_first_error, max_mismatches, to_num):
+    """ Implementation of step_multiple for the simulations that step in Python.
+
+    :param to_num: function converting each provided input value into the
+        value passed to the simulation's step method
+    :return: a MismatchTable of the unexpected outputs
+    """
+    chunks = _stimulus_chunks(provided_inputs, expected_outputs, nsteps)
+
+    mismatches = MismatchTable(max_mismatches, stop_after_first_error)
+    for start, inputs, expected_columns in chunks:
+        actual_columns = {expvar: [] for expvar in expected_columns}
+        for i, step_inputs in enumerate(inputs):
+            sim.step({w: to_num(v) for w, v in step_inputs.items()})
+            for expvar, column in actual_columns.items():
+                column.append(sim.inspect(expvar))
+            if stop_after_first_error:
+                mismatches._add(_compare_columns(
+                    start + i, {w: c[i:i + 1] for w, c in expected_columns.items()},
+                    {w: c[i:] for w, c in actual_columns.items()}))
+                if mismatches:
+                    break
+        if not stop_after_first_error:
+            mismatches._add(_compare_columns(start, expected_columns, actual_columns))
+        elif mismatches:
+            break
+
+    if mismatches and file is not None:
+        mismatches.render(file)
+    return mismatches
+
+
+def _compare_columns(start, expected_columns, actual_columns):
+    """ Compare columns of expected values (which may be '?') to columns of actual values.
+
+    :return: list of (step, name, expected, actual) tuples for each mismatch
+    """
+    rows = []
+    for expvar, column in expected_columns.items():
+        name = expvar.name if isinstance(expvar, WireVector) else expvar
+        actuals = actual_columns[expvar]
+        expected = [None if e == '?' else int(e) for e in column]
+        rows.extend((start + i, name, e, a) for i, (e, a) in enumerate(zip(expected, actuals))
+                    if e is not None and e != a)
+    return rows
+
+
+# Number of steps of stimulus that step_multiple and CompiledSimulation.run
+# pull from their inputs at a time.  Stimulus is only ever held in memory one
+# chunk at a time, so it can come from generators of arbitrary length.
+_STIMULUS_CHUNK_STEPS = 4096
+
+
+def _chunked(iterable):
+    """ Split an iterable into lists of at most _STIMULUS_CHUNK_STEPS items. """
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, _STIMULUS_CHUNK_STEPS))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _stimulus_chunks(provided_inputs, expected_outputs, nsteps):
+    """ Validate the arguments of step_multiple and split them into chunks.
+
+    :param provided_inputs: either a dictionary mapping wires (or their names)
+        to a sequence, string or iterable of values, or an iterable yielding
+        one dictionary of input values per step
+    :param expected_outputs: either a dictionary mapping wires (or their names)
+        to a sequence, string or iterable of values, or an iterable yielding
+        one dictionary of expected values per step
+    :param nsteps: number of steps to take, or None to take one step for
+        each provided input value
+    :return: generator of (first step, list of input dicts, dict of expected
+        value lists) tuples, one per chunk of at most _STIMULUS_CHUNK_STEPS
+
+    Inputs with a length are checked up front, exactly as step_multiple always
+    has; inputs without one (e.g. generators) are checked as they run out.
+    """
+    inputs_by_wire = isinstance(provided_inputs, Mapping)
+    if not nsteps:
+        nsteps = None
+        if inputs_by_wire and len(provided_inputs) == 0:
+            raise PyrtlError('need to supply either input values or a number of steps to simulate')
+
+    def has_len(values):
+        return all(hasattr(v, '__len__') for v in values)
+
+    if inputs_by_wire and len(provided_inputs) > 0 and has_len(provided_inputs.values()):
+        msteps = max(len(v) for v in provided_inputs.values())
+        if nsteps is not None:
+            if nsteps > msteps:
+                raise PyrtlError('nsteps is specified but is greater than the '
+                                 'number of values supplied for each input')
+        else:
+            nsteps = msteps
+
+    if nsteps is not None:
+        if nsteps < 1:
+            raise PyrtlError("must simulate at least one step")
+
+        if inputs_by_wire and any(len(v) < nsteps for v in provided_inputs.values()
+                                  if hasattr(v, '__len__')):
+            raise PyrtlError(
+                "must supply a value for each provided wire "
+                "for each step of simulation")
+
+        if isinstance(expected_outputs, Mapping) and any(
+                len(v) < nsteps for v in expected_outputs.values() if hasattr(v, '__len__')):
+            raise PyrtlError(
+                "any expected outputs must have a supplied value "
+                "each step of simulation")
+
+    return _generate_stimulus_chunks(provided_inputs, expected_outputs, nsteps)
+
+
+def _generate_stimulus_chunks(provided_inputs, expected_outputs, nsteps):
+    missing = object()
+
+    if isinstance(provided_inputs, Mapping):
+        def input_steps():
+            names = list(provided_inputs)
+            iters = [iter(v) for v in provided_inputs.values()]
+            while True:
+                values = [next(it, missing) for it in iters]
+                if any(v is missing for v in values):
+                    if names and all(v is missing for v in values):
+                        return
+                    raise PyrtlError(
+                        "must supply a value for each provided wire "
+                        "for each step of simulation")
+                yield dict(zip(names, values))
+        input_steps = input_steps()
+    else:
+        input_steps = iter(provided_inputs)
+
+    if isinstance(expected_outputs, Mapping):
+        expected_iters = {w: iter(v) for w, v in expected_outputs.items()}
+
+        def expected_columns(n):
+            columns = {w: list(itertools.islice(it, n)) for w, it in expected_iters.items()}
+            if any(len(c) < n for c in columns.values()):
+                raise PyrtlError(
+                    "any expected outputs must have a supplied value "
+                    "each step of simulation")
+            return columns
+    else:
+        expected_rows = iter(expected_outputs)
+
+        def expected_columns(n):
+            rows = list(itertools.islice(expected_rows, n))
+            if len(rows) < n:
+                raise PyrtlError(
+                    "any expected outputs must have a supplied value "
+                    "each step of simulation")
+            names = {w for row in rows for w in row}
+            return {w: [row.get(w, '?') for row in rows] for w in names}
+
+    step = 0
+    while nsteps is None or step < nsteps:
+        n = _STIMULUS_CHUNK_STEPS if nsteps is None else min(_STIMULUS_CHUNK_STEPS, nsteps - step)
+        inputs = list(itertools.islice(input_steps, n))
+        if len(inputs) < n:
+            if nsteps is not None:
+                raise PyrtlError(
+                    "must supply a value for each provided wire "
+                    "for each step of simulation")
+            if step + len(inputs) == 0:
+                raise PyrtlError("must simulate at least one step")
+            if not inputs:
+                return
+        yield step, inputs, expected_columns(len(inputs))
+        step += len(inputs)
+        if nsteps is None and len(inputs) < n:
+            return
+
+
 # ----------------------------------------------------------------
 #    ___       __  ___     __
 #   |__   /\  /__`  |     /__` |  |\/|
@@ -525,7 +782,8 @@ class FastSimulation(object):
 
     def __init__(
             self, register_value_map={}, memory_value_map={},
-            default_value=0, tracer=True, block=None, code_file=None):
+            default_value=0, tracer=True, block=None, code_file=None,
+            activity_wires=None, event_wires=None):
         """ Instantiates a Fast Simulation instance.
 
         The interface for FastSimulation and Simulation should be almost identical.
@@ -533,6 +791,14 @@ class FastSimulation(object):
 
         :param code_file: The file in which to store a copy of the generated
             Python code. Defaults to no code being stored.
+        :param activity_wires: wires (or names of wires) for which to count,
+            per bit, the number of toggles and the number of cycles spent
+            high; True counts every wire.  Defaults to None.
+        :param event_wires: wires (or names of wires) for which to count the
+            number of cycles in which they are nonzero.  Defaults to None.
+
+        The counts are accumulated by the generated code without tracing the
+        wires, and can be read at any time with :meth:`counters`.
 
         Look at :meth:`.Simulation.__init__` for descriptions for the other parameters.
 
@@ -541,19 +807,24 @@ class FastSimulation(object):
         the simulation.
         """
 
-        block = working_block(block)
+        block, register_value_map, memory_value_map = _as_block(
+            block, register_value_map, memory_value_map)
         block.sanity_check()  # check that this is a good hw block
 
         self.block = block
         self.default_value = default_value
         if tracer is True:
-            tracer = SimulationTrace()
+            tracer = SimulationTrace(block=block)
         self.tracer = tracer
         self.sim_func = None
         self.code_file = code_file
         self.mems = {}
         self.regs = {}
         self.internal_names = _PythonSanitizer('_fastsim_tmp_')
+        self._activity_wires = _counter_wires(block, activity_wires)
+        self._event_wires = _counter_wires(block, event_wires)
+        self._counter_state = {}
+        self.reset_counters()
         self._initialize(register_value_map, memory_value_map)
 
     def _initialize(self, register_value_map={}, memory_value_map={}):
@@ -561,7 +832,7 @@ class FastSimulation(object):
             self.internal_names.make_valid_string(wire.name)
 
         # set registers to their values
-        reg_set = self.block.wirevector_subset(Register)
+        reg_set = self.block.wirevector_view(Register)
         for r in reg_set:
             rval = register_value_map.get(r, r.reset_value)
             if rval is None:
@@ -578,7 +849,7 @@ class FastSimulation(object):
         self.tracer._set_initial_values(self.default_value, self.regs.copy(),
                                         copy.deepcopy(self.mems))
 
-        context = {}
+        context = {'_vertical_add': _vertical_add, '_counters': self._counter_state}
         logic_creator = compile(s, '<string>', 'exec')
         exec(logic_creator, context)
         self.sim_func = context['sim_func']
@@ -590,7 +861,7 @@ class FastSimulation(object):
             name = self._mem_varname(mem)
             self.mems[name] = mem_map
 
-        for net in self.block.logic_subset('m@'):
+        for net in self.block.logic_view('m@'):
             mem = net.op_param[1]
             if self._mem_varname(mem) not in self.mems:
                 if isinstance(mem, RomBlock):
@@ -632,6 +903,7 @@ class FastSimulation(object):
 
         for mem, addr, value in mem_writes:
             self.mems[mem][addr] = value
+        self._counter_state['cycles'] += 1
 
         # for tracer compatibility
         self.context = self.outs.copy()
@@ -643,22 +915,27 @@ class FastSimulation(object):
         check_rtl_assertions(self)
 
     def step_multiple(self, provided_inputs={}, expected_outputs={}, nsteps=None,
-                      file=sys.stdout, stop_after_first_error=False):
+                      file=sys.stdout, stop_after_first_error=False,
+                      max_mismatches=None):
         """Take the simulation forward N cycles, where N is the number of
          values for each provided input.
 
         :param provided_inputs: a dictionary mapping WireVectors to their
-            values for N steps
+            values for N steps (a sequence, string or any other iterable), or
+            an iterable of per-step dictionaries of input values
         :param expected_outputs: a dictionary mapping WireVectors to their
             expected values for N steps; use ``?`` to indicate you don't care
             what the value at that step is
         :param nsteps: number of steps to take (defaults to None, meaning step
             for each supplied input value)
         :param file: where to write the output (if there are unexpected outputs
-            detected)
+            detected); None to not print anything
         :param stop_after_first_error: a boolean flag indicating whether to
             stop the simulation after the step where the first errors are
             encountered (defaults to False)
+        :param max_mismatches: stop recording unexpected outputs after this
+            many (defaults to None, meaning record them all)
+        :return: a :class:`.MismatchTable` of the unexpected outputs
 
         All input wires must be in the `provided_inputs` in order for the
         simulation to accept these values. Additionally, the length of the
@@ -690,6 +967,9 @@ class FastSimulation(object):
         respectively, on the first cycle and 1 and 1, respectively, on the
         second cycle.
 
+        Values can also come from generators and other iterables, which are
+        consumed in fixed-size chunks, as described in :meth:`.Simulation.step_multiple`.
+
         Example: if the design had no inputs, like so::
 
             a = pyrtl.Register(8)
@@ -706,36 +986,6 @@ class FastSimulation(object):
 
         """
 
-        if not nsteps and len(provided_inputs) == 0:
-            raise PyrtlError('need to supply either input values or a number of steps to simulate')
-
-        if len(provided_inputs) > 0:
-            longest = sorted(list(provided_inputs.items()),
-                             key=lambda t: len(t[1]),
-                             reverse=True)[0]
-            msteps = len(longest[1])
-            if nsteps:
-                if (nsteps > msteps):
-                    raise PyrtlError('nsteps is specified but is greater than the '
-                                     'number of values supplied for each input')
-            else:
-                nsteps = msteps
-
-        if nsteps < 1:
-            raise PyrtlError("must simulate at least one step")
-
-        if list(filter(lambda value: len(value) < nsteps,
-                       provided_inputs.values())):
-            raise PyrtlError(
-                "must supply a value for each provided wire "
-                "for each step of simulation")
-
-        if list(filter(lambda value: len(value) < nsteps,
-                       expected_outputs.values())):
-            raise PyrtlError(
-                "any expected outputs must have a supplied value "
-                "each step of simulation")
-
         def to_num(v):
             if isinstance(v, str):
                 # Don't use infer_val_and_bitwidth because they aren't in
@@ -745,39 +995,8 @@ class FastSimulation(object):
             # to retain class info if they were a subclass of int.
             return v
 
-        failed = []
-        for i in range(nsteps):
-            self.step({w: to_num(v[i]) for w, v in provided_inputs.items()})
-
-            for expvar in expected_outputs.keys():
-                expected = expected_outputs[expvar][i]
-                if expected == '?':
-                    continue
-                expected = int(expected)
-                actual = self.inspect(expvar)
-                if expected != actual:
-                    failed.append((i, expvar, expected, actual))
-
-            if failed and stop_after_first_error:
-                break
-
-        if failed:
-            if stop_after_first_error:
-                s = "(stopped after step with first error):"
-            else:
-                s = "on one or more steps:"
-            file.write("Unexpected output " + s + "\n")
-            file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n"
-                       .format("step", "name", "expected", "actual"))
-
-            def _sort_tuple(t):
-                # Sort by step and then wire name
-                return (t[0], _trace_sort_key(t[1]))
-
-            failed_sorted = sorted(failed, key=_sort_tuple)
-            for (step, name, expected, actual) in failed_sorted:
-                file.write("{0:>5} {1:>10} {2:>8} {3:>8}\n".format(step, name, expected, actual))
-            file.flush()
+        return _step_and_compare(self, provided_inputs, expected_outputs, nsteps, file,
+                                 stop_after_first_error, max_mismatches, to_num)
 
     def inspect(self, w):
         """ Get the value of a WireVector in the last simulation cycle.
@@ -811,6 +1030,18 @@ class FastSimulation(object):
             raise PyrtlError("ROM blocks are not stored in the simulation object")
         return self.mems[self._mem_varname(mem)]
 
+    def counters(self):
+        """ Read the counters accumulated since creation (or the last :meth:`reset_counters`).
+
+        :return: an :class:`.ActivityCounts`
+        """
+        return _read_counters(self._activity_wires, self._event_wires, self._counter_state)
+
+    def reset_counters(self):
+        """ Set all the counters back to zero. """
+        # mutate in place, as the generated code holds a reference to the state
+        _reset_counter_state(self._counter_state, self._activity_wires, self._event_wires)
+
     def _to_name(self, name):
         """ Converts Wires to strings, keeps strings as is """
         if isinstance(name, WireVector):
@@ -835,6 +1066,12 @@ class FastSimulation(object):
         else:
             return self._varname(wire)
 
+    def _value_expr(self, wire):
+        """ Expression for the value of any wire at the end of the generated function. """
+        if isinstance(wire, Output):
+            return 'outs[' + repr(wire.name) + ']'
+        return self._arg_varname(wire)
+
     def _dest_varname(self, wire):
         if isinstance(wire, Output):
             return 'outs[' + repr(wire.name) + ']'
@@ -974,10 +1211,373 @@ class FastSimulation(object):
                     value = int(wire.val) if isinstance(wire, Const) else self._varname(wire)
                     prog.append('    outs["%s"] = %s' % (wire_name, value))
 
+        # accumulate counters
+        if self._activity_wires:
+            prog.append('    prev, toggles, high = '
+                        '_counters["prev"], _counters["toggles"], _counters["high"]')
+        for k, wire in enumerate(self._activity_wires):
+            prog.append('    v = %s' % self._value_expr(wire))
+            prog.append('    _vertical_add(high[%d], v)' % k)
+            prog.append('    if prev[%d] is not None:' % k)
+            prog.append('        _vertical_add(toggles[%d], prev[%d] ^ v)' % (k, k))
+            prog.append('    prev[%d] = v' % k)
+        for k, wire in enumerate(self._event_wires):
+            prog.append('    if %s:' % self._value_expr(wire))
+            prog.append('        _counters["events"][%d] += 1' % k)
+
         prog.append("    return regs, outs, mem_ws")
         return '\n'.join(prog)
 
 
+# ----------------------------------------------------------------
+#    __   __            ___  ___  __   __
+#   /  ` /  \ |  | |\ |  |  |__  |__) /__`
+#   \__, \__/ \__/ | \|  |  |___ |  \ .__/
+#
+
+class ActivityCounts(object):
+    """ Counts accumulated by the counter instrumentation of a simulation.
+
+    Returned by the ``counters()`` method of :class:`.Simulation`,
+    :class:`.FastSimulation` and :class:`.CompiledSimulation` when they are
+    created with `activity_wires` or `event_wires`.
+
+    * ``.cycles``: the number of cycles counted
+    * ``.toggles``: map from wire name to a list with, for each bit (least
+      significant first), the number of cycles in which that bit differed
+      from its value in the previous cycle
+    * ``.high``: map from wire name to a list with, for each bit, the number
+      of cycles in which that bit was 1
+    * ``.events``: map from wire name to the number of cycles in which that
+      wire was nonzero
+    """
+
+    def __init__(self, cycles, toggles, high, events):
+        self.cycles = cycles
+        self.toggles = toggles
+        self.high = high
+        self.events = events
+
+    def toggle_coverage(self, names=None):
+        """ Fraction of bits that toggled at least twice (so both rose and fell).
+
+        :param names: wire names to consider (defaults to all activity wires)
+        :return: a float between 0 and 1
+        """
+        if names is None:
+            names = self.toggles.keys()
+        counts = [c for name in names for c in self.toggles[name]]
+        if not counts:
+            return 0.0
+        return sum(1 for c in counts if c >= 2) / len(counts)
+
+    def activity_factor(self, name):
+        """ Average number of toggles per bit per cycle of a wire.
+
+        :param str name: name of an activity wire
+        :return: a float between 0 and 1
+        """
+        counts = self.toggles[name]
+        if self.cycles < 2 or not counts:
+            return 0.0
+        return sum(counts) / (len(counts) * (self.cycles - 1))
+
+
+def _counter_wires(block, wires):
+    """ Resolve the activity_wires or event_wires argument of a simulation.
+
+    :param wires: None for no wires, True for all wires (other than Consts),
+        or an iterable of wires and wire names
+    :return: list of wires, sorted by name
+    """
+    if wires is None:
+        return []
+    if wires is True:
+        wires = block.wirevector_subset(exclude=Const)
+    resolved = set()
+    for w in wires:
+        name = w if isinstance(w, str) else w.name
+        w = block.wirevector_by_name.get(name)
+        if w is None:
+            raise PyrtlError('wire "%s" is not in the simulated block' % name)
+        resolved.add(w)
+    return sorted(resolved, key=lambda w: _trace_sort_key(w.name))
+
+
+def _reset_counter_state(state, activity_wires, event_wires):
+    """ Zero the counters of Simulation or FastSimulation, in place. """
+    state['cycles'] = 0
+    state['prev'] = [None] * len(activity_wires)
+    state['toggles'] = [[] for _ in activity_wires]
+    state['high'] = [[] for _ in activity_wires]
+    state['events'] = [0] * len(event_wires)
+
+
+def _read_counters(activity_wires, event_wires, state):
+    """ Build the ActivityCounts of Simulation or FastSimulation from its counter state. """
+    return ActivityCounts(
+        state['cycles'],
+        {w.name: _vertical_counts(levels, w.bitwidth)
+         for w, levels in zip(activity_wires, state['toggles'])},
+        {w.name: _vertical_counts(levels, w.bitwidth)
+         for w, levels in zip(activity_wires, state['high'])},
+        {w.name: count for w, count in zip(event_wires, state['events'])})
+
+
+def _vertical_add(levels, x):
+    """ Add one to the count of every bit that is set in x.
+
+    The counts are kept bit-sliced: bit b of levels[i] is bit i of the count
+    for bit b of x, so a whole wire is counted with a few big-integer
+    operations per cycle (amortized) regardless of its width.
+    """
+    i = 0
+    while x:
+        if i == len(levels):
+            levels.append(x)
+            return
+        levels[i], x = levels[i] ^ x, levels[i] & x
+        i += 1
+
+
+def _vertical_counts(levels, bitwidth):
+    """ Unpack bit-sliced counts (see _vertical_add) into a list of counts per bit. """
+    return [sum(((level >> b) & 1) << i for i, level in enumerate(levels))
+            for b in range(bitwidth)]
+
+
+# ----------------------------------------------------------------
+#    __   __   __  ___
+#   /  ` /  \ /__`  |
+#   \__, \__/ .__/  |
+#
+
+class SimulationCostEstimate(collections.namedtuple(
+        'SimulationCostEstimate', ['backend', 'setup', 'per_cycle'])):
+    """ Setup and per-cycle cost (in seconds) of one simulation backend. """
+    __slots__ = ()
+
+    def total(self, cycles):
+        """ Total cost of setting up the simulation and running it for `cycles` cycles. """
+        return self.setup + self.per_cycle * cycles
+
+
+class SimulationCostModel(object):
+    """ Estimates the cost of simulating a block with each simulation backend.
+
+    The model is linear in a handful of features of the block: the number of
+    nets (weighted by how expensive each op is to evaluate), the number of
+    extra 64-bit limbs needed by wide nets, the number of ROM words (which are
+    compiled into the C code by :class:`.CompiledSimulation`) and the number of
+    input and output limbs (which are packed and unpacked every cycle by
+    :class:`.CompiledSimulation`).  The default coefficients were fit to
+    designs from the PyRTL test suite on an x86-64 machine and are only meant
+    to get the order of magnitude right; :meth:`benchmark` and
+    :meth:`calibrate` can be used to fit them to a particular machine and
+    design style.
+
+    Example::
+
+        model = pyrtl.SimulationCostModel()
+        model.calibrate(model.benchmark(nsteps=1000))
+        sim = pyrtl.make_simulation(expected_cycles=10**6, cost_model=model)
+    """
+
+    # all coefficients are in seconds
+    coefficients = {
+        'Simulation': {
+            'setup_fixed': 2e-4, 'setup_per_net': 40e-6, 'setup_per_limb': 0.0,
+            'setup_per_rom_word': 0.0, 'cycle_fixed': 15e-6, 'cycle_per_net': 2.5e-6,
+            'cycle_per_limb': 4e-6, 'cycle_per_io_limb': 0.0},
+        'FastSimulation': {
+            'setup_fixed': 5e-4, 'setup_per_net': 70e-6, 'setup_per_limb': 20e-6,
+            'setup_per_rom_word': 0.0, 'cycle_fixed': 15e-6, 'cycle_per_net': 0.2e-6,
+            'cycle_per_limb': 0.02e-6, 'cycle_per_io_limb': 0.0},
+        'CompiledSimulation': {
+            'setup_fixed': 60e-3, 'setup_per_net': 350e-6, 'setup_per_limb': 800e-6,
+            'setup_per_rom_word': 2e-6, 'cycle_fixed': 3e-6, 'cycle_per_net': 0.01e-6,
+            'cycle_per_limb': 0.01e-6, 'cycle_per_io_limb': 0.5e-6},
+    }
+
+    # relative cost of evaluating each op compared to a simple bitwise op
+    op_weights = {'*': 3.0, 'm': 2.0, '@': 2.0, 'c': 1.5, 's': 1.5, 'x': 1.2}
+
+    def __init__(self):
+        # multiplicative corrections found by calibrate, as (setup, per_cycle)
+        self.scale = {backend: (1.0, 1.0) for backend in self.coefficients}
+
+    @staticmethod
+    def _limbs(bitwidth):
+        return (bitwidth + 63) // 64
+
+    def features(self, block=None):
+        """ Extract the features of a block that the cost model is based on.
+
+        :param Block block: block (or :class:`.CompactNetlist`) to measure
+            (defaults to the working block)
+        :return: dict of feature name to value
+        """
+        block, _, _ = _as_block(block, {}, {})
+        nets = 0.0
+        limbs = 0.0
+        has_mul = False
+        mems = set()
+        for net in block.logic:
+            weight = self.op_weights.get(net.op, 1.0)
+            widest = max(len(w) for w in net.args + net.dests)
+            nets += weight
+            limbs += weight * (self._limbs(widest) - 1)
+            has_mul = has_mul or net.op == '*'
+            if net.op in 'm@':
+                mems.add(net.op_param[1])
+        rom_words = sum(1 << m.addrwidth for m in mems if isinstance(m, RomBlock))
+        io_limbs = sum(self._limbs(w.bitwidth) for w in block.wirevector_subset((Input, Output)))
+        return {'nets': nets, 'limbs': limbs, 'rom_words': rom_words,
+                'io_limbs': io_limbs, 'has_mul': has_mul}
+
+    @staticmethod
+    def available_backends(features, need_internal_inspect=False):
+        """ Names of the backends that can simulate a block with the given features.
+
+        :class:`.CompiledSimulation` is left out if internal wires need to be
+        inspected, if GCC or a 64-bit Python is not available, or if the block
+        multiplies and the host architecture has no 128-bit multiply support.
+        """
+        from .compilesim import _machine, _mulinstr
+        backends = ['Simulation', 'FastSimulation']
+        if need_internal_inspect:
+            return backends
+        if shutil.which('gcc') is None or sys.maxsize <= 2**32:
+            return backends
+        if features['has_mul'] and _machine() not in _mulinstr:
+            return backends
+        return backends + ['CompiledSimulation']
+
+    def estimate(self, backend, features):
+        """ Estimate the cost of simulating with a backend.
+
+        :param str backend: name of the simulation class
+        :param dict features: as returned by :meth:`features`
+        :return: a :class:`SimulationCostEstimate`
+        """
+        c = self.coefficients[backend]
+        setup_scale, cycle_scale = self.scale[backend]
+        setup = (c['setup_fixed']
+                 + c['setup_per_net'] * features['nets']
+                 + c['setup_per_limb'] * features['limbs']
+                 + c['setup_per_rom_word'] * features['rom_words'])
+        per_cycle = (c['cycle_fixed']
+                     + c['cycle_per_net'] * features['nets']
+                     + c['cycle_per_limb'] * features['limbs']
+                     + c['cycle_per_io_limb'] * features['io_limbs'])
+        return SimulationCostEstimate(backend, setup * setup_scale, per_cycle * cycle_scale)
+
+    def benchmark(self, block=None, nsteps=1000, backends=None):
+        """ Measure the actual cost of each backend on a block.
+
+        :param Block block: block (or :class:`.CompactNetlist`) to simulate
+            (defaults to the working block)
+        :param int nsteps: number of cycles to run, with all inputs held at 0
+        :param backends: names of the backends to measure (defaults to all the
+            backends available for the block)
+        :return: list of (estimated, measured) pairs of :class:`SimulationCostEstimate`
+
+        Each estimate and measurement is logged, and the result can be passed
+        to :meth:`calibrate`.
+        """
+        block, _, _ = _as_block(block, {}, {})
+        features = self.features(block)
+        if backends is None:
+            backends = self.available_backends(features)
+        inputs = {w.name: [0] * nsteps for w in block.wirevector_subset(Input)}
+        results = []
+        for backend in backends:
+            sim_class = _simulation_backend(backend)
+            start = time.perf_counter()
+            sim = sim_class(block=block)
+            setup = time.perf_counter() - start
+            start = time.perf_counter()
+            sim.step_multiple(inputs, nsteps=nsteps)
+            per_cycle = (time.perf_counter() - start) / nsteps
+            estimated = self.estimate(backend, features)
+            measured = SimulationCostEstimate(backend, setup, per_cycle)
+            _logger.info('benchmark %s: estimated setup %.3gs, %.3gs/cycle; '
+                         'measured setup %.3gs, %.3gs/cycle', backend, estimated.setup,
+                         estimated.per_cycle, measured.setup, measured.per_cycle)
+            results.append((estimated, measured))
+        return results
+
+    def calibrate(self, measurements):
+        """ Rescale the model so its estimates match a set of measurements.
+
+        :param measurements: list of (estimated, measured) pairs, as returned
+            by :meth:`benchmark` (possibly concatenated over several blocks)
+
+        The setup and per-cycle estimates of each backend are scaled by the
+        geometric mean of the measured/estimated ratios for that backend.
+        """
+        ratios = collections.defaultdict(list)
+        for estimated, measured in measurements:
+            ratios[estimated.backend].append((measured.setup / estimated.setup,
+                                              measured.per_cycle / estimated.per_cycle))
+        for backend, rs in ratios.items():
+            setup_scale, cycle_scale = self.scale[backend]
+            setup_scale *= math.exp(sum(math.log(r[0]) for r in rs) / len(rs))
+            cycle_scale *= math.exp(sum(math.log(r[1]) for r in rs) / len(rs))
+            self.scale[backend] = (setup_scale, cycle_scale)
+
+
+def _simulation_backend(name):
+    from .compilesim import CompiledSimulation
+    return {'Simulation': Simulation, 'FastSimulation': FastSimulation,
+            'CompiledSimulation': CompiledSimulation}[name]
+
+
+def make_simulation(block=None, expected_cycles=1000, need_internal_inspect=False,
+                    cost_model=None, **kwargs):
+    """ Create the simulation that is expected to finish soonest for a block.
+
+    :param Block block: the hardware block (or :class:`.CompactNetlist`) to be
+        simulated (defaults to the working block)
+    :param int expected_cycles: how many cycles the simulation is expected to run
+    :param bool need_internal_inspect: if True, only backends that can inspect
+        and trace internal wires (not just :class:`.Input` and
+        :class:`.Output`) are considered, which rules out
+        :class:`.CompiledSimulation`
+    :param SimulationCostModel cost_model: model used to estimate the cost of
+        each backend (defaults to a new :class:`SimulationCostModel`)
+    :param kwargs: passed on to the constructor of the chosen simulation (e.g.
+        `tracer`, `register_value_map`, `memory_value_map`, `default_value`)
+    :return: a :class:`.Simulation`, :class:`.FastSimulation` or
+        :class:`.CompiledSimulation`
+
+    The decision, the estimated cost of every available backend, and the
+    measured setup time of the chosen one are logged to the ``pyrtl.simulation``
+    logger at INFO level.
+    """
+    # unpacked (or flattened) once here, rather than by both the cost model
+    # and the chosen simulation
+    block, kwargs['register_value_map'], kwargs['memory_value_map'] = _as_block(
+        block, kwargs.get('register_value_map', {}), kwargs.get('memory_value_map', {}))
+    if cost_model is None:
+        cost_model = SimulationCostModel()
+    features = cost_model.features(block)
+    backends = cost_model.available_backends(features, need_internal_inspect)
+    estimates = [cost_model.estimate(backend, features) for backend in backends]
+    best = min(estimates, key=lambda e: e.total(expected_cycles))
+    for e in estimates:
+        _logger.info('make_simulation: %s estimated setup %.3gs + %.3gs/cycle = %.3gs '
+                     'for %d cycles', e.backend, e.setup, e.per_cycle,
+                     e.total(expected_cycles), expected_cycles)
+
+    start = time.perf_counter()
+    sim = _simulation_backend(best.backend)(block=block, **kwargs)
+    measured = time.perf_counter() - start
+    _logger.info('make_simulation: chose %s; estimated setup %.3gs, measured setup %.3gs',
+                 best.backend, best.setup, measured)
+    return sim
+
+
 # ----------------------------------------------------------------
 #    ___  __        __   ___
 #     |  |__)  /\  /  ` |__
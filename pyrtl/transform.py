@@ -22,7 +22,7 @@ import functools
 from pyrtl.pyrtlexceptions import PyrtlError
 
 from .core import set_working_block, LogicNet, working_block
-from .wire import Const, Input, Output, WireVector, Register
+from .wire import Const, Input, Output, WireVector, Register, _unchecked_wire
 
 
 def net_transform(transform_func, block=None, **kwargs):
@@ -69,10 +69,9 @@ def wire_transform(transform_func, select_types=WireVector,
     be removed from the block entirely.
     """
     block = working_block(block)
-    src_nets, dst_nets = block.net_connections(include_virtual_nodes=False)
     for orig_wire in block.wirevector_subset(select_types, exclude_types):
         new_src, new_dst = transform_func(orig_wire)
-        replace_wire_fast(orig_wire, new_src, new_dst, src_nets, dst_nets, block)
+        replace_wire_fast(orig_wire, new_src, new_dst, block=block)
 
 
 def all_wires(transform_func):
@@ -90,12 +89,11 @@ def replace_wires(wire_map, block=None):
     :param block: block to operate over (defaults to working block)
     """
     block = working_block(block)
-    src_nets, dst_nets = block.net_connections(include_virtual_nodes=False)
     for old_w, new_w in wire_map.items():
-        replace_wire_fast(old_w, new_w, new_w, src_nets, dst_nets, block)
+        replace_wire_fast(old_w, new_w, new_w, block=block)
 
 
-def replace_wire_fast(orig_wire, new_src, new_dst, src_nets, dst_nets, block=None):
+def replace_wire_fast(orig_wire, new_src, new_dst, src_nets=None, dst_nets=None, block=None):
     """ Replace orig_wire with new_src and/or new_dst.
 
     :param WireVector orig_wire: Wire to be replaced
@@ -104,15 +102,19 @@ def replace_wire_fast(orig_wire, new_src, new_dst, src_nets, dst_nets, block=Non
     :param WireVector new_dst: Wire to replace orig_wire, anywhere orig_wire is an
         argument of a net. Ignored if orig_wire equals new_dst.
     :param {WireVector: LogicNet} src_nets: Maps a wire to the net where it is a dest
+        (defaults to None, meaning use the block's :meth:`~.Block.connection_index`)
     :param {WireVector: List[LogicNet]} dst_nets: Maps a wire to list of nets where it is an arg
+        (defaults to None, meaning use the block's :meth:`~.Block.connection_index`)
     :param Block block: The block on which to operate (defaults to working block)
 
     The net that orig_wire originates from (its source net) will use new_src as its
     destination wire. The nets that orig_wire went to (its destination nets) will now
     have new_dst as one of their argument wires instead.
 
-    This removes and/or adds nets to the block's logic set. This also *updates* the
-    src_nets and dst_nets maps that are passed in, such that the following hold:
+    This removes and/or adds nets to the block's logic set, which keeps the block's
+    connection index up to date.  If src_nets and dst_nets maps (e.g. from
+    :meth:`~.Block.net_connections`) are passed in instead, this *updates* them
+    such that the following hold:
 
     ```
         old_src_net = src_nets[orig_wire]
@@ -166,39 +168,53 @@ def replace_wire_fast(orig_wire, new_src, new_dst, src_nets, dst_nets, block=Non
          w3                        w3
     ```
     """
-    def remove_net(net_):
-        for arg in set(net_.args):
-            dst_nets[arg].remove(net_)
-            if not len(dst_nets[arg]):
-                del dst_nets[arg]
-        if len(net_.dests) == 1:
-            del src_nets[net_.dests[0]]
-        block.logic.remove(net_)
-
-    def add_net(net_):
-        for arg in set(net_.args):
-            if arg not in dst_nets:
-                dst_nets[arg] = [net_]
-            else:
-                dst_nets[arg].append(net_)
-        if len(net_.dests) == 1:
-            src_nets[net_.dests[0]] = net_
-        block.add_net(net_)
+    block = working_block(block)
+    if src_nets is None and dst_nets is None:
+        # the block's live index is updated by block.logic itself
+        index = block.connection_index()
+        driver, sinks = index.driver, index.sinks
+        remove_net, add_net = block.logic.remove, block.add_net
+    elif src_nets is None or dst_nets is None:
+        raise PyrtlError('replace_wire_fast needs both src_nets and dst_nets, or neither')
+    else:
+        def driver(wire):
+            return src_nets.get(wire)
+
+        def sinks(wire):
+            return tuple(dst_nets.get(wire, ()))  # a copy, as the original will be modified
+
+        def remove_net(net_):
+            for arg in set(net_.args):
+                dst_nets[arg].remove(net_)
+                if not len(dst_nets[arg]):
+                    del dst_nets[arg]
+            if len(net_.dests) == 1:
+                del src_nets[net_.dests[0]]
+            block.logic.remove(net_)
+
+        def add_net(net_):
+            for arg in set(net_.args):
+                if arg not in dst_nets:
+                    dst_nets[arg] = [net_]
+                else:
+                    dst_nets[arg].append(net_)
+            if len(net_.dests) == 1:
+                src_nets[net_.dests[0]] = net_
+            block.add_net(net_)
 
     # src and dst in this function are all relative to wires
-    block = working_block(block)
-    if new_src is not orig_wire and orig_wire in src_nets:
+    if new_src is not orig_wire:
         # don't need to add the new_src and new_dst because they were made at creation
-        net = src_nets[orig_wire]
-        new_net = LogicNet(
-            op=net.op, op_param=net.op_param, args=net.args,
-            dests=tuple(new_src if w is orig_wire else w for w in net.dests))
-        remove_net(net)
-        add_net(new_net)
-
-    if new_dst is not orig_wire and orig_wire in dst_nets:
-        old_nets = tuple(dst_nets[orig_wire])  # need a copy bc the original will be modified
-        for net in old_nets:
+        net = driver(orig_wire)
+        if net is not None:
+            new_net = LogicNet(
+                op=net.op, op_param=net.op_param, args=net.args,
+                dests=tuple(new_src if w is orig_wire else w for w in net.dests))
+            remove_net(net)
+            add_net(new_net)
+
+    if new_dst is not orig_wire:
+        for net in sinks(orig_wire):
             new_net = LogicNet(
                 op=net.op, op_param=net.op_param, dests=net.dests,
                 args=tuple(new_dst if w is orig_wire else w for w in net.args))
@@ -240,12 +256,23 @@ def copy_block(block=None, update_working_block=True):
 
     :param block: The block to clone (defaults to the working block).
     :return: The resulting block
+
+    The source block is sanity checked once, and then its wires and nets are
+    copied over in bulk, without repeating the per-wire and per-net checks
+    done while elaborating a design.
+
+    Copying allocates several objects per wire and net, and for a very large
+    block Python's cyclic garbage collector can spend much of that time
+    rescanning the block.  None of the copy is garbage, so callers copying
+    such blocks may want to disable the collector around the call (see
+    :func:`gc.disable`, or :func:`gc.freeze` to exclude everything allocated
+    so far from future collections); this function leaves the collector,
+    which is shared by every thread, alone.
     """
     block_in = working_block(block)
     block_out, temp_wv_map = _clone_block_and_wires(block_in)
     mems = {}
-    for net in block_in.logic:
-        _copy_net(block_out, net, temp_wv_map, mems)
+    _copy_nets(block_out, block_in.logic, temp_wv_map, mems)
     block_out.mem_map = mems
     block_out.io_map = {io: w for io, w in temp_wv_map.items() if isinstance(io, (Input, Output))}
     block_out.reg_map = {r: w for r, w, in temp_wv_map.items() if isinstance(r, Register)}
@@ -260,32 +287,43 @@ def _clone_block_and_wires(block_in):
     synthesis. This does not split a WireVector with multiple wires.
 
     :param block_in: The block to change
-    :param synth_name: a name to prepend to all new copies of a wire
     :return: the resulting block and a WireVector map
     """
     block_in.sanity_check()  # make sure that everything is valid
     block_out = block_in.__class__()
-    temp_wv_map = {}
-    with set_working_block(block_out, no_sanity_check=True):
-        for wirevector in block_in.wirevector_subset():
-            new_wv = clone_wire(wirevector)
-            temp_wv_map[wirevector] = new_wv
-
+    temp_wv_map = {w: _unchecked_clone(w, w.name, block_out) for w in block_in.wirevector_set}
+    block_out._add_wirevectors_unchecked(temp_wv_map.values())
+    for name, instance in block_in.instances.items():
+        block_out.instances[name] = instance._remapped(name, temp_wv_map)
     return block_out, temp_wv_map
 
 
-def _copy_net(block_out, net, temp_wv_net, mem_map):
-    """ This function makes a copy of all nets passed to it for synth uses.
-    """
-    new_args = tuple(temp_wv_net[a_arg] for a_arg in net.args)
-    new_dests = tuple(temp_wv_net[a_dest] for a_dest in net.dests)
-    if net.op in "m@":  # special stuff for copying memories
-        new_param = _get_new_block_mem_instance(net.op_param, mem_map, block_out)
+def _unchecked_clone(w, name, block):
+    """ Copy of wire `w` named `name` for `block`, made without any checks
+    and not yet added to `block`. """
+    if isinstance(w, Const):
+        return _unchecked_wire(type(w), name, w.bitwidth, block, val=w.val)
+    elif isinstance(w, Register):
+        return _unchecked_wire(type(w), name, w.bitwidth, block, reset_value=w.reset_value)
     else:
-        new_param = net.op_param
-
-    new_net = LogicNet(net.op, new_param, args=new_args, dests=new_dests)
-    block_out.add_net(new_net)
+        return _unchecked_wire(type(w), name, w.bitwidth, block)
+
+
+def _copy_nets(block_out, nets, temp_wv_map, mem_map):
+    """ Copy nets already checked in their own block to block_out, in bulk. """
+    new_nets = []
+    make_net = LogicNet._make
+    for net in nets:
+        new_args = tuple([temp_wv_map[a_arg] for a_arg in net.args])
+        new_dests = tuple([temp_wv_map[a_dest] for a_dest in net.dests])
+        if net.op in 'm@':  # special stuff for copying memories
+            new_param = _get_new_block_mem_instance(net.op_param, mem_map, block_out)
+        else:
+            new_param = net.op_param
+            if net.op == 'r':
+                new_dests[0].reg_in = new_args[0]
+        new_nets.append(make_net((net.op, new_param, new_args, new_dests)))
+    block_out.logic.update(new_nets)
 
 
 def _get_new_block_mem_instance(op_param, mem_map, block_out):
@@ -297,4 +335,5 @@ def _get_new_block_mem_instance(op_param, mem_map, block_out):
         new_mem = old_mem._make_copy(block_out)
         new_mem.id = old_mem.id
         mem_map[old_mem] = new_mem
-    return memid, mem_map[old_mem]
+    new_mem = mem_map[old_mem]
+    return new_mem.id, new_mem
@@ -31,9 +31,8 @@ _constIndexer = _NameIndexer("const_")
 
 
 def _reset_wire_indexers():
-    global _wvIndexer, _constIndexer
-    _wvIndexer = _NameIndexer("tmp")
-    _constIndexer = _NameIndexer("const_")
+    _wvIndexer.reset()
+    _constIndexer.reset()
 
 
 def next_tempvar_name(name=""):
@@ -51,6 +50,26 @@ def next_tempvar_name(name=""):
         return name
 
 
+def _unchecked_wire(cls, name, bitwidth, block, val=None, reset_value=None):
+    """ Create a wire of class `cls` without running its constructor.
+
+    None of the checks of the constructor are done and the wire is not added
+    to `block`: this is for copying wires out of a block that has already
+    been checked, many at a time (see :meth:`.Block._add_wirevectors_unchecked`).
+    `val` is the value of a Const and `reset_value` the reset value of a Register.
+    """
+    w = cls.__new__(cls)
+    _set_name(w, name)
+    _set_block(w, block)
+    _set_bitwidth(w, bitwidth)
+    if isinstance(w, Const):
+        _set_val(w, val)
+    elif isinstance(w, Register):
+        _set_reg_in(w, None)
+        _set_reset_value(w, reset_value)
+    return w
+
+
 class WireVector(object):
     """ The main class for describing the connections between operators.
 
@@ -90,6 +109,11 @@ class WireVector(object):
     simply wires the two together.
     """
 
+    # The attributes of wires are stored in slots to keep large netlists small.  Any
+    # other data (the call stack kept in debug mode, or the user's own metadata)
+    # goes in a dict that is only allocated when needed.
+    __slots__ = ('_name', '_block', 'bitwidth', '_metadata')
+
     # "code" is a static variable used when output as string.
     # Each class inheriting from WireVector should overload accordingly
     _code = 'W'
@@ -120,8 +144,7 @@ class WireVector(object):
         self._validate_bitwidth(bitwidth)
 
         if core._setting_keep_wirevector_call_stack:
-            import traceback
-            self.init_call_stack = traceback.format_stack()
+            self._get_metadata()['_call_frames'] = core._capture_call_frames()
 
     @property
     def name(self):
@@ -137,8 +160,55 @@ class WireVector(object):
         self._name = value
         self._block.add_wirevector(self)
 
-    def __hash__(self):
-        return id(self)
+    @property
+    def init_call_stack(self):
+        """ The call stack at the time the WireVector was created, as a list of
+        strings in the format of ``traceback.format_stack()``.
+
+        Only kept in debug mode (see :func:`.set_debug_mode`); reading it raises
+        AttributeError otherwise.  The stack is captured cheaply when the wire is
+        created and only formatted the first time this is read.
+        """
+        try:
+            metadata = object.__getattribute__(self, '_metadata')
+        except AttributeError:
+            metadata = {}  # don't allocate one just to find nothing in it
+        if '_init_call_stack' not in metadata:
+            if '_call_frames' not in metadata:
+                raise AttributeError('%r object has no attribute %r'
+                                     % (type(self).__name__, 'init_call_stack'))
+            metadata['_init_call_stack'] = core._format_call_frames(metadata.pop('_call_frames'))
+        return metadata['_init_call_stack']
+
+    @init_call_stack.setter
+    def init_call_stack(self, value):
+        metadata = self._get_metadata()
+        metadata.pop('_call_frames', None)
+        metadata['_init_call_stack'] = value
+
+    @property
+    def metadata(self):
+        """ A dict in which you can keep your own data about the WireVector.
+
+        WireVectors have a fixed set of attributes (see ``__slots__``), so
+        ``wire.note = 'hello'`` raises AttributeError; use
+        ``wire.metadata['note'] = 'hello'`` instead.  The dict is only allocated
+        the first time this is read, and keys starting with an underscore are
+        reserved for PyRTL.  Subclasses of WireVector that do not define
+        ``__slots__`` can also have attributes of their own.
+        """
+        return self._get_metadata()
+
+    def _get_metadata(self):
+        try:
+            return object.__getattribute__(self, '_metadata')
+        except AttributeError:
+            metadata = {}
+            object.__setattr__(self, '_metadata', metadata)
+            return metadata
+
+    # identity hash, as for object; spelled out because __eq__ is overloaded
+    __hash__ = object.__hash__
 
     def __str__(self):
         """ A string representation of the wire in 'name/bitwidth code' form. """
@@ -215,14 +285,7 @@ class WireVector(object):
         elif op in '<>=':
             resultlen = 1
 
-        s = WireVector(bitwidth=resultlen)
-        net = LogicNet(
-            op=op,
-            op_param=None,
-            args=(a, b),
-            dests=(s,))
-        working_block().add_net(net)
-        return s
+        return working_block()._hashed_net_dest(op, None, (a, b), resultlen)
 
     def __bool__(self):
         """ Use of a WireVector in a statement like "a or b" is forbidden."""
@@ -386,14 +449,7 @@ class WireVector(object):
 
         :return WireVector: a result wire for the operation
         """
-        outwire = WireVector(bitwidth=len(self))
-        net = LogicNet(
-            op='~',
-            op_param=None,
-            args=(self,),
-            dests=(outwire,))
-        working_block().add_net(net)
-        return outwire
+        return working_block()._hashed_net_dest('~', None, (self,), len(self))
 
     def __getitem__(self, item):
         """ Grabs a subset of the wires.
@@ -409,14 +465,7 @@ class WireVector(object):
             selectednums = tuple(allindex[item])
         if not selectednums:
             raise PyrtlError('selection %s must have at least one selected wire' % str(item))
-        outwire = WireVector(bitwidth=len(selectednums))
-        net = LogicNet(
-            op='s',
-            op_param=selectednums,
-            args=(self,),
-            dests=(outwire,))
-        working_block().add_net(net)
-        return outwire
+        return working_block()._hashed_net_dest('s', selectednums, (self,), len(selectednums))
 
     def __lshift__(self, other):
         raise PyrtlError('Shifting using the << and >> operators are not supported '
@@ -482,9 +531,7 @@ class WireVector(object):
         the number of bits of a WireVector.  As a convenience for this, the
         ``bitmask`` property is provided.  As an example, if there was a 3-bit
         WireVector ``a``, a call to  ``a.bitmask()`` should return 0b111 or 0x7."""
-        if "_bitmask" not in self.__dict__:
-            self._bitmask = (1 << len(self)) - 1
-        return self._bitmask
+        return (1 << len(self)) - 1
 
     def truncate(self, bitwidth):
         """ Generate a new truncated WireVector derived from self.
@@ -535,13 +582,7 @@ class WireVector(object):
             from .corecircuits import concat
             if isinstance(extbit, int):
                 extbit = Const(extbit, bitwidth=1)
-            extvector = WireVector(bitwidth=numext)
-            net = LogicNet(
-                op='s',
-                op_param=(0,) * numext,
-                args=(extbit,),
-                dests=(extvector,))
-            working_block().add_net(net)
+            extvector = working_block()._hashed_net_dest('s', (0,) * numext, (extbit,), numext)
             return concat(extvector, self)
 
 
@@ -553,6 +594,7 @@ class WireVector(object):
 
 class Input(WireVector):
     """ A WireVector type denoting inputs to a block (no writers). """
+    __slots__ = ()
     _code = 'I'
 
     def __init__(self, bitwidth=None, name='', block=None):
@@ -581,6 +623,7 @@ class Output(WireVector):
     Even though Output seems to have valid ops such as ``__or__`` , using
     them will throw an error.
     """
+    __slots__ = ()
     _code = 'O'
 
     def __init__(self, bitwidth=None, name='', block=None):
@@ -597,8 +640,25 @@ class Const(WireVector):
     If a negative integer is provided in the simulation, it is converted
     to a two's complement representation of the specified bitwidth."""
 
+    __slots__ = ('val',)
     _code = 'C'
 
+    def __new__(cls, *args, **kwargs):
+        if cls is Const and (args or kwargs):
+            interned = cls._interned(*args, **kwargs)
+            if interned is not None:
+                return interned  # __init__ will see that it is already set up
+        return super(Const, cls).__new__(cls)
+
+    @staticmethod
+    def _interned(val, bitwidth=None, name='', signed=False, block=None):
+        """ The pooled Const to reuse for these arguments, if the block interns Consts. """
+        pool = working_block(block)._const_pool
+        if pool is None or name:
+            return None
+        from .helperfuncs import infer_val_and_bitwidth
+        return pool.get(infer_val_and_bitwidth(val, bitwidth, signed))
+
     def __init__(self, val, bitwidth=None, name='', signed=False, block=None):
         """ Construct a constant implementation at initialization.
 
@@ -618,7 +678,19 @@ class Const(WireVector):
         argument is only used for proper inference of WireVector size and certain
         bitwidth sanity checks assuming a two's complement representation of
         the constants.
+
+        If the block has :attr:`~.Block.intern_consts` set and no name is
+        given, an existing Const with the same value and bitwidth is returned
+        instead of a new one.
         """
+        pool = None if name or type(self) is not Const else working_block(block)._const_pool
+        if pool is not None:
+            try:
+                Const.val.__get__(self)
+                return  # an interned Const handed back by __new__, already set up
+            except AttributeError:
+                pass
+
         self._validate_bitwidth(bitwidth)
         from .helperfuncs import infer_val_and_bitwidth
         num, bitwidth = infer_val_and_bitwidth(val, bitwidth, signed)
@@ -636,6 +708,8 @@ class Const(WireVector):
         super(Const, self).__init__(bitwidth=bitwidth, name=name, block=block)
         # add the member "val" to track the value of the constant
         self.val = num
+        if pool is not None:
+            pool[(num, bitwidth)] = self
 
     def __ilshift__(self, other):
         """ This is an illegal op for Consts. Their value is set in the __init__ function"""
@@ -662,6 +736,7 @@ class Register(WireVector):
     property :attr:`~.Register.next` with the ``<<=`` operator.  For example, if you want
     to specify a counter it would look like: ``a.next <<= a + 1``
     """
+    __slots__ = ('reg_in', 'reset_value')
     _code = 'R'
 
     # When the register is called as such:  r.next <<= foo
@@ -781,6 +856,13 @@ class Register(WireVector):
         working_block().add_net(net)
 
 
+# slot setters used by _unchecked_wire, which skips the constructors
+_set_name, _set_block, _set_bitwidth = (
+    WireVector._name.__set__, WireVector._block.__set__, WireVector.bitwidth.__set__)
+_set_val = Const.val.__set__
+_set_reg_in, _set_reset_value = Register.reg_in.__set__, Register.reset_value.__set__
+
+
 class WrappedWireVector:
     '''Wraps a WireVector. Forwards all method calls and attribute accesses.
 
@@ -818,8 +900,14 @@ class WrappedWireVector:
         And this attribute assignment must be forwarded to the underlying
         Register.
 
+        The in-place operators below also end with an assignment to
+        ``self.wire``, which is kept on the wrapper itself.
+
         '''
-        self.wire.__setattr__(name, value)
+        if name == 'wire':
+            self.__dict__['wire'] = value
+        else:
+            self.wire.__setattr__(name, value)
 
     def __hash__(self):
         return hash(self.wire)
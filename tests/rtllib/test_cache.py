@@ -0,0 +1,142 @@
+import threading
+import unittest
+
+import pyrtl
+from pyrtl.rtllib import adders, barrel, cache, multipliers, muxes
+
+
+class TestComponentCache(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.cache = cache.ComponentCache()
+        self.a, self.b = pyrtl.Input(8, 'a'), pyrtl.Input(8, 'b')
+        self.inputs = {'a': [0, 1, 200, 255, 77], 'b': [0, 3, 100, 255, 12]}
+
+    def simulate(self, result, bitwidth):
+        out = pyrtl.Output(bitwidth, 'out')
+        out <<= result
+        pyrtl.working_block().sanity_check()
+        sim = pyrtl.Simulation()
+        sim.step_multiple(self.inputs)
+        return sim.tracer.trace['out']
+
+    def test_kogge_stone(self):
+        add = self.cache(adders.kogge_stone)
+        self.assertEqual(add.__name__, 'kogge_stone')
+        first = add(self.a, self.b)
+        nets = len(pyrtl.working_block().logic)
+        second = add(self.a, self.b[:4])
+        nets_before = len(pyrtl.working_block().logic)
+        third = add(self.b, self.a)
+        self.assertEqual(len(pyrtl.working_block().logic), nets_before + nets)
+        self.assertEqual(len({first, second, third}), 3)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (1, 2, 2))
+        self.assertAlmostEqual(stats.hit_rate, 1 / 3)
+        self.assertEqual(self.simulate(first + second + third, 11),
+                         [3 * a + 2 * b + (b & 15)
+                          for a, b in zip(self.inputs['a'], self.inputs['b'])])
+
+    def test_matches_uncached(self):
+        args = [(multipliers.tree_multiplier, 16), (adders.cla_adder, 9)]
+        for generator, bitwidth in args:
+            pyrtl.reset_working_block()
+            self.a, self.b = pyrtl.Input(8, 'a'), pyrtl.Input(8, 'b')
+            cached = self.cache(generator)
+            cached(self.a, self.b)
+            expected = self.simulate(generator(self.a, self.b), bitwidth)
+            pyrtl.reset_working_block()
+            self.a, self.b = pyrtl.Input(8, 'a'), pyrtl.Input(8, 'b')
+            self.assertEqual(self.simulate(cached(self.a, self.b), bitwidth), expected)
+        self.assertEqual(self.cache.stats().hits, 2)
+
+    def test_keys(self):
+        shift = self.cache(barrel.barrel_shifter)
+        one = pyrtl.Const(1, 1)
+        shift(self.a, one, one, self.b[:3])
+        shift(self.b, one, one, self.a[:3])
+        shift(self.b, one, pyrtl.Const(0, 1), self.a[:3])  # different Const
+        shift(self.b, one, one, self.a[:2])  # different bitwidth
+        mult = self.cache(multipliers.tree_multiplier)
+        mult(self.a, self.b, reducer=adders.dada_reducer)
+        mult(self.a, self.b, adder_func=adders.ripple_add, reducer=adders.dada_reducer)
+        mult(self.a, self.b, reducer=adders.dada_reducer, adder_func=adders.ripple_add)
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 5, 5))
+
+    def test_structured_arguments_and_results(self):
+        mux = self.cache(muxes.sparse_mux)
+        vals = {0: self.a, 3: self.b, muxes.SparseDefault: pyrtl.Const(9, 8)}
+        mux(self.b[:2], dict(vals))
+        result = mux(self.a[:2], dict(vals))
+        self.assertEqual(self.cache.stats().hits, 1)
+        expected = [{0: a, 3: b}.get(a & 3, 9)
+                    for a, b in zip(self.inputs['a'], self.inputs['b'])]
+        self.assertEqual(self.simulate(result, 8), expected)
+
+        # results that are tuples, or an argument itself
+        demux = self.cache(muxes.demux)
+        self.assertEqual(len(demux(self.a[:2])), 4)
+        self.assertEqual(len(demux(self.b[:2])), 4)
+        pick = self.cache(muxes.prioritized_mux)
+        self.assertIs(pick([self.a[0]], [self.b]), self.b)
+        self.assertIs(pick([self.b[0]], [self.a]), self.a)
+
+    def test_uncacheable(self):
+        def with_memory(addr):
+            mem = pyrtl.MemBlock(8, len(addr), asynchronous=True)
+            data = pyrtl.WireVector(8)
+            data <<= mem[addr]
+            return data
+
+        def with_set(a, options):
+            return a + len(options)
+
+        read = self.cache(with_memory)
+        read(self.a[:2])
+        read(self.b[:2])
+        self.cache(with_set)(self.a, {1, 2})
+        self.assertEqual(len(pyrtl.working_block().logic_subset('m')), 2)
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (0, 2))
+        pyrtl.working_block().sanity_check()
+
+    def test_intern_consts(self):
+        pyrtl.working_block().intern_consts = True
+        inc = self.cache(lambda x: x + 1)
+        inc(self.a)
+        consts = pyrtl.working_block().wirevector_subset(pyrtl.Const)
+        inc(self.b)
+        self.assertEqual(pyrtl.working_block().wirevector_subset(pyrtl.Const), consts)
+
+    def test_threads(self):
+        add = self.cache(adders.kogge_stone)
+
+        def elaborate(results):
+            a, b = pyrtl.Input(8, 'a'), pyrtl.Input(8, 'b')
+            out = pyrtl.Output(9, 'out')
+            out <<= add(a, b)
+            results.append(pyrtl.working_block())
+
+        blocks = []
+        threads = [threading.Thread(target=elaborate, args=(blocks,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for block in blocks:
+            sim = pyrtl.Simulation(block=block)
+            sim.step_multiple(self.inputs)
+            self.assertEqual(sim.tracer.trace['out'],
+                             [a + b for a, b in zip(self.inputs['a'], self.inputs['b'])])
+        self.assertEqual(self.cache.stats().entries, 1)
+
+    def test_clear(self):
+        self.cache(adders.kogge_stone)(self.a, self.b)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats(), cache.CacheStats(0, 0, 0.0, 0.0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -421,5 +421,38 @@ class TestFanout(unittest.TestCase):
         self.assertEqual(pyrtl.fanout(w), 4)
 
 
+class TestNetlistFootprint(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+
+    def test_empty(self):
+        footprint = pyrtl.netlist_footprint()
+        self.assertEqual((footprint.wires, footprint.nets), (0, 0))
+        self.assertEqual(footprint.bytes_per_wire, 0)
+        self.assertEqual(footprint.bytes_per_net, 0)
+
+    def test_counts(self):
+        a, b = pyrtl.input_list('a/8 b/8')
+        o = pyrtl.Output(9, 'o')
+        o <<= a + b
+        footprint = pyrtl.netlist_footprint()
+        self.assertEqual(footprint.wires, len(pyrtl.working_block().wirevector_set))
+        self.assertEqual(footprint.nets, 2)
+        self.assertGreater(footprint.bytes_per_wire, 0)
+        self.assertGreater(footprint.bytes_per_net, 0)
+        self.assertEqual(footprint.total_bytes, footprint.wire_bytes + footprint.net_bytes
+                         + footprint.block_bytes)
+
+    def test_grows_with_synthesis(self):
+        a, b = pyrtl.input_list('a/8 b/8')
+        o = pyrtl.Output(9, 'o')
+        o <<= a + b
+        before = pyrtl.netlist_footprint()
+        pyrtl.synthesize()
+        after = pyrtl.netlist_footprint()
+        self.assertGreater(after.wires, before.wires)
+        self.assertGreater(after.total_bytes, before.total_bytes)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,184 @@
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+import zlib
+
+import pyrtl
+from pyrtl import blockfile
+
+
+def _net_signature(block):
+    def param(net):
+        return net.op_param[1].name if net.op in 'm@' else net.op_param
+
+    return sorted((net.op, repr(param(net)), tuple(w.name for w in net.args),
+                   tuple(w.name for w in net.dests)) for net in block.logic)
+
+
+def _wire_signature(block):
+    return sorted((type(w).__name__, w.name, w.bitwidth, getattr(w, 'val', None),
+                   getattr(w, 'reset_value', None)) for w in block.wirevector_set)
+
+
+def _round_trip(block=None):
+    f = io.BytesIO()
+    pyrtl.save_block(f, block)
+    f.seek(0)
+    return pyrtl.load_block(f, update_working_block=False)
+
+
+class TestSaveLoadBlock(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a, b = pyrtl.input_list('a/4 b/4')
+        r = pyrtl.Register(4, 'r', reset_value=5)
+        m = pyrtl.MemBlock(4, 2, name='m', max_read_ports=None)
+        rom = pyrtl.RomBlock(4, 2, [3, 1, 2, 0], name='rom', asynchronous=True,
+                             pad_with_zeros=True)
+        r.next <<= a + b
+        m[a[:2]] <<= b
+        big = pyrtl.Const(2**70 + 1, name='big')
+        o = pyrtl.Output(4, 'o')
+        o <<= (r ^ m[b[:2]] ^ rom[a[2:]]) & 3
+        p = pyrtl.Output(71, 'p')
+        p <<= big
+        pyrtl.rtl_assert(a != 15, ValueError('a is 15'))
+
+    def test_round_trip(self):
+        block = pyrtl.working_block()
+        new_block = _round_trip()
+        new_block.sanity_check()
+        self.assertIs(type(new_block), pyrtl.Block)
+        self.assertIs(pyrtl.working_block(), block)
+        self.assertEqual(_wire_signature(new_block), _wire_signature(block))
+        self.assertEqual(_net_signature(new_block), _net_signature(block))
+        self.assertIn(new_block.get_wirevector_by_name('r').reg_in, new_block.wirevector_set)
+
+        m = new_block.get_memblock_by_name('m')
+        self.assertEqual((m.bitwidth, m.addrwidth, m.max_read_ports), (4, 2, None))
+        self.assertEqual(m.num_read_ports, 1)
+        self.assertEqual(m.num_write_ports, 1)
+        rom = new_block.get_memblock_by_name('rom')
+        self.assertIsInstance(rom, pyrtl.RomBlock)
+        self.assertEqual(rom.data, [3, 1, 2, 0])
+        self.assertTrue(rom.asynchronous and rom.pad_with_zeros)
+
+        ((wire, exp),) = new_block.rtl_assert_dict.items()
+        self.assertIn(wire, new_block.wirevector_set)
+        self.assertIsInstance(exp, ValueError)
+        self.assertEqual(exp.args, ('a is 15',))
+
+    def test_simulation(self):
+        inputs = {'a': [1, 2, 3, 14], 'b': [4, 5, 6, 9]}
+        expected = pyrtl.Simulation()
+        expected.step_multiple(inputs)
+        sim = pyrtl.Simulation(block=_round_trip())
+        sim.step_multiple(inputs)
+        self.assertEqual(sim.tracer.trace['o'], expected.tracer.trace['o'])
+        self.assertEqual(sim.tracer.trace['p'], [2**70 + 1] * 4)
+        with self.assertRaises(ValueError):
+            sim.step({'a': 15, 'b': 0})
+
+    def test_post_synthesis(self):
+        pyrtl.synthesize()
+        pyrtl.optimize()
+        block = pyrtl.working_block()
+        new_block = _round_trip()
+        self.assertIsInstance(new_block, pyrtl.PostSynthBlock)
+        self.assertEqual(_net_signature(new_block), _net_signature(block))
+        for attr in ('io_map', 'reg_map'):
+            old_map, new_map = getattr(block, attr), getattr(new_block, attr)
+            self.assertEqual(sorted(k.name for k in new_map), sorted(k.name for k in old_map))
+            for k, v in new_map.items():
+                (old_key,) = [o for o in old_map if o.name == k.name]
+                self.assertEqual((type(k), k.bitwidth), (type(old_key), old_key.bitwidth))
+                self.assertEqual([w.name for w in v], [w.name for w in old_map[old_key]])
+        self.assertEqual({(k.name, v.name) for k, v in new_block.mem_map.items()},
+                         {(k.name, v.name) for k, v in block.mem_map.items()})
+        for v in new_block.mem_map.values():
+            self.assertIs(new_block.get_memblock_by_name(v.name), v)
+
+        inputs = {'a': [1, 2, 3, 14], 'b': [4, 5, 6, 9]}
+        expected = pyrtl.Simulation()
+        expected.step_multiple(inputs)
+        sim = pyrtl.Simulation(block=new_block)
+        sim.step_multiple(inputs)  # uses io_map to find the pre-synthesis inputs
+        self.assertEqual(sim.tracer.trace['o'], expected.tracer.trace['o'])
+
+    def test_file_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'design.pyrtl')
+            pyrtl.save_block(path)
+            block = pyrtl.working_block()
+            new_block = pyrtl.load_block(path)
+        self.assertIs(pyrtl.working_block(), new_block)
+        self.assertEqual(_net_signature(new_block), _net_signature(block))
+
+    def test_rom_function(self):
+        pyrtl.reset_working_block()
+        rom = pyrtl.RomBlock(3, 3, lambda addr: 7 - addr, name='rom')
+        addr = pyrtl.Input(3, 'addr')
+        out = pyrtl.Output(3, 'out')
+        out <<= rom[addr]
+        new_rom = _round_trip().get_memblock_by_name('rom')
+        self.assertEqual(new_rom.data, [7, 6, 5, 4, 3, 2, 1, 0])
+
+    def test_not_a_block_file(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.load_block(io.BytesIO(b'module foo;'))
+        f = io.BytesIO()
+        pyrtl.save_block(f)
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.load_block(io.BytesIO(f.getvalue()[:-10]))
+
+    def test_corrupted_file(self):
+        f = io.BytesIO()
+        pyrtl.save_block(f)
+        data = f.getvalue()
+        rng = random.Random(0)
+        for _ in range(400):
+            corrupted = bytearray(data)
+            for pos in rng.sample(range(len(data)), 2):
+                corrupted[pos] ^= rng.randrange(1, 256)
+            with self.assertRaises(pyrtl.PyrtlError):
+                pyrtl.load_block(io.BytesIO(bytes(corrupted)), update_working_block=False)
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.load_block(io.BytesIO(data + b'\0'))
+
+        # with the checksum fixed up, corruption is still only ever a PyrtlError
+        header = len(blockfile._MAGIC) + blockfile._HEADER.size
+        for _ in range(400):
+            corrupted = bytearray(data)
+            for pos in rng.sample(range(header, len(data)), 2):
+                corrupted[pos] ^= rng.randrange(1, 256)
+            corrupted[:header] = blockfile._MAGIC + blockfile._HEADER.pack(
+                blockfile._VERSION, 0, zlib.crc32(corrupted[header:]))
+            try:
+                pyrtl.load_block(io.BytesIO(bytes(corrupted)), update_working_block=False)
+            except pyrtl.PyrtlError:
+                pass
+
+    def test_assertion_module_not_imported(self):
+        self.assertNotIn('pyrtl_no_such_module', sys.modules)
+        with self.assertRaisesRegex(pyrtl.PyrtlError, 'has not been imported'):
+            blockfile._make_exception('pyrtl_no_such_module:Error', ())
+        with self.assertRaisesRegex(pyrtl.PyrtlError, 'not an exception class'):
+            blockfile._make_exception('os:system', ())
+        self.assertIsInstance(blockfile._make_exception('builtins:ValueError', ('x',)),
+                              ValueError)
+
+    def test_unsupported_wire_type(self):
+        class MyWire(pyrtl.WireVector):
+            pass
+
+        w = MyWire(1, 'mine')
+        w <<= pyrtl.working_block().get_wirevector_by_name('a')[0]
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.save_block(io.BytesIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -562,5 +562,86 @@ class TestSuperWireConditionalBlock(unittest.TestCase):
             self.assertEqual(v(var4), t4)
 
 
+class TestManyCases(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.sel = pyrtl.Input(5, 'sel')
+        self.d = pyrtl.Input(8, 'd')
+
+    def mux_depth(self):
+        """ The most muxes on any path through the block. """
+        depth = {}
+        for net in pyrtl.working_block():
+            if net.op != 'r' and net.dests:
+                d = max((depth.get(a, 0) for a in net.args), default=0)
+                depth[net.dests[0]] = d + (net.op == 'x')
+        return max(depth.values())
+
+    def test_balanced_cases(self):
+        r = pyrtl.Register(8, 'r')
+        w = pyrtl.WireVector(8, 'w')
+        with pyrtl.conditional_assignment(defaults={w: 99}):
+            for k in range(20):
+                with self.sel == k:
+                    w |= self.d + k
+                    if k % 2:
+                        r.next |= k
+            with pyrtl.otherwise:
+                r.next |= self.d
+        out = pyrtl.Output(8, 'out')
+        out <<= w
+        self.assertLess(self.mux_depth(), 10)
+        # the 21 leaves of w (20 cases and the default) and the 12 of r only
+        # need the combined predicates of their left subtrees: 15 and 7 of them
+        self.assertEqual(len(pyrtl.working_block().logic_subset('|')), 15 + 7)
+
+        sim = pyrtl.Simulation()
+        sels = list(range(32))
+        sim.step_multiple({'sel': sels, 'd': [3 * s for s in sels]})
+        self.assertEqual(sim.tracer.trace['out'],
+                         [(4 * s) % 256 if s < 20 else 99 for s in sels])
+        expected_r = [0]
+        for s in sels[:-1]:
+            if s >= 20:
+                expected_r.append(3 * s % 256)
+            elif s % 2:
+                expected_r.append(s)
+            else:
+                expected_r.append(expected_r[-1])
+        self.assertEqual(sim.tracer.trace['r'], expected_r)
+
+    def test_balanced_memory_writes(self):
+        mem = pyrtl.MemBlock(8, 5, name='mem', asynchronous=True)
+        with pyrtl.conditional_assignment:
+            for k in range(12):
+                with self.sel == k:
+                    mem[31 - k] |= (self.d + k)[:8]
+        out = pyrtl.Output(8, 'out')
+        out <<= mem[self.sel]
+        self.assertLess(self.mux_depth(), 8)
+
+        sim = pyrtl.Simulation()
+        sim.step_multiple({'sel': list(range(16)), 'd': [1] * 16})
+        self.assertEqual(sim.inspect_mem(mem), {31 - k: 1 + k for k in range(12)})
+
+    def test_nested_cases(self):
+        w = pyrtl.WireVector(8, 'w')
+        with pyrtl.conditional_assignment:
+            with self.sel[4]:
+                for k in range(8):
+                    with self.sel[:3] == k:
+                        w |= k
+            with pyrtl.otherwise:
+                with self.sel[3]:
+                    w |= self.d
+        out = pyrtl.Output(8, 'out')
+        out <<= w
+        sim = pyrtl.Simulation()
+        sels = list(range(32))
+        sim.step_multiple({'sel': sels, 'd': [200] * 32})
+        self.assertEqual(sim.tracer.trace['out'],
+                         [s & 7 if s & 16 else 200 if s & 8 else 0 for s in sels])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,4 +1,7 @@
+import asyncio
+import concurrent.futures
 import io
+import threading
 import unittest
 
 import pyrtl
@@ -360,6 +363,115 @@ class TestSetWorkingBlock(unittest.TestCase):
         self.assertEqual(pyrtl.working_block(), self.block_a)
 
 
+def _build_counter(limit, barrier=None):
+    """ Elaborate a counter wrapping at limit into the working block and return the block. """
+    count = pyrtl.Register(4, 'count')
+    with pyrtl.conditional_assignment:
+        with count == limit:
+            if barrier is not None:
+                barrier.wait()  # make the threads elaborate their conditionals together
+            count.next |= 0
+        with pyrtl.otherwise:
+            count.next |= count + 1
+    out = pyrtl.Output(4, 'out')
+    out <<= count
+    return pyrtl.working_block()
+
+
+class TestConcurrentElaboration(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+
+    def check_counter(self, block, limit):
+        block.sanity_check()
+        sim = pyrtl.Simulation(block=block)
+        sim.step_multiple(nsteps=limit + 3)
+        self.assertEqual(sim.tracer.trace['out'], list(range(limit + 1)) + [0, 1])
+
+    def test_thread_pool(self):
+        main_block = pyrtl.working_block()
+        limits = [4, 5, 6, 7]
+        barrier = threading.Barrier(len(limits), timeout=10)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(limits)) as pool:
+            blocks = list(pool.map(lambda limit: _build_counter(limit, barrier), limits))
+
+        self.assertIs(pyrtl.working_block(), main_block)
+        self.assertEqual(len(main_block.logic), 0)
+        self.assertEqual(len(set(blocks)), len(limits))
+        for block, limit in zip(blocks, limits):
+            self.check_counter(block, limit)
+
+    def test_threads_sharing_a_block(self):
+        block = pyrtl.Block()
+        barrier = threading.Barrier(2, timeout=10)
+
+        def elaborate(index):
+            with pyrtl.set_working_block(block):
+                a = pyrtl.Input(8, 'a%d' % index)
+                mem = pyrtl.MemBlock(8, 2, name='mem%d' % index)
+                barrier.wait()  # make the threads generate names together
+                total = a + 1
+                for _ in range(20):
+                    total = (total + 3).truncate(8)
+                mem[0] <<= total
+                out = pyrtl.Output(8, 'out%d' % index)
+                out <<= mem[1]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(elaborate, range(2)))
+
+        block.sanity_check()
+        names = [w.name for w in block.wirevector_set]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(len(block.wirevector_by_name), len(block.wirevector_set))
+        self.assertNotEqual(block.memblock_by_name['mem0'].id,
+                            block.memblock_by_name['mem1'].id)
+
+    def test_thread_working_block(self):
+        block = pyrtl.Block()
+        seen = []
+
+        def elaborate():
+            seen.append(pyrtl.working_block())
+            pyrtl.set_working_block(block)
+            _build_counter(3)
+
+        with pyrtl.conditional_assignment:
+            # the conditional state of this thread is not visible to the other
+            thread = threading.Thread(target=elaborate)
+            thread.start()
+            thread.join()
+        self.assertIsNot(seen[0], pyrtl.working_block())
+        self.assertEqual(len(seen[0].logic), 0)
+        self.assertIsNot(pyrtl.working_block(), block)
+        self.check_counter(block, 3)
+
+    def test_asyncio_tasks(self):
+        main_block = pyrtl.working_block()
+
+        async def elaborate(limit):
+            pyrtl.reset_working_block()
+            count = pyrtl.Register(4, 'count')
+            with pyrtl.conditional_assignment:
+                with count == limit:
+                    await asyncio.sleep(0)  # let the other tasks run
+                    count.next |= 0
+                with pyrtl.otherwise:
+                    count.next |= count + 1
+            out = pyrtl.Output(4, 'out')
+            out <<= count
+            return pyrtl.working_block()
+
+        async def elaborate_all(limits):
+            return await asyncio.gather(*(elaborate(limit) for limit in limits))
+
+        limits = [2, 4, 6]
+        blocks = asyncio.run(elaborate_all(limits))
+        self.assertIs(pyrtl.working_block(), main_block)
+        for block, limit in zip(blocks, limits):
+            self.check_counter(block, limit)
+
+
 class TestAsGraph(unittest.TestCase):
     def setUp(self):
         pyrtl.reset_working_block()
@@ -531,6 +643,63 @@ class TestSanityCheck(unittest.TestCase):
         self.sanity_error("Unknown wires found in wirevector_by_name", pyrtl.PyrtlInternalError)
 
 
+class TestIncrementalSanityCheck(TestSanityCheck):
+    """ The same checks, run after the block has already passed a check once. """
+
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.block = pyrtl.working_block()
+        self.x = pyrtl.Input(4, 'x0')
+        self.y = pyrtl.Output(4, 'y0')
+        self.y <<= ~self.x
+        self.block.sanity_check()
+
+    def count_net_checks(self, **kwargs):
+        checked = []
+        original = self.block.sanity_check_net
+        self.block.sanity_check_net = lambda net: checked.append(net) or original(net)
+        try:
+            self.block.sanity_check(**kwargs)
+        finally:
+            del self.block.sanity_check_net
+        return checked
+
+    def test_only_changes_checked(self):
+        for i in range(20):
+            o = pyrtl.Output(4, 'big%d' % i)
+            o <<= self.x + i
+        self.block.sanity_check()
+        self.assertEqual(self.count_net_checks(), [])
+        z = pyrtl.Output(4, 'z')
+        z <<= self.x
+        self.assertEqual(len(self.count_net_checks()), 1)  # just the net driving z
+        self.assertEqual(len(self.count_net_checks(full=True)), len(self.block.logic))
+
+    def test_removed_driver(self):
+        (net,) = self.block.logic_subset('~')
+        self.block.logic.remove(net)
+        self.sanity_error("used but never driven")
+
+    def test_bad_net_added_directly(self):
+        w = pyrtl.WireVector(2, 'w')
+        self.block.logic.add(pyrtl.LogicNet('w', None, (self.x,), (w,)))
+        self.block.logic.add(pyrtl.LogicNet('&', None, (self.x, w), (pyrtl.Output(4),)))
+        self.sanity_error("mismatched bitwidths", pyrtl.PyrtlInternalError)
+
+    def test_rename_to_duplicate(self):
+        w = pyrtl.Output(4, 'w')
+        w <<= self.x
+        self.block.sanity_check()
+        w.name = 'y0'
+        self.sanity_error("Duplicate wire names")
+
+    def test_untracked_change_needs_full(self):
+        self.x.bitwidth = 3
+        self.block.sanity_check()
+        with self.assertRaises(pyrtl.PyrtlInternalError):
+            self.block.sanity_check(full=True)
+
+
 class TestLogicNets(unittest.TestCase):
     def setUp(self):
         pyrtl.reset_working_block()
@@ -734,5 +903,251 @@ class TestNetConnections(unittest.TestCase):
             dst_nets[w]
 
 
+class TestBlockGeneration(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.block = pyrtl.working_block()
+        a, b = pyrtl.input_list('a/4 b/4')
+        self.o = pyrtl.Output(5, 'o')
+        self.o <<= a + b
+
+    def test_generation_bumped_by_mutation(self):
+        gen = self.block.generation
+        w = pyrtl.WireVector(1, 'w')
+        self.assertGreater(self.block.generation, gen)
+
+        gen = self.block.generation
+        self.block.remove_wirevector(w)
+        self.assertGreater(self.block.generation, gen)
+
+        gen = self.block.generation
+        self.block.logic = set(self.block.logic)
+        self.assertGreater(self.block.generation, gen)
+
+        gen = self.block.generation
+        net = next(iter(self.block.logic))
+        self.block.logic.discard(net)
+        self.block.logic |= {net}
+        self.assertEqual(self.block.generation, gen + 2)
+
+    def test_generation_unchanged_by_reads(self):
+        gen = self.block.generation
+        list(self.block)
+        self.block.net_connections()
+        self.block.sanity_check()
+        self.assertEqual(self.block.generation, gen)
+
+    def test_topological_order_memoized(self):
+        first = list(self.block)
+        self.assertIs(self.block._memo['topological_order'],
+                      self.block._memoized('topological_order', None))
+        self.assertEqual(list(self.block), first)
+
+        c = pyrtl.Input(1, 'c')
+        o2 = pyrtl.Output(1, 'o2')
+        o2 <<= ~c
+        self.assertEqual(len(list(self.block)), len(first) + 2)
+
+    def test_connections_views(self):
+        src, dst = self.block.connections()
+        self.assertIs(self.block.connections()[0], src)
+        self.assertEqual(self.block.net_connections()[0], src)
+        self.assertEqual(src[self.o].op, 'w')
+        with self.assertRaises(TypeError):
+            src[self.o] = None
+
+        c = pyrtl.Input(1, 'c')
+        o2 = pyrtl.Output(1, 'o2')
+        o2 <<= ~c
+        new_src, new_dst = self.block.connections()
+        self.assertIn(o2, new_src)
+        self.assertNotIn(o2, src)  # earlier views are snapshots
+        self.assertEqual(len(new_dst[c]), 1)
+
+    def test_net_connections_are_copies(self):
+        _, dst = self.block.net_connections()
+        dst.clear()
+        _, dst = self.block.net_connections()
+        self.assertNotEqual(dst, {})
+        for nets in dst.values():
+            nets.append(None)
+        _, dst = self.block.net_connections()
+        self.assertTrue(all(n is not None for nets in dst.values() for n in nets))
+
+    def test_copy_block_after_memoizing(self):
+        list(self.block)
+        self.block.connections()
+        copy = pyrtl.copy_block(self.block)
+        self.assertEqual(len(list(copy)), len(list(self.block)))
+
+
+class TestConnectionIndex(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.block = pyrtl.working_block()
+        self.a, self.b = pyrtl.input_list('a/4 b/4')
+        self.s = pyrtl.WireVector(5, 's')
+        self.s <<= self.a + self.b
+        self.o = pyrtl.Output(5, 'o')
+        self.o <<= self.s * self.s
+
+    def test_matches_net_connections(self):
+        index = self.block.connection_index()
+        src, dst = self.block.net_connections()
+        for w in self.block.wirevector_set:
+            self.assertEqual(index.driver(w), src.get(w))
+            self.assertEqual(set(index.sinks(w)), set(dst.get(w, [])))
+        self.assertIsNone(index.driver(self.a))
+        self.assertEqual(index.fanout(self.s), 2)
+        self.assertEqual(pyrtl.fanout(self.s), 2)
+
+    def test_live_updates(self):
+        index = self.block.connection_index()
+        self.assertIs(self.block.connection_index(), index)
+        c = pyrtl.Input(1, 'c')
+        p = pyrtl.Output(5, 'p')
+        p <<= pyrtl.select(c, self.s, self.a)
+        self.assertEqual(len(index.sinks(self.s)), 2)
+        self.assertEqual(index.driver(p).op, 'w')
+
+        self.block.logic.remove(index.driver(p))
+        self.assertIsNone(index.driver(p))
+        self.block.logic.clear()
+        self.assertEqual(index.sinks(self.s), ())
+
+    def test_logic_replaced(self):
+        index = self.block.connection_index()
+        mul_net = index.sinks(self.s)[0]
+        self.block.logic = self.block.logic - {mul_net}
+        self.assertEqual(index.sinks(self.s), ())
+        self.assertEqual(index.driver(self.s).op, 'w')
+        self.block.logic = set()
+        self.assertIsNone(index.driver(self.s))
+
+    def test_multiple_drivers(self):
+        index = self.block.connection_index()
+        net = pyrtl.LogicNet('w', None, (self.a,), (self.s,))
+        self.block.logic.add(net)
+        with self.assertRaises(pyrtl.PyrtlError):
+            index.driver(self.s)
+        self.block.logic.discard(net)
+        self.assertEqual(index.driver(self.s).args, (index.sinks(self.a)[0].dests[0],))
+
+
+class TestSubsetViews(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.block = pyrtl.working_block()
+        self.a = pyrtl.Input(4, 'a')
+        self.r = pyrtl.Register(4, 'r')
+        self.r.next <<= self.a + 1
+        self.o = pyrtl.Output(4, 'o')
+        self.o <<= self.r
+
+    def check_matches(self):
+        for cls, exclude in ((None, ()), (pyrtl.Input, ()), ((pyrtl.Input, pyrtl.Const), ()),
+                             (pyrtl.WireVector, pyrtl.Const), (None, (pyrtl.Input, pyrtl.Output))):
+            subset = self.block.wirevector_subset(cls, exclude)
+            self.assertEqual(subset, set(w for w in self.block.wirevector_set
+                                         if isinstance(w, cls or object)
+                                         and not isinstance(w, exclude)))
+            self.assertEqual(set(self.block.wirevector_view(cls, exclude)), subset)
+        for op in ('r', 'w+', 'm@', 'x'):
+            subset = self.block.logic_subset(op)
+            self.assertEqual(subset, set(n for n in self.block.logic if n.op in op))
+            self.assertEqual(set(self.block.logic_view(op)), subset)
+
+    def test_subsets_match_scans(self):
+        self.check_matches()
+
+    def test_subsets_follow_changes(self):
+        b = pyrtl.Input(1, 'b')
+        p = pyrtl.Output(4, 'p')
+        p <<= pyrtl.select(b, self.a, self.r)
+        self.check_matches()
+        self.block.logic = set(n for n in self.block.logic if n.op != 'x')
+        self.check_matches()
+        self.block.remove_wirevector(b)
+        self.block.wirevector_set -= {p}
+        self.check_matches()
+        self.block.wirevector_set = set(self.block.wirevector_set)
+        self.check_matches()
+
+    def test_views_are_live(self):
+        inputs = self.block.wirevector_view(pyrtl.Input)
+        regs = self.block.logic_view('r')
+        self.assertEqual(len(inputs), 1)
+        self.assertIn(self.a, inputs)
+        self.assertNotIn(self.r, inputs)
+        b = pyrtl.Input(1, 'b')
+        self.assertEqual(inputs, {self.a, b})
+        self.assertEqual(inputs - {b}, {self.a})
+        self.assertEqual(len(regs), 1)
+        self.block.logic.difference_update(set(regs))
+        self.assertEqual(len(regs), 0)
+
+    def test_subsets_are_new_sets(self):
+        inputs = self.block.wirevector_subset(pyrtl.Input)
+        inputs.clear()
+        self.assertEqual(len(self.block.wirevector_subset(pyrtl.Input)), 1)
+
+
+class TestHashNets(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.block = pyrtl.working_block()
+        self.block.hash_nets = True
+        self.a, self.b = pyrtl.input_list('a/4 b/4')
+
+    def test_off_by_default(self):
+        pyrtl.reset_working_block()
+        a, b = pyrtl.input_list('a/4 b/4')
+        self.assertFalse(pyrtl.working_block().hash_nets)
+        self.assertIsNot(a & b, a & b)
+
+    def test_reuses_identical_nets(self):
+        a, b = self.a, self.b
+        self.assertIs(a & b, a & b)
+        self.assertIs(a + b, b + a)
+        self.assertIsNot(a - b, b - a)
+        self.assertIs(~a, ~a)
+        self.assertIs(a[1:3], a[1:3])
+        self.assertIsNot(a[1:3], a[0:2])
+        self.assertIs(pyrtl.concat(a, b), pyrtl.concat(a, b))
+        self.assertIsNot(pyrtl.concat(a, b), pyrtl.concat(b, a))
+        sel = a[0]
+        self.assertIs(pyrtl.select(sel, a, b), pyrtl.select(sel, a, b))
+        self.assertIs(a.zero_extended(8), a.zero_extended(8))
+        self.assertEqual(len(self.block.logic_subset('&')), 1)
+
+    def test_consts_compared_by_value(self):
+        self.assertIs(self.a == 3, self.a == 3)
+        self.assertIs(self.a + 1, 1 + self.a)
+        self.assertIsNot(self.a + 1, self.a + 2)
+
+    def test_simulates_the_same(self):
+        o = pyrtl.Output(6, 'o')
+        o <<= (self.a * self.b)[:4] + (self.b * self.a)[:4] + (self.a & self.b)
+        self.assertEqual(len(self.block.logic_subset('*')), 1)
+        sim = pyrtl.Simulation()
+        sim.step({'a': 7, 'b': 5})
+        self.assertEqual(sim.inspect('o'), (35 % 16) * 2 + 5)
+
+    def test_removed_net_not_reused(self):
+        x = self.a ^ self.b
+        (net,) = self.block.logic_subset('^')
+        self.block.logic.remove(net)
+        y = self.a ^ self.b
+        self.assertIsNot(x, y)
+        self.assertIs(y, self.a ^ self.b)
+        self.block.logic = set(self.block.logic)
+        self.assertIsNot(self.a ^ self.b, y)
+
+    def test_turn_off(self):
+        x = self.a | self.b
+        self.block.hash_nets = False
+        self.assertIsNot(self.a | self.b, x)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,200 @@
+import asyncio
+import shutil
+import unittest
+
+import pyrtl
+
+
+sims = [pyrtl.Simulation, pyrtl.FastSimulation]
+if shutil.which('gcc') is not None:
+    sims.append(pyrtl.CompiledSimulation)
+
+
+class TestCoSimulation(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        en = pyrtl.Input(1, 'en')
+        req = pyrtl.Input(4, 'req')
+        count = pyrtl.Register(16, 'count')
+        ack_reg = pyrtl.Register(4, 'ack_reg')
+        count.next <<= pyrtl.select(en, count + 1, count)
+        ack_reg.next <<= req
+        out = pyrtl.Output(16, 'out')
+        ack = pyrtl.Output(4, 'ack')
+        out <<= count
+        ack <<= ack_reg
+
+    def test_cycles_run_in_one_batch(self):
+        for sim in sims:
+            with self.subTest(sim=sim):
+                cosim = pyrtl.CoSimulation(sim())
+                en, out = cosim.input('en'), cosim.output('out')
+
+                async def driver():
+                    en.value = 1
+                    await cosim.clock.cycles(1000)
+                    return out.value
+
+                self.assertEqual(cosim.run(driver()), 1000)
+                self.assertEqual(cosim.batches, 1)
+                self.assertEqual(cosim.output('out').value, 999)
+
+    def test_waiters_batch_up_to_earliest(self):
+        for sim in sims:
+            with self.subTest(sim=sim):
+                cosim = pyrtl.CoSimulation(sim())
+                seen = []
+
+                async def waiter(n):
+                    await cosim.clock.cycles(n)
+                    seen.append((n, cosim.clock.cycle))
+
+                cosim.run(waiter(300), waiter(100), waiter(700))
+                self.assertEqual(seen, [(100, 100), (300, 300), (700, 700)])
+                self.assertEqual(cosim.batches, 3)
+
+    def test_driver_and_monitor(self):
+        for sim in sims:
+            with self.subTest(sim=sim):
+                cosim = pyrtl.CoSimulation(sim())
+                req, ack = cosim.input('req'), cosim.output('ack')
+                seen = []
+
+                async def driver():
+                    for v in range(1, 6):
+                        await req.drive(v)
+
+                async def monitor():
+                    while True:
+                        seen.append(await ack.next())
+
+                async def test():
+                    cosim.start(monitor())
+                    await driver()
+                    await cosim.clock.rising()
+
+                self.assertEqual(cosim.run(test()), 6)
+                self.assertEqual(seen, [0, 1, 2, 3, 4, 5])
+
+    def test_wait_for(self):
+        for sim in sims:
+            with self.subTest(sim=sim):
+                cosim = pyrtl.CoSimulation(sim())
+                req, ack = cosim.input('req'), cosim.output('ack')
+
+                async def master():
+                    await cosim.clock.cycles(10)
+                    req.value = 7
+                    self.assertEqual(await ack.wait_for(lambda v: v > 5), 7)
+                    return cosim.clock.cycle
+
+                self.assertEqual(cosim.run(master()), 12)
+
+    def test_wait_for_timeout(self):
+        cosim = pyrtl.CoSimulation(pyrtl.Simulation())
+        ack = cosim.output('ack')
+
+        async def master():
+            await ack.wait_for(3, timeout=5)
+
+        with self.assertRaises(pyrtl.PyrtlError):
+            cosim.run(master())
+        self.assertEqual(cosim.clock.cycle, 5)
+
+    def test_coroutines_communicating(self):
+        for sim in sims:
+            with self.subTest(sim=sim):
+                cosim = pyrtl.CoSimulation(sim())
+                req, ack = cosim.input('req'), cosim.output('ack')
+                acks = []
+
+                async def producer(queue):
+                    for v in (3, 5, 9):
+                        await cosim.clock.cycles(4)
+                        await queue.put(v)
+                    await queue.put(None)
+
+                async def consumer(queue):
+                    while True:
+                        v = await queue.get()
+                        if v is None:
+                            return
+                        req.value = v
+                        await cosim.clock.rising()  # ack is registered
+                        acks.append(await ack.next())
+
+                async def test():
+                    # created here so that it binds to the loop run() uses
+                    queue = asyncio.Queue()
+                    consumed = cosim.start(consumer(queue))
+                    await producer(queue)
+                    await consumed
+
+                cosim.run(test())
+                self.assertEqual(acks, [3, 5, 9])
+
+    def test_previous_event_loop_restored(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            cosim = pyrtl.CoSimulation(pyrtl.Simulation())
+
+            async def check():
+                self.assertIsNot(asyncio.get_event_loop(), loop)
+                await cosim.clock.rising()
+
+            cosim.run(check())
+            self.assertIs(asyncio.get_event_loop(), loop)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def test_blocked_off_clock_does_not_poll(self):
+        cosim = pyrtl.CoSimulation(pyrtl.FastSimulation())
+        settles = []
+        settle = cosim._settle
+
+        async def counting_settle(tasks):
+            settles.append(cosim.clock.cycle)
+            await settle(tasks)
+
+        cosim._settle = counting_settle
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            await cosim.clock.cycles(3)
+
+        self.assertEqual(cosim.run(slow()), 3)
+        self.assertLess(len(settles), 5)
+
+    def test_max_cycles(self):
+        cosim = pyrtl.CoSimulation(pyrtl.FastSimulation())
+
+        async def forever():
+            while True:
+                await cosim.clock.cycles(7)
+
+        self.assertEqual(cosim.run(forever(), max_cycles=100), 100)
+
+    def test_exception_propagates(self):
+        cosim = pyrtl.CoSimulation(pyrtl.Simulation())
+
+        async def bad():
+            await cosim.clock.rising()
+            raise ValueError('oops')
+
+        with self.assertRaises(ValueError):
+            cosim.run(bad())
+
+    def test_bad_input(self):
+        cosim = pyrtl.CoSimulation(pyrtl.Simulation())
+        with self.assertRaises(pyrtl.PyrtlError):
+            cosim.input('out')
+        with self.assertRaises(pyrtl.PyrtlError):
+            cosim.input('req').value = 16
+        with self.assertRaises(pyrtl.PyrtlError):
+            cosim.start(None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,272 @@
+import io
+import shutil
+import unittest
+
+import pyrtl
+
+
+def _mac_module():
+    lane = pyrtl.Module('lane')
+    with lane:
+        a, b = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b')
+        acc = pyrtl.Register(8, 'acc')
+        acc.next <<= (acc + a * b)[:8]
+        out = pyrtl.Output(8, 'out')
+        out <<= acc
+    return lane
+
+
+def _flat_mac(a, b):
+    acc = pyrtl.Register(8)
+    acc.next <<= (acc + a * b)[:8]
+    return acc
+
+
+class TestModule(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.lane = _mac_module()
+        self.x, self.y = pyrtl.Input(4, 'x'), pyrtl.Input(4, 'y')
+
+    def test_ports(self):
+        self.assertEqual(set(self.lane.inputs), {'a', 'b'})
+        self.assertEqual(set(self.lane.outputs), {'out'})
+        self.assertIs(pyrtl.working_block().get_wirevector_by_name('x'), self.x)
+
+    def test_instances_share_definition(self):
+        block = pyrtl.working_block()
+        nets_before = len(block.logic)
+        outs = [self.lane.instantiate({'a': self.x, 'b': self.y})['out'] for _ in range(16)]
+        self.assertEqual(len(block.logic), nets_before)
+        self.assertEqual(len(block.instances), 16)
+        self.assertEqual(len({o.name for o in outs}), 16)
+        block.sanity_check()
+        block.sanity_check(full=True)
+
+    def test_simulation_matches_flat(self):
+        out = pyrtl.Output(8, 'o')
+        lane_out = self.lane.instantiate({'a': self.x, 'b': self.y}, name='l0')['out']
+        lane_out2 = self.lane.instantiate({'a': self.y, 'b': 3}, name='l1')['out']
+        out <<= lane_out + lane_out2
+        sim = pyrtl.Simulation()
+        inputs = {'x': [1, 2, 3, 4, 5], 'y': [3, 0, 7, 1, 15]}
+        sim.step_multiple(inputs)
+        # the simulation runs on a flattened copy, and the block keeps its hierarchy
+        block = pyrtl.working_block()
+        self.assertEqual(sorted(block.instances), ['l0', 'l1'])
+        self.assertNotIn('l0.acc', block.wirevector_by_name)
+        self.assertIn('l0.acc', sim.block.wirevector_by_name)
+        self.assertIsNot(sim.block, block)
+        f = io.StringIO()
+        pyrtl.output_to_verilog(f)
+        self.assertEqual(f.getvalue().count('module lane('), 1)
+
+        pyrtl.reset_working_block()
+        x, y = pyrtl.Input(4, 'x'), pyrtl.Input(4, 'y')
+        out = pyrtl.Output(8, 'o')
+        out <<= _flat_mac(x, y) + _flat_mac(y, pyrtl.Const(3))
+        expected = pyrtl.Simulation()
+        expected.step_multiple(inputs)
+        self.assertEqual(sim.tracer.trace['o'], expected.tracer.trace['o'])
+
+    def test_simulation_initial_values(self):
+        r = pyrtl.Register(8, 'r')
+        r.next <<= r + self.lane.instantiate({'a': self.x, 'b': self.y})['out']
+        mem = pyrtl.MemBlock(8, 2, name='mem')
+        out = pyrtl.Output(8, 'o')
+        out <<= r + mem[self.x[:2]]
+        sims = [pyrtl.Simulation, pyrtl.FastSimulation]
+        if shutil.which('gcc') is not None:
+            sims.append(pyrtl.CompiledSimulation)
+        for sim_class in sims:
+            with self.subTest(sim=sim_class):
+                sim = sim_class(register_value_map={r: 10}, memory_value_map={mem: {1: 5}})
+                sim.step_multiple({'x': [1, 1, 2], 'y': [2, 2, 0]})
+                self.assertEqual(sim.tracer.trace['o'], [15, 15, 12])
+        self.assertIn(r, pyrtl.working_block().wirevector_set)
+        self.assertTrue(pyrtl.working_block().instances)
+
+    def test_narrow_input_is_extended(self):
+        out = pyrtl.Output(8, 'o')
+        out <<= self.lane.instantiate({'a': self.x[:2], 'b': 1})['out']
+        sim = pyrtl.Simulation()
+        sim.step_multiple({'x': [3, 3, 3], 'y': [0, 0, 0]})
+        self.assertEqual(sim.tracer.trace['o'], [0, 3, 6])
+
+    def test_bad_inputs(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.lane.instantiate({'a': self.x})
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.lane.instantiate({'a': self.x, 'b': self.y, 'c': self.y})
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.lane.instantiate({'a': self.x, 'b': pyrtl.Input(5, 'wide')})
+        self.lane.instantiate({'a': self.x, 'b': self.y}, name='dup')
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.lane.instantiate({'a': self.x, 'b': self.y}, name='dup')
+
+    def test_module_changed_after_instantiation(self):
+        o = pyrtl.Output(8, 'o')
+        o <<= self.lane.instantiate({'a': self.x, 'b': self.y}, name='l0')['out']
+        pyrtl.working_block().sanity_check()
+        with self.lane:
+            pyrtl.Input(4, 'c')
+        msg = r'instance "l0" .* module "lane" .* unconnected inputs \[\'c\'\]'
+        for check in (pyrtl.working_block().sanity_check,
+                      lambda: pyrtl.working_block().sanity_check(full=True),
+                      pyrtl.Simulation, pyrtl.FastSimulation,
+                      lambda: pyrtl.output_to_verilog(io.StringIO()),
+                      pyrtl.flatten):
+            with self.assertRaisesRegex(pyrtl.PyrtlError, msg):
+                check()
+
+    def test_no_recursion(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            with self.lane:
+                self.lane.instantiate({'a': 1, 'b': 2})
+        outer = pyrtl.Module('outer')
+        with outer:
+            self.lane.instantiate({'a': pyrtl.Input(4, 'p'), 'b': 1})
+        with self.assertRaises(pyrtl.PyrtlError):
+            with self.lane:
+                outer.instantiate({'p': 1})
+
+    def test_undriven_output_port_use(self):
+        block = pyrtl.working_block()
+        outs = self.lane.instantiate({'a': self.x, 'b': self.y})
+        w = pyrtl.WireVector(8)
+        w <<= outs['out']
+        o = pyrtl.Output(8, 'o')
+        o <<= w
+        block.sanity_check()
+        # a net driving an instance output as well is an error
+        outs['out'] <<= self.x
+        with self.assertRaises(pyrtl.PyrtlError):
+            block.sanity_check()
+
+    def test_flattened_consts(self):
+        inc = pyrtl.Module('inc')
+        with inc:
+            a = pyrtl.Input(4, 'a')
+            ten = pyrtl.Const(10, 4, name='ten')
+            out = pyrtl.Output(5, 'out')
+            out <<= a + pyrtl.Const(3, 4) + ten
+        for intern in (False, True):
+            with self.subTest(intern_consts=intern):
+                block = pyrtl.Block()
+                block.intern_consts = intern
+                with pyrtl.set_working_block(block):
+                    x = pyrtl.Input(4, 'x')
+                    three = pyrtl.Const(3, 4)
+                    o = pyrtl.Output(5, 'o')
+                    o <<= (inc.instantiate({'a': x})['out']
+                           + inc.instantiate({'a': x})['out'])[:5]
+                pyrtl.flatten(block)
+                block.sanity_check()
+                consts = block.wirevector_subset(pyrtl.Const)
+                self.assertFalse([c.name for c in consts if c.name.startswith('tmp')])
+                self.assertEqual(len([c for c in consts if c.name.endswith('.ten')]), 2)
+                threes = [c for c in consts if c.val == 3 and c.bitwidth == 4]
+                self.assertTrue(all(c.name.startswith('const_') for c in threes))
+                self.assertEqual(threes == [three], intern)
+
+    def test_nested(self):
+        pair = pyrtl.Module('pair')
+        with pair:
+            a = pyrtl.Input(4, 'a')
+            first = self.lane.instantiate({'a': a, 'b': 1})['out']
+            second = self.lane.instantiate({'a': a, 'b': 2})['out']
+            s = pyrtl.Output(8, 's')
+            s <<= (first + second)[:8]
+        o = pyrtl.Output(8, 'o')
+        o <<= pair.instantiate({'a': self.x}, name='p')['s']
+        block = pyrtl.flatten()
+        self.assertFalse(block.instances)
+        self.assertEqual(len(block.logic_subset('r')), 2)
+        self.assertIn('p.lane_0.acc', block.wirevector_by_name)
+        sim = pyrtl.Simulation()
+        sim.step_multiple({'x': [1, 1, 1], 'y': [0, 0, 0]})
+        self.assertEqual(sim.tracer.trace['o'], [0, 3, 6])
+
+    def test_memory_per_instance(self):
+        store = pyrtl.Module('store')
+        with store:
+            addr, data = pyrtl.Input(2, 'addr'), pyrtl.Input(4, 'data')
+            mem = pyrtl.MemBlock(4, 2, name='mem', asynchronous=True)
+            mem[addr] <<= data
+            rd = pyrtl.Output(4, 'rd')
+            rd <<= mem[addr]
+        o1, o2 = pyrtl.Output(4, 'o1'), pyrtl.Output(4, 'o2')
+        o1 <<= store.instantiate({'addr': 0, 'data': self.x}, name='s1')['rd']
+        o2 <<= store.instantiate({'addr': 0, 'data': self.y}, name='s2')['rd']
+        sim = pyrtl.Simulation()
+        sim.step_multiple({'x': [1, 2, 3], 'y': [5, 6, 7]})
+        self.assertEqual(sim.tracer.trace['o1'], [0, 1, 2])
+        self.assertEqual(sim.tracer.trace['o2'], [0, 5, 6])
+        mems = sim.block.memblock_by_name
+        self.assertIn('s1.mem', mems)
+        self.assertIsNot(mems['s1.mem'], mems['s2.mem'])
+        self.assertNotEqual(mems['s1.mem'].id, mems['s2.mem'].id)
+
+    def test_assertion_in_module(self):
+        checked = pyrtl.Module('checked')
+        with checked:
+            a = pyrtl.Input(4, 'a')
+            pyrtl.rtl_assert(a != 7, ValueError('seven'))
+            out = pyrtl.Output(4, 'out')
+            out <<= a
+        self.assertEqual(set(checked.outputs), {'out'})
+        o = pyrtl.Output(4, 'o')
+        o <<= checked.instantiate({'a': self.x})['out']
+        synth = pyrtl.synthesize(update_working_block=False)
+        self.assertFalse(synth.instances)
+        sim = pyrtl.Simulation()
+        sim.step({'x': 1, 'y': 0})
+        with self.assertRaises(ValueError):
+            sim.step({'x': 7, 'y': 0})
+
+    def test_synthesize_and_optimize(self):
+        o = pyrtl.Output(8, 'o')
+        o <<= self.lane.instantiate({'a': self.x, 'b': self.y})['out']
+        block = pyrtl.working_block()
+        synth = pyrtl.synthesize(update_working_block=False)
+        self.assertEqual(len(block.instances), 1)  # the original is left alone
+        self.assertFalse(synth.instances)
+        sim = pyrtl.Simulation(block=synth)
+        sim.step_multiple({'x': [1, 2, 3], 'y': [2, 2, 2]})
+        self.assertEqual(sim.tracer.trace['o'], [0, 2, 6])
+        pyrtl.optimize()
+        self.assertFalse(block.instances)
+
+    def test_copy_block(self):
+        self.lane.instantiate({'a': self.x, 'b': self.y}, name='l0')
+        new_block = pyrtl.copy_block(update_working_block=False)
+        (instance,) = new_block.instances.values()
+        self.assertEqual(instance.name, 'l0')
+        self.assertIs(instance.module, self.lane)
+        self.assertIs(instance.inputs['a'], new_block.get_wirevector_by_name('x'))
+        self.assertIn(instance.outputs['out'], new_block.wirevector_set)
+        new_block.sanity_check()
+
+    def test_compact_netlist_needs_flat_block(self):
+        self.lane.instantiate({'a': self.x, 'b': self.y})
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.CompactNetlist()
+
+    def test_verilog(self):
+        o = pyrtl.Output(8, 'o')
+        outs = [self.lane.instantiate({'a': self.x, 'b': self.y})['out'] for _ in range(3)]
+        o <<= outs[0] + outs[1] + outs[2]
+        f = io.StringIO()
+        pyrtl.output_to_verilog(f)
+        verilog = f.getvalue()
+        self.assertEqual(verilog.count('module lane(clk, rst, a, b, out);'), 1)
+        self.assertEqual(verilog.count('module toplevel(clk, rst, x, y, o);'), 1)
+        self.assertLess(verilog.index('module lane'), verilog.index('module toplevel'))
+        self.assertEqual(verilog.count('    lane lane_'), 3)
+        self.assertIn('(.clk(clk), .rst(rst), .a(x), .b(y), .out(', verilog)
+        self.assertEqual(verilog.count('acc <= '), 2)  # reset and update, once
+        self.assertTrue(pyrtl.working_block().instances)  # not flattened
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+
+import pyrtl
+
+
+def _net_signature(block):
+    def names(wires):
+        return tuple(w.name for w in wires)
+
+    def param(net):
+        return net.op_param[1].name if net.op in 'm@' else net.op_param
+
+    return sorted((net.op, repr(param(net)), names(net.args), names(net.dests))
+                  for net in block.logic)
+
+
+def _wire_signature(block):
+    return sorted((type(w).__name__, w.name, w.bitwidth, getattr(w, 'val', None),
+                   getattr(w, 'reset_value', None)) for w in block.wirevector_set)
+
+
+class TestCompactNetlist(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a, b = pyrtl.input_list('a/4 b/4')
+        r = pyrtl.Register(4, 'r', reset_value=5)
+        m = pyrtl.MemBlock(4, 2, name='m')
+        r.next <<= a + b
+        m[a[:2]] <<= b
+        o = pyrtl.Output(4, 'o')
+        o <<= (r ^ m[b[:2]]) & 3
+
+    def test_round_trip(self):
+        block = pyrtl.working_block()
+        netlist = pyrtl.CompactNetlist()
+        self.assertEqual(netlist.num_wires, len(block.wirevector_set))
+        self.assertEqual(netlist.num_nets, len(block.logic))
+        new_block = netlist.to_block()
+        new_block.sanity_check()
+        self.assertIsNot(new_block, block)
+        self.assertIs(pyrtl.working_block(), block)
+        self.assertEqual(_wire_signature(new_block), _wire_signature(block))
+        self.assertEqual(_net_signature(new_block), _net_signature(block))
+        self.assertEqual(new_block.get_wirevector_by_name('r').reg_in.bitwidth, 4)
+
+    def test_round_trip_post_synthesis(self):
+        block = pyrtl.synthesize()
+        new_block = pyrtl.CompactNetlist(block).to_block()
+        self.assertIsInstance(new_block, pyrtl.PostSynthBlock)
+        self.assertEqual(_net_signature(new_block), _net_signature(block))
+        self.assertEqual(set(new_block.io_map), set(block.io_map))
+        for old, new_wires in new_block.io_map.items():
+            self.assertEqual([w.name for w in new_wires], [w.name for w in block.io_map[old]])
+            self.assertTrue(all(w in new_block.wirevector_set for w in new_wires))
+        self.assertEqual(set(new_block.reg_map), set(block.reg_map))
+        (new_mem,) = new_block.mem_map.values()
+        self.assertIn(new_mem, {net.op_param[1] for net in new_block.logic_subset('m@')})
+
+    def test_adjacency(self):
+        block = pyrtl.working_block()
+        netlist = pyrtl.CompactNetlist()
+        index = block.connection_index()
+        for w in block.wirevector_set:
+            i = netlist.wire_id(w.name)
+            self.assertEqual(netlist.names[i], w.name)
+            self.assertEqual(netlist.bitwidths[i], w.bitwidth)
+            driver = index.driver(w)
+            if driver is None:
+                self.assertEqual(netlist.drivers[i], netlist.NO_ID)
+            else:
+                d = netlist.drivers[i]
+                self.assertEqual(netlist.op(d), driver.op)
+                self.assertEqual(netlist.dests[d], i)
+                self.assertEqual([netlist.names[a] for a in netlist.net_args(d)],
+                                 [a.name for a in driver.args])
+            self.assertEqual(len(netlist.wire_sinks(i)), index.fanout(w))
+            self.assertEqual(netlist.is_source(i),
+                             isinstance(w, (pyrtl.Input, pyrtl.Const, pyrtl.Register)))
+
+    def test_unknown_name(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.CompactNetlist().wire_id('nope')
+
+    def test_topological_order(self):
+        netlist = pyrtl.CompactNetlist()
+        order = list(netlist.topological_order())
+        self.assertEqual(sorted(order), list(range(netlist.num_nets)))
+        position = {n: i for i, n in enumerate(order)}
+        for n in range(netlist.num_nets):
+            for a in netlist.net_args(n):
+                d = netlist.drivers[a]
+                if d != netlist.NO_ID and netlist.op(d) != 'r':
+                    self.assertLess(position[d], position[n])
+
+    def test_loop(self):
+        pyrtl.reset_working_block()
+        w = pyrtl.WireVector(1, 'w')
+        x = pyrtl.WireVector(1, 'x')
+        w <<= ~x
+        x <<= ~w
+        with self.assertRaises(pyrtl.PyrtlError):
+            pyrtl.CompactNetlist().topological_order()
+
+    def test_timing_analysis(self):
+        pyrtl.synthesize()
+        block_timing = pyrtl.TimingAnalysis()
+        compact_timing = pyrtl.TimingAnalysis(pyrtl.CompactNetlist())
+        self.assertEqual(compact_timing.max_length(), block_timing.max_length())
+        self.assertEqual(compact_timing.timing_map,
+                         {w.name: t for w, t in block_timing.timing_map.items()})
+        with self.assertRaises(pyrtl.PyrtlError):
+            compact_timing.critical_path(print_cp=False)
+
+    def test_simulation(self):
+        pyrtl.synthesize()
+        pyrtl.optimize()
+        netlist = pyrtl.CompactNetlist()
+        inputs = {'a': [1, 2, 3, 15], 'b': [4, 5, 6, 9]}
+        for sim_class in (pyrtl.Simulation, pyrtl.FastSimulation, pyrtl.CompiledSimulation):
+            expected = sim_class()
+            expected.step_multiple(inputs)
+            sim = sim_class(block=netlist)
+            sim.step_multiple(inputs)
+            self.assertEqual(sim.tracer.trace['o'], expected.tracer.trace['o'])
+
+    def test_optimize(self):
+        pyrtl.synthesize()
+        netlist = pyrtl.CompactNetlist()
+        before = netlist.num_nets
+        optimized = pyrtl.optimize(block=netlist, update_working_block=False)
+        self.assertEqual(netlist.num_nets, before)
+        self.assertLess(optimized.num_nets, before)
+        self.assertIs(pyrtl.optimize(block=netlist), netlist)
+        self.assertEqual(netlist.num_nets, optimized.num_nets)
+        self.assertEqual(sorted(netlist.ops), sorted(optimized.ops))
+
+    def test_footprint(self):
+        pyrtl.synthesize()
+        block_footprint = pyrtl.netlist_footprint()
+        compact_footprint = pyrtl.netlist_footprint(pyrtl.CompactNetlist())
+        self.assertEqual(compact_footprint.wires, block_footprint.wires)
+        self.assertEqual(compact_footprint.nets, block_footprint.nets)
+        self.assertLess(compact_footprint.net_bytes * 5, block_footprint.net_bytes)
+        self.assertLess(compact_footprint.total_bytes * 3, block_footprint.total_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -316,6 +316,51 @@ class TestOptimization(NetWireNumTestCases):
         self.num_net_of_type('s', 1, block)
         self.num_net_of_type('w', 2, block)
 
+    def test_unobserved_registers_removed(self):
+        inwire = pyrtl.Input(bitwidth=4)
+        outwire = pyrtl.Output()
+        outwire <<= inwire + 1
+        # a loop of registers, and a deep pipeline, that nothing reads
+        r1, r2 = pyrtl.Register(4), pyrtl.Register(4)
+        r1.next <<= r2 + inwire
+        r2.next <<= r1
+        stage = inwire
+        for _ in range(500):
+            r = pyrtl.Register(4)
+            r.next <<= stage ^ 1
+            stage = r
+        pyrtl.optimize()
+        block = pyrtl.working_block()
+        self.num_net_of_type('r', 0, block)
+        self.num_net_of_type('^', 0, block)
+        self.assertFalse(block.wirevector_subset(pyrtl.Register))
+
+    def test_memory_writes_kept(self):
+        addr = pyrtl.Input(bitwidth=2)
+        mem = pyrtl.MemBlock(4, 2)
+        mem[addr] <<= addr + 1
+        pyrtl.optimize()
+        block = pyrtl.working_block()
+        self.num_net_of_type('@', 1, block)
+        self.num_net_of_type('+', 1, block)
+
+    def test_keep_assertions(self):
+        inwire = pyrtl.Input(bitwidth=4, name='in')
+        outwire = pyrtl.Output(name='out')
+        outwire <<= inwire
+        pyrtl.rtl_assert(inwire + 1 != 0, ValueError('overflow'))
+        block = pyrtl.working_block()
+        pyrtl.optimize()
+        self.assertEqual(len(block.rtl_assert_dict), 1)
+        self.num_net_of_type('+', 1, block)
+
+        pyrtl.optimize(keep_assertions=False)
+        self.assertFalse(block.rtl_assert_dict)
+        self.num_net_of_type('+', 0, block)
+        self.assertEqual(block.wirevector_subset(pyrtl.Output), {outwire})
+        sim = pyrtl.Simulation()
+        sim.step({'in': 15})
+
 
 class TestConstFolding(NetWireNumTestCases):
     def setUp(self):
@@ -510,6 +555,82 @@ class TestConstFolding(NetWireNumTestCases):
         sim.step({})
         self.assertEqual(sim.inspect('out'), 0b0010)
 
+    def test_wide_ops(self):
+        a, b = pyrtl.Const(200, 8), pyrtl.Const(57, 8)
+        exprs = {'add': a + b, 'sub': b - a, 'mul': a * b, 'lt': a < b, 'gt': a > b,
+                 'eq': a == b, 'sel': pyrtl.select(a[0], a, b), 'cat': pyrtl.concat(a, b),
+                 'slice': a[2:7], 'and': a & b, 'nand': a.nand(b)}
+        for name, expr in exprs.items():
+            out = pyrtl.Output(len(expr), name)
+            out <<= expr
+        expected = pyrtl.Simulation()
+        expected.step({})
+
+        pyrtl.optimize()
+        block = pyrtl.working_block()
+        self.assertEqual({net.op for net in block.logic}, {'w'})
+        self.assert_num_net(len(exprs))
+        sim = pyrtl.Simulation()
+        sim.step({})
+        for name in exprs:
+            self.assertEqual(sim.inspect(name), expected.inspect(name))
+
+    def test_wide_identities(self):
+        a, sel = pyrtl.Input(8, 'a'), pyrtl.Input(1, 'sel')
+        outs = [pyrtl.Output(8, 'o%d' % i) for i in range(6)]
+        outs[0] <<= a & 0xff
+        outs[1] <<= a | 0
+        outs[2] <<= a ^ 0xff
+        outs[3] <<= a & 0
+        outs[4] <<= pyrtl.select(pyrtl.Const(1), a, ~a)
+        outs[5] <<= pyrtl.select(sel, a & 0x0f, a * 0)[:8]
+        pyrtl.optimize()
+        block = pyrtl.working_block()
+        self.num_net_of_type('&', 1)  # only a & 0x0f is left
+        self.num_net_of_type('*', 0)
+        self.num_net_of_type('~', 1)
+        for out in outs[:2] + outs[4:5]:
+            (driver,) = [net for net in block.logic if net.dests[0] is out]
+            self.assertEqual(driver.args, (a,))
+
+        sim = pyrtl.Simulation()
+        sim.step_multiple({'a': [0x5a, 0xff, 0x3c], 'sel': [0, 1, 1]})
+        trace = sim.tracer.trace
+        self.assertEqual(trace['o2'], [0xa5, 0x00, 0xc3])
+        self.assertEqual(trace['o3'], [0, 0, 0])
+        self.assertEqual(trace['o5'], [0, 0x0f, 0x0c])
+
+    def test_long_chain(self):
+        a = pyrtl.Input(16, 'a')
+        x = pyrtl.Const(3, 16)
+        for i in range(300):
+            x = ((x + i)[:16] & pyrtl.Const(0xfff0 + i % 7, 16)) ^ pyrtl.Const(i % 5, 16)
+        out = pyrtl.Output(16, 'out')
+        out <<= x ^ a
+        expected = pyrtl.Simulation()
+        expected.step({'a': 0x1234})
+
+        pyrtl.optimize()
+        self.num_net_of_type('^', 1)
+        self.assert_num_net(2)
+        sim = pyrtl.Simulation()
+        sim.step({'a': 0x1234})
+        self.assertEqual(sim.inspect('out'), expected.inspect('out'))
+
+    def test_memory_with_const_args(self):
+        mem = pyrtl.MemBlock(4, 2, asynchronous=True)
+        addr = pyrtl.Const(1) + pyrtl.Const(2)
+        mem[addr[:2]] <<= pyrtl.Const(9, 4) ^ pyrtl.Const(3, 4)
+        out = pyrtl.Output(4, 'out')
+        out <<= mem[addr[:2]]
+        pyrtl.optimize()
+        self.num_net_of_type('@', 1)
+        self.num_net_of_type('m', 1)
+        self.num_net_of_type('+', 0)
+        sim = pyrtl.Simulation()
+        sim.step_multiple(nsteps=2)
+        self.assertEqual(sim.tracer.trace['out'], [0, 10])
+
 
 class TestSubexpElimination(NetWireNumTestCases):
 
@@ -651,6 +772,43 @@ class TestSubexpElimination(NetWireNumTestCases):
         self.num_net_of_type('&', 1)
         pyrtl.working_block().sanity_check()
 
+    def test_deep_duplicate_cones(self):
+        a, b = pyrtl.Input(8, 'a'), pyrtl.Input(8, 'b')
+        cones = []
+        for _ in range(3):
+            x = a
+            for _ in range(50):
+                x = ((x ^ b) + a)[:8]
+            cones.append(x)
+        out = pyrtl.Output(8, 'out')
+        out <<= cones[0] | cones[1] | cones[2]
+        pyrtl.common_subexp_elimination()
+        self.num_net_of_type('^', 50)
+        self.num_net_of_type('+', 50)
+        self.num_net_of_type('|', 2)
+        pyrtl.working_block().sanity_check()
+
+        sim = pyrtl.Simulation()
+        sim.step({'a': 3, 'b': 5})
+        x = 3
+        for _ in range(50):
+            x = ((x ^ 5) + 3) & 0xff
+        self.assertEqual(sim.inspect('out'), x)
+
+    def test_through_registers_and_memories(self):
+        addr = pyrtl.Input(2)
+        mem = pyrtl.MemBlock(4, 2, asynchronous=True, max_read_ports=None)
+        r1, r2 = pyrtl.Register(4), pyrtl.Register(4)
+        r1.next <<= mem[addr] + r1
+        r2.next <<= mem[addr] + r1
+        out = pyrtl.Output(4)
+        out <<= r2 ^ (mem[addr] + r1)
+        pyrtl.common_subexp_elimination()
+        self.num_net_of_type('m', 1)
+        self.num_net_of_type('+', 1)
+        self.num_net_of_type('r', 2)  # registers are never merged
+        pyrtl.working_block().sanity_check()
+
 
 class TestSynthOptTiming(NetWireNumTestCases):
     def setUp(self):
@@ -787,6 +945,101 @@ class TestSynthOptTiming(NetWireNumTestCases):
         self.everything_t_procedure()
 
 
+class TestNarrowBitwidths(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.a, self.b = pyrtl.Input(16, 'a'), pyrtl.Input(16, 'b')
+        self.inputs = {'a': [0, 1, 255, 4000, 65535], 'b': [0, 7, 15, 300, 65535]}
+
+    def check_narrowing(self, outputs):
+        """ Narrow the working block, checking the outputs are the same before and after. """
+        sim = pyrtl.Simulation()
+        sim.step_multiple(self.inputs)
+        expected = {o: sim.tracer.trace[o] for o in outputs}
+        bits_removed = pyrtl.narrow_bitwidths()
+        pyrtl.working_block().sanity_check(full=True)
+        sim = pyrtl.Simulation()
+        sim.step_multiple(self.inputs)
+        for o in outputs:
+            self.assertEqual(sim.tracer.trace[o], expected[o])
+        self.assertEqual(pyrtl.narrow_bitwidths(), 0)
+        return bits_removed
+
+    def test_masked_product(self):
+        product = (self.a & 0xff) * (self.b & 0xf)
+        total = product + self.a[:4]
+        out = pyrtl.Output(40, 'out')
+        out <<= total
+        self.assertEqual(product.bitwidth, 32)
+        self.assertGreater(self.check_narrowing(['out']), 0)
+        self.assertEqual(product.bitwidth, 12)
+        self.assertEqual(total.bitwidth, 13)
+        self.assertEqual(out.bitwidth, 40)
+
+    def test_zero_extension_past_64_bits(self):
+        wide = self.a[:8].zero_extended(100) + self.b[:8].zero_extended(100)
+        out = pyrtl.Output(9, 'out')
+        out <<= wide
+        self.check_narrowing(['out'])
+        self.assertEqual(wide.bitwidth, 9)
+        self.assertLessEqual(max(w.bitwidth for w in pyrtl.working_block().wirevector_set
+                                 if not isinstance(w, Const)), 64)
+
+    def test_selects_and_comparisons(self):
+        low = pyrtl.concat(pyrtl.Const(0, 12), self.a[:4])
+        picked = pyrtl.select(self.b[0], low, self.b & 0x3f)
+        bit = (picked > 20) | (low == 3)
+        out, out_bit = pyrtl.Output(16, 'out'), pyrtl.Output(1, 'out_bit')
+        out <<= picked[2:]
+        out_bit <<= bit
+        self.check_narrowing(['out', 'out_bit'])
+        self.assertEqual(low.bitwidth, 6)  # as wide as the other choice of the select
+        self.assertEqual(picked.bitwidth, 6)
+
+    def test_needed_widths_kept(self):
+        masked = self.a & 0x3
+        inverted, difference = pyrtl.Output(8, 'inverted'), pyrtl.Output(16, 'difference')
+        inverted <<= ~masked[:8]
+        difference <<= masked - self.b
+        self.check_narrowing(['inverted', 'difference'])
+        self.assertEqual(masked.bitwidth, 16)  # as wide as the subtraction needs
+
+    def test_registers_and_memories_hold_any_value(self):
+        r = pyrtl.Register(16, 'r')
+        r.next <<= self.a & 0x7
+        mem = pyrtl.MemBlock(16, 2, asynchronous=True)
+        mem[self.b[:2]] <<= self.a & 0x7
+        from_reg, from_mem = r + 1, mem[self.b[:2]] + 1
+        out = pyrtl.Output(17, 'out')
+        out <<= from_reg | from_mem
+        self.check_narrowing(['out'])
+        self.assertEqual((r.bitwidth, from_reg.bitwidth, from_mem.bitwidth), (16, 17, 17))
+
+        sim = pyrtl.Simulation(register_value_map={r: 40000})
+        sim.step({'a': 0, 'b': 0})
+        self.assertEqual(sim.inspect('out'), 40001)
+
+    def test_random_designs(self):
+        import random
+        for seed in range(20):
+            rng = random.Random(seed)
+            pyrtl.reset_working_block()
+            wires = [pyrtl.Input(rng.randrange(1, 12), 'in%d' % i) for i in range(3)]
+            wires.append(pyrtl.Const(rng.randrange(20)))
+            ops = [operator.add, operator.mul, operator.and_, operator.or_, operator.xor,
+                   operator.sub, operator.lt, pyrtl.concat,
+                   lambda x, y: ~x, lambda x, y: x[:max(len(x) // 2, 1)],
+                   lambda x, y: pyrtl.select(x[0], x, y), lambda x, y: (x & 5) + 1]
+            for _ in range(30):
+                wires.append(rng.choice(ops)(rng.choice(wires), rng.choice(wires)))
+            for i in range(3):
+                out = pyrtl.Output(rng.randrange(1, 30), 'out%d' % i)
+                out <<= rng.choice(wires[4:])
+            self.inputs = {'in%d' % i: [rng.randrange(1 << len(wires[i])) for _ in range(10)]
+                           for i in range(3)}
+            self.check_narrowing(['out0', 'out1', 'out2'])
+
+
 class TestConcatAndSelectSimplification(unittest.TestCase):
     def setUp(self):
         pyrtl.reset_working_block()
@@ -0,0 +1,129 @@
+import functools
+import unittest
+
+import pyrtl
+from pyrtl.passmanager import PassStats
+
+
+class TestPassManager(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a, b = pyrtl.Input(4, 'a'), pyrtl.Input(4, 'b')
+        out = pyrtl.Output(5, 'out')
+        tmp = pyrtl.WireVector(5)
+        tmp <<= (a + b) + pyrtl.Const(0)
+        unused = a & b
+        out <<= tmp
+
+    def check_sum(self, block=None):
+        sim = pyrtl.Simulation(block=block)
+        sim.step_multiple({'a': [1, 7, 15], 'b': [2, 9, 15]})
+        self.assertEqual(sim.tracer.trace['out'], [3, 16, 30])
+
+    def test_optimization_passes(self):
+        pm = pyrtl.PassManager(pyrtl.optimization_passes())
+        block = pyrtl.working_block()
+        self.assertIs(pm.run(), block)
+        self.assertEqual([s.name for s in pm.stats],
+                         ['flatten', '_remove_wire_nets', '_remove_slice_nets',
+                          'constant_propagation', '_remove_unlistened_nets',
+                          'common_subexp_elimination'])
+        for before, after in zip(pm.stats, pm.stats[1:]):
+            self.assertEqual((before.nets_after, before.wires_after),
+                             (after.nets_before, after.wires_before))
+        self.assertEqual(pm.stats[-1].nets_after, len(block.logic))
+        self.assertLess(pm.stats[-1].nets_after, pm.stats[0].nets_before)
+        self.assertTrue(all(s.seconds >= 0 and s.peak_memory is None for s in pm.stats))
+        self.assertFalse(block.logic_subset('&'))
+        self.check_sum()
+
+        report = pm.report()
+        self.assertIn('constant_propagation', report)
+        self.assertEqual(len(report.splitlines()), len(pm.stats) + 2)
+
+    def test_same_as_optimize(self):
+        expected = pyrtl.optimize(update_working_block=False)
+        block = pyrtl.PassManager(pyrtl.optimization_passes()).run()
+        self.assertEqual(len(block.logic), len(expected.logic))
+        self.assertEqual(len(block.wirevector_set), len(expected.wirevector_set))
+
+    def test_new_blocks(self):
+        block = pyrtl.working_block()
+        pm = pyrtl.PassManager([pyrtl.synthesize, pyrtl.optimize, pyrtl.nand_synth])
+        synth = pm.run(update_working_block=False)
+        self.assertIsInstance(synth, pyrtl.PostSynthBlock)
+        self.assertIs(pyrtl.working_block(), block)
+        self.assertEqual(synth.logic_subset('&|^'), set())
+        self.check_sum(synth)
+
+        synth = pm.run()
+        self.assertIs(pyrtl.working_block(), synth)
+        self.check_sum()
+
+    def test_net_pass(self):
+        def remove_ands(net):
+            if net.op == '&':
+                return False
+            return True
+
+        pm = pyrtl.PassManager([pyrtl.net_pass(remove_ands), pyrtl.passes._remove_unused_wires],
+                               sanity_check=False)
+        pm.run()
+        pyrtl.working_block().sanity_check()
+        self.assertEqual([s.name for s in pm.stats], ['remove_ands', '_remove_unused_wires'])
+        self.assertEqual(pm.stats[0].nets_before - pm.stats[0].nets_after, 1)
+        self.check_sum()
+
+    def test_fixed_point(self):
+        a, b = (pyrtl.working_block().get_wirevector_by_name(n) for n in "ab")
+        for i in range(3):
+            a ^ b
+        calls = []
+
+        def remove_one_dead_net(block):
+            calls.append(len(block.logic))
+            index = block.connection_index()
+            for net in block.logic:
+                if not isinstance(net.dests[0], pyrtl.Output) and not index.sinks(net.dests[0]):
+                    block.logic.remove(net)
+                    pyrtl.passes._remove_unused_wires(block)
+                    return
+
+        pm = pyrtl.PassManager([pyrtl.FixedPoint([remove_one_dead_net])])
+        pm.run()
+        self.assertEqual(len(calls), 5)  # the '&' and the three '^', then no change
+        self.assertEqual(pm.stats[-1].nets_before, pm.stats[-1].nets_after)
+        self.assertFalse(pyrtl.working_block().logic_subset('&^'))
+        self.check_sum()
+
+        for i in range(3):
+            a ^ b
+        calls.clear()
+        pyrtl.PassManager([pyrtl.FixedPoint([remove_one_dead_net], max_iterations=2)]).run()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(pyrtl.working_block().logic_subset('^')), 1)
+
+    def test_sanity_check_names_pass(self):
+        def break_block(block):
+            block.add_wirevector(pyrtl.WireVector(3, 'dangling'))
+            pyrtl.Output(3, 'undriven', block=block)
+
+        pm = pyrtl.PassManager([pyrtl.common_subexp_elimination, break_block])
+        with self.assertRaisesRegex(pyrtl.PyrtlError, 'after pass "break_block"'):
+            pm.run()
+        self.assertEqual(len(pm.stats), 1)
+        pyrtl.PassManager([break_block], sanity_check=False).run()
+
+    def test_partial_and_memory(self):
+        pm = pyrtl.PassManager(
+            [functools.partial(pyrtl.common_subexp_elimination, abs_thresh=2)],
+            trace_memory=True)
+        pm.run()
+        (stats,) = pm.stats
+        self.assertIsInstance(stats, PassStats)
+        self.assertEqual(stats.name, 'common_subexp_elimination')
+        self.assertGreaterEqual(stats.peak_memory, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
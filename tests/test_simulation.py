@@ -1,5 +1,6 @@
 import enum
 import io
+import itertools
 import unittest
 
 import pyrtl
@@ -855,6 +856,246 @@ class SimStepMultipleBase(unittest.TestCase):
         self.assertEqual(output.getvalue(), correct_output)
 
 
+class SimStepMultipleStreamingBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        in1 = pyrtl.Input(4, "in1")
+        in2 = pyrtl.Input(4, "in2")
+        out1 = pyrtl.Output(4, "out1")
+        out1 <<= (in1 ^ in2) + pyrtl.Const(1)
+        out2 = pyrtl.Output(4, "out2")
+        out2 <<= in1 | in2
+        self.in1 = [0, 1, 3, 15, 14]
+        self.out1 = [7, 8, 6, 10, 9]
+        self.out2 = [6, 7, 7, 15, 14]
+        self.chunk_steps = pyrtl.simulation._STIMULUS_CHUNK_STEPS
+        pyrtl.simulation._STIMULUS_CHUNK_STEPS = 2  # exercise chunk boundaries
+
+    def tearDown(self):
+        pyrtl.simulation._STIMULUS_CHUNK_STEPS = self.chunk_steps
+
+    def check_trace(self, sim_trace, nsteps=5):
+        self.assertEqual(sim_trace.trace['out1'], self.out1[:nsteps])
+        self.assertEqual(sim_trace.trace['out2'], self.out2[:nsteps])
+
+    def test_generators_with_nsteps(self):
+        sim_trace = pyrtl.SimulationTrace()
+        sim = self.sim(tracer=sim_trace)
+        sim.step_multiple({'in1': (v for v in self.in1), 'in2': itertools.repeat(6)},
+                          {'out1': iter(self.out1)}, nsteps=5)
+        self.check_trace(sim_trace)
+
+    def test_generators_without_nsteps(self):
+        sim_trace = pyrtl.SimulationTrace()
+        sim = self.sim(tracer=sim_trace)
+        sim.step_multiple({'in1': iter(self.in1), 'in2': iter('66666')})
+        self.check_trace(sim_trace)
+
+    def test_generator_of_dicts(self):
+        sim_trace = pyrtl.SimulationTrace()
+        sim = self.sim(tracer=sim_trace)
+        output = io.StringIO()
+        sim.step_multiple(({'in1': v, 'in2': 6} for v in self.in1),
+                          ({'out1': v} for v in self.out1), file=output)
+        self.check_trace(sim_trace)
+        self.assertEqual(output.getvalue(), '')
+
+    def test_mismatches_across_chunks(self):
+        sim = self.sim()
+        output = io.StringIO()
+        sim.step_multiple({'in1': iter(self.in1), 'in2': itertools.repeat(6)},
+                          {'out1': [7, 0, 6, '?', 0]}, nsteps=5, file=output)
+        self.assertEqual(output.getvalue(),
+                         "Unexpected output on one or more steps:\n"
+                         " step       name expected   actual\n"
+                         "    1       out1        0        8\n"
+                         "    4       out1        0        9\n")
+
+    def test_stop_after_first_error_across_chunks(self):
+        sim_trace = pyrtl.SimulationTrace()
+        sim = self.sim(tracer=sim_trace)
+        output = io.StringIO()
+        sim.step_multiple({'in1': iter(self.in1), 'in2': itertools.repeat(6)},
+                          {'out1': [7, 8, 0, 10, 0]}, nsteps=5, file=output,
+                          stop_after_first_error=True)
+        self.assertEqual(output.getvalue(),
+                         "Unexpected output (stopped after step with first error):\n"
+                         " step       name expected   actual\n"
+                         "    2       out1        0        6\n")
+        self.check_trace(sim_trace, nsteps=3)
+
+    def test_uneven_generators(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError) as error:
+            sim.step_multiple({'in1': iter(self.in1), 'in2': iter('666')})
+        self.assertEqual(str(error.exception),
+                         "must supply a value for each provided wire "
+                         "for each step of simulation")
+
+    def test_generator_shorter_than_nsteps(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError) as error:
+            sim.step_multiple({'in1': iter(self.in1), 'in2': itertools.repeat(6)}, nsteps=6)
+        self.assertEqual(str(error.exception),
+                         "must supply a value for each provided wire "
+                         "for each step of simulation")
+
+    def test_expected_generator_too_short(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError) as error:
+            sim.step_multiple({'in1': iter(self.in1), 'in2': itertools.repeat(6)},
+                              {'out1': iter(self.out1[:3])}, nsteps=5)
+        self.assertEqual(str(error.exception),
+                         "any expected outputs must have a supplied value "
+                         "each step of simulation")
+
+    def test_empty_generator(self):
+        sim = self.sim()
+        with self.assertRaises(pyrtl.PyrtlError) as error:
+            sim.step_multiple({'in1': iter([]), 'in2': iter([])})
+        self.assertEqual(str(error.exception), "must simulate at least one step")
+
+
+class StepMultipleMismatchesBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(4, 'a')
+        wide = pyrtl.Input(100, 'wide')
+        o = pyrtl.Output(4, 'o')
+        w = pyrtl.Output(100, 'w')
+        o <<= a + 1
+        w <<= wide
+        self.inputs = {'a': [0, 1, 2, 3, 4, 5], 'wide': [0, 1, 2 << 70, 3, 4, 5]}
+
+    def test_no_mismatches(self):
+        sim = self.sim()
+        output = io.StringIO()
+        mismatches = sim.step_multiple(self.inputs, {'o': [1, 2, 3, 4, 5, 6]}, file=output)
+        self.assertFalse(mismatches)
+        self.assertEqual(len(mismatches), 0)
+        self.assertEqual(output.getvalue(), '')
+
+    def test_mismatch_rows(self):
+        sim = self.sim()
+        mismatches = sim.step_multiple(
+            self.inputs, {'o': [1, 0, '?', 4, '?', 0], 'w': [0, 1, 2, 3, 4, 5]}, file=None)
+        self.assertEqual(list(mismatches), [(1, 'o', 0, 2), (2, 'w', 2, 2 << 70), (5, 'o', 0, 6)])
+        self.assertEqual(mismatches[0].step, 1)
+        self.assertEqual(mismatches[0].name, 'o')
+        self.assertEqual(mismatches[0].expected, 0)
+        self.assertEqual(mismatches[0].actual, 2)
+        self.assertFalse(mismatches.truncated)
+
+    def test_high_limb_mismatch(self):
+        sim = self.sim()
+        mismatches = sim.step_multiple(
+            self.inputs, {'w': [0, 1, (2 << 70) | 1, 3, (1 << 99) | 4, 5]}, file=None)
+        self.assertEqual(list(mismatches), [(2, 'w', (2 << 70) | 1, 2 << 70),
+                                            (4, 'w', (1 << 99) | 4, 4)])
+
+    def test_unrepresentable_expected_values(self):
+        sim = self.sim()
+        mismatches = sim.step_multiple(
+            self.inputs, {'o': [-1, 2, 3, 4, 5, 6], 'w': [1 << 200, 1, 2 << 70, 3, 4, 5]},
+            file=None)
+        self.assertEqual(list(mismatches), [(0, 'o', -1, 1), (0, 'w', 1 << 200, 0)])
+
+    def test_max_mismatches(self):
+        sim = self.sim()
+        output = io.StringIO()
+        mismatches = sim.step_multiple(self.inputs, {'o': [0] * 6, 'w': [9] * 6},
+                                       file=output, max_mismatches=3)
+        self.assertTrue(mismatches.truncated)
+        self.assertEqual(list(mismatches), [(0, 'o', 0, 1), (0, 'w', 9, 0), (1, 'o', 0, 2)])
+        self.assertEqual(output.getvalue(),
+                         "Unexpected output on one or more steps:\n"
+                         " step       name expected   actual\n"
+                         "    0          o        0        1\n"
+                         "    0          w        9        0\n"
+                         "    1          o        0        2\n"
+                         "(stopped recording after the first 3 mismatches)\n")
+        self.assertEqual(sim.inspect('o'), 6)  # the simulation itself is not cut short
+
+    def test_max_mismatches_at_chunk_boundary(self):
+        expected = {'o': itertools.repeat(0)}
+        for cap, truncated in ((4095, True), (4096, True), (5000, True), (10000, False)):
+            with self.subTest(cap=cap):
+                sim = self.sim()
+                mismatches = sim.step_multiple(
+                    {'a': itertools.repeat(0), 'wide': itertools.repeat(0)}, expected,
+                    nsteps=10000, file=None, max_mismatches=cap)
+                self.assertEqual(len(mismatches), cap)
+                self.assertEqual(mismatches.truncated, truncated)
+                self.assertEqual(mismatches[-1], (cap - 1, 'o', 0, 1))
+
+    def test_render_csv(self):
+        sim = self.sim()
+        mismatches = sim.step_multiple(self.inputs, {'o': [1, 2, 3, 0, 5, 6]}, file=None)
+        output = io.StringIO()
+        mismatches.render_csv(output)
+        self.assertEqual(output.getvalue(), "step,name,expected,actual\n3,o,0,4\n")
+
+
+class ActivityCountersBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        r = pyrtl.Register(3, 'r')
+        r.next <<= r + 1
+        hit = pyrtl.WireVector(1, 'hit')
+        hit <<= r == 5
+        wide = pyrtl.Input(100, 'wide')
+        o = pyrtl.Output(100, 'o')
+        o <<= wide
+        self.inputs = {'wide': [(1 << 99) | 1, 0] * 5}
+
+    def test_counts(self):
+        sim = self.sim(activity_wires=['r', 'wide'], event_wires=['hit'])
+        sim.step_multiple(self.inputs)
+        counts = sim.counters()
+        self.assertEqual(counts.cycles, 10)
+        self.assertEqual(counts.toggles['r'], [9, 4, 2])
+        self.assertEqual(counts.high['r'], [5, 4, 4])
+        self.assertEqual(counts.toggles['wide'], [9] + [0] * 98 + [9])
+        self.assertEqual(counts.high['wide'], [5] + [0] * 98 + [5])
+        self.assertEqual(counts.events, {'hit': 1})
+        self.assertEqual(counts.toggle_coverage(['r']), 1.0)
+        self.assertEqual(counts.toggle_coverage(['wide']), 2 / 100)
+        self.assertEqual(counts.activity_factor('r'), 15 / 27)
+
+    def test_reset_counters(self):
+        sim = self.sim(activity_wires=['r'], event_wires=['hit'])
+        sim.step_multiple(self.inputs)
+        sim.reset_counters()
+        self.assertEqual(sim.counters().toggles['r'], [0, 0, 0])
+        sim.step_multiple({'wide': [0] * 4})
+        counts = sim.counters()
+        self.assertEqual(counts.cycles, 4)
+        self.assertEqual(counts.toggles['r'], [3, 1, 1])  # 2, 3, 4, 5
+        self.assertEqual(counts.high['r'], [2, 2, 2])
+        self.assertEqual(counts.events, {'hit': 1})
+
+    def test_no_counters(self):
+        sim = self.sim()
+        sim.step_multiple(self.inputs)
+        counts = sim.counters()
+        self.assertEqual(counts.cycles, 10)
+        self.assertEqual(counts.toggles, {})
+        self.assertEqual(counts.events, {})
+        self.assertEqual(counts.toggle_coverage(), 0.0)
+
+    def test_all_wires(self):
+        sim = self.sim(activity_wires=True)
+        sim.step_multiple(self.inputs)
+        counts = sim.counters()
+        self.assertIn('hit', counts.toggles)
+        self.assertEqual(counts.toggles['hit'], [2])
+        self.assertEqual(counts.toggles['o'], counts.toggles['wide'])
+
+    def test_unknown_wire(self):
+        with self.assertRaises(pyrtl.PyrtlError):
+            self.sim(activity_wires=['nope'])
+
+
 class TraceWithAdderBase(unittest.TestCase):
     def setUp(self):
         pyrtl.reset_working_block()
@@ -1379,6 +1620,79 @@ class TraceErrorBase(unittest.TestCase):
             self.sim_trace.print_trace(base=4)
 
 
+class MakeSimulationBase(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        a = pyrtl.Input(8, 'a')
+        self.r = pyrtl.Register(8, 'r')
+        self.t = pyrtl.WireVector(8, 't')
+        o = pyrtl.Output(8, 'o')
+        self.t <<= a + self.r
+        self.r.next <<= self.t
+        o <<= self.r
+
+    def test_short_run_is_interpreted(self):
+        sim = pyrtl.make_simulation(expected_cycles=1)
+        self.assertIsInstance(sim, pyrtl.Simulation)
+
+    def test_long_run(self):
+        sim = pyrtl.make_simulation(expected_cycles=10**9)
+        if pyrtl.simulation.shutil.which('gcc') is None:
+            self.assertIsInstance(sim, pyrtl.FastSimulation)
+        else:
+            self.assertIsInstance(sim, pyrtl.CompiledSimulation)
+        sim.step_multiple({'a': [1, 2, 3]})
+        self.assertEqual(sim.inspect('o'), 3)
+
+    def test_internal_inspect(self):
+        sim = pyrtl.make_simulation(expected_cycles=10**9, need_internal_inspect=True)
+        self.assertIsInstance(sim, pyrtl.FastSimulation)
+        sim.step_multiple({'a': [1, 2, 3]})
+        self.assertEqual(sim.inspect('t'), 6)
+
+    def test_kwargs_passed_to_backend(self):
+        sim = pyrtl.make_simulation(expected_cycles=1, register_value_map={self.r: 10})
+        sim.step({'a': 1})
+        self.assertEqual(sim.inspect('o'), 10)
+
+    def test_compact_netlist(self):
+        model = pyrtl.SimulationCostModel()
+        features = model.features()
+        netlist = pyrtl.CompactNetlist()
+        pyrtl.reset_working_block()
+        self.assertEqual(model.features(netlist), features)
+        sim = pyrtl.make_simulation(netlist, expected_cycles=10**9, need_internal_inspect=True)
+        sim.step_multiple({'a': [1, 2, 3]})
+        self.assertEqual(sim.inspect('t'), 6)
+        with self.assertLogs('pyrtl.simulation', 'INFO'):
+            results = model.benchmark(netlist, nsteps=10, backends=[self.sim.__name__])
+        self.assertEqual(len(results), 1)
+
+    def test_decision_is_logged(self):
+        with self.assertLogs('pyrtl.simulation', 'INFO') as logs:
+            pyrtl.make_simulation(expected_cycles=1)
+        self.assertTrue(any('chose Simulation' in line for line in logs.output))
+
+    def test_unavailable_backend_never_chosen(self):
+        model = pyrtl.SimulationCostModel()
+        features = model.features()
+        self.assertEqual(model.available_backends(features, need_internal_inspect=True),
+                         ['Simulation', 'FastSimulation'])
+
+    def test_benchmark_and_calibrate(self):
+        model = pyrtl.SimulationCostModel()
+        with self.assertLogs('pyrtl.simulation', 'INFO'):
+            results = model.benchmark(nsteps=10, backends=[self.sim.__name__])
+        self.assertEqual(len(results), 1)
+        estimated, measured = results[0]
+        self.assertEqual(estimated.backend, self.sim.__name__)
+        model.calibrate(results)
+        calibrated = model.estimate(self.sim.__name__, model.features())
+        self.assertAlmostEqual(calibrated.setup, measured.setup)
+        self.assertAlmostEqual(calibrated.per_cycle, measured.per_cycle)
+        self.assertEqual(calibrated.total(10), calibrated.setup + 10 * calibrated.per_cycle)
+
+
 def make_unittests():
     """
     Generates separate unittests for each of the simulators
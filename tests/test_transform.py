@@ -188,6 +188,30 @@ class TestCopyBlock(NetWireNumTestCases, WireMemoryNameTestCases):
 
         self.name_memories('mem1 mem2', new_block)
 
+    def test_copy_registers_and_consts(self):
+        a = pyrtl.Input(4, 'a')
+        r = pyrtl.Register(4, 'r', reset_value=3)
+        r.next <<= a + pyrtl.Const(2**40, name='c')
+        o = pyrtl.Output(4, 'o')
+        o <<= r
+
+        old_block = pyrtl.working_block()
+        new_block = transform.copy_block(update_working_block=False)
+        self.assertIs(pyrtl.working_block(), old_block)
+        new_block.sanity_check()
+        new_r = new_block.get_wirevector_by_name('r')
+        self.assertIsNot(new_r, r)
+        self.assertEqual((new_r.bitwidth, new_r.reset_value), (4, 3))
+        self.assertIs(new_r.reg_in, new_block.logic_subset('r').pop().args[0])
+        self.assertEqual(new_block.get_wirevector_by_name('c').val, 2**40)
+        self.assertIs(new_block.reg_map[r], new_r)
+        self.assertTrue(all(w in new_block.wirevector_set
+                            for net in new_block.logic for w in net.args + net.dests))
+
+        sim = pyrtl.Simulation(block=new_block)
+        sim.step_multiple({'a': [1, 2, 3]})
+        self.assertEqual(sim.tracer.trace['o'], [3, 1, 2])
+
 
 class TestFastWireReplace(unittest.TestCase):
     def setUp(self):
@@ -310,6 +334,34 @@ class TestFastWireReplace(unittest.TestCase):
         self.assertEqual(w4_dst_net.args, (w4, w2))
         self.assertEqual(w4_dst_net.dests, w1_dst_net.dests)
 
+    def test_replace_with_connection_index(self):
+        j, k = pyrtl.Input(8, 'j'), pyrtl.Input(8, 'k')
+        n, o = pyrtl.Output(8, 'n'), pyrtl.Output(8, 'o')
+        x = pyrtl.WireVector(8, 'x')
+
+        r = j & k
+        n <<= j | r
+        o <<= r ^ k
+
+        block = pyrtl.working_block()
+        index = block.connection_index()
+        transform.replace_wire_fast(r, x, x)
+
+        self.assertIsNone(index.driver(r))
+        self.assertEqual(index.sinks(r), ())
+        self.assertEqual(index.driver(x).args, (j, k))
+        self.assertEqual(sorted(net.op for net in index.sinks(x)), ['^', '|'])
+        self.assertNotIn(r, block.wirevector_set)
+        block.sanity_check()
+
+    def test_replace_with_only_one_map(self):
+        a = pyrtl.Input(1, 'a')
+        o = pyrtl.Output(1, 'o')
+        o <<= ~a
+        src_nets, _ = pyrtl.working_block().net_connections()
+        with self.assertRaises(pyrtl.PyrtlError):
+            transform.replace_wire_fast(a, a, a, src_nets=src_nets)
+
 
 class TestCloning(unittest.TestCase):
     def setUp(self):
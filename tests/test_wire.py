@@ -387,6 +387,69 @@ class TestConst(unittest.TestCase):
             c = pyrtl.Const(*args, **kwargs)
 
 
+class TestConstInterning(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+        self.block = pyrtl.working_block()
+        self.block.intern_consts = True
+
+    def test_off_by_default(self):
+        pyrtl.reset_working_block()
+        self.assertFalse(pyrtl.working_block().intern_consts)
+        self.assertIsNot(pyrtl.Const(3), pyrtl.Const(3))
+
+    def test_shared(self):
+        c = pyrtl.Const(3)
+        self.assertIs(pyrtl.Const(3), c)
+        self.assertIs(pyrtl.Const(3, bitwidth=2), c)
+        self.assertIs(pyrtl.Const('2\'b11'), c)
+        self.assertIs(pyrtl.as_wires(3), c)
+        self.assertIs(pyrtl.Const(-1, 2, signed=True), c)
+        self.assertEqual((c.val, c.bitwidth), (3, 2))
+        self.assertIsNot(pyrtl.Const(3, bitwidth=4), c)
+
+    def test_named_not_shared(self):
+        c = pyrtl.Const(3)
+        named = pyrtl.Const(3, name='three')
+        self.assertIsNot(named, c)
+        self.assertEqual(named.name, 'three')
+        self.assertIs(pyrtl.Const(3), c)
+
+    def test_literals_in_expressions(self):
+        a, b = pyrtl.input_list('a/8 b/8')
+        for _ in range(10):
+            out_a, out_b = pyrtl.Output(1), pyrtl.Output(1)
+            out_a <<= a == 0
+            out_b <<= b == 0
+        self.assertLessEqual(len(self.block.wirevector_subset(pyrtl.Const)), 2)
+        sim = pyrtl.Simulation()
+        sim.step({'a': 0, 'b': 1})
+
+    def test_removed_const_not_reused(self):
+        c = pyrtl.Const(3)
+        self.block.remove_wirevector(c)
+        new = pyrtl.Const(3)
+        self.assertIsNot(new, c)
+        self.assertIn(new, self.block.wirevector_set)
+
+    def test_per_block(self):
+        c = pyrtl.Const(3)
+        other = pyrtl.Block()
+        self.assertIsNot(pyrtl.Const(3, block=other), c)
+        self.assertIs(pyrtl.Const(3), c)
+
+    def test_turn_off(self):
+        c = pyrtl.Const(3)
+        self.block.intern_consts = False
+        self.assertIsNot(pyrtl.Const(3), c)
+
+    def test_copy(self):
+        import copy
+        c = pyrtl.Const(3)
+        c_copy = copy.deepcopy(c)
+        self.assertEqual((c_copy.val, c_copy.bitwidth), (3, 2))
+
+
 class TestOutput(unittest.TestCase):
     def setUp(self):
         pyrtl.reset_working_block()
@@ -422,6 +485,7 @@ class TestKeepingCallStack(unittest.TestCase):
         wire = pyrtl.WireVector()
         with self.assertRaises(AttributeError):
             call_stack = wire.init_call_stack
+        self.assertFalse(hasattr(wire, '_metadata'))  # reading it didn't allocate any
 
     def test_get_call_stack(self):
         pyrtl.set_debug_mode(True)
@@ -429,6 +493,72 @@ class TestKeepingCallStack(unittest.TestCase):
         call_stack = wire.init_call_stack
         self.assertIsInstance(call_stack, list)
 
+    def test_call_stack_matches_traceback(self):
+        import traceback
+        pyrtl.set_debug_mode(True)
+        wire, expected = pyrtl.WireVector(), traceback.format_stack()
+        call_stack = wire.init_call_stack
+        # the last entry is the frame inside WireVector.__init__
+        self.assertEqual(call_stack[:-1], expected)
+        self.assertIn('__init__', call_stack[-1])
+        self.assertIs(wire.init_call_stack, call_stack)
+        self.assertIn('test_call_stack_matches_traceback', pyrtl.helperfuncs.get_stack(wire))
+
+    def test_set_call_stack(self):
+        pyrtl.set_debug_mode(True)
+        wire = pyrtl.WireVector()
+        wire.init_call_stack = ['somewhere\n']
+        self.assertEqual(wire.init_call_stack, ['somewhere\n'])
+
+    def test_debug_tmp_name(self):
+        pyrtl.set_debug_mode(True)
+        a = pyrtl.Input(2, 'a')
+        b = a + 1
+        self.assertIn('_test_wire_line', b.name)
+
+
+class TestWireVectorSlots(unittest.TestCase):
+    def setUp(self):
+        pyrtl.reset_working_block()
+
+    def test_no_instance_dict(self):
+        for w in (pyrtl.WireVector(1), pyrtl.Input(1), pyrtl.Output(1),
+                  pyrtl.Const(3), pyrtl.Register(2)):
+            self.assertFalse(hasattr(w, '__dict__'), type(w))
+        a = pyrtl.Input(1, 'a')
+        o = pyrtl.Output(1, 'o')
+        o <<= ~a
+        for net in pyrtl.working_block().logic:
+            self.assertFalse(hasattr(net, '__dict__'))
+
+    def test_custom_metadata(self):
+        w = pyrtl.WireVector(1, 'w')
+        with self.assertRaises(AttributeError):
+            w.note
+        with self.assertRaises(AttributeError):
+            w.note = 'hello'
+        w.metadata['note'] = 'hello'
+        w.metadata['count'] = 13
+        self.assertEqual(w.metadata, {'note': 'hello', 'count': 13})
+        self.assertIs(w.metadata, w.metadata)
+        self.assertEqual(w.name, 'w')
+
+    def test_read_only_property(self):
+        w = pyrtl.WireVector(3)
+        with self.assertRaises(AttributeError):
+            w.bitmask = 1
+        self.assertEqual(w.bitmask, 7)
+
+    def test_subclass_without_slots(self):
+        class Tagged(pyrtl.WireVector):
+            def __init__(self, bitwidth, tag):
+                super().__init__(bitwidth)
+                self.tag = tag
+
+        w = Tagged(2, 'x')
+        self.assertEqual(w.tag, 'x')
+        self.assertEqual(w.bitwidth, 2)
+
 
 class TestWrappedWireVector(unittest.TestCase):
     def setUp(self):